@@ -0,0 +1,100 @@
+"""Compare one WSGI worker with one ASGI worker under many concurrent clients.
+
+    python benchmarks/asgi_vs_wsgi.py --concurrency 500 --requests 5000
+
+Starts gunicorn (budgetpro.wsgi, one worker with --threads threads) and
+uvicorn (budgetpro.asgi, one worker) in turn against the seeded database in
+SQLITE_PATH, drives each with benchmarks/run.py over HTTP and prints
+throughput and latency side by side. Both servers must be installed
+(pip install gunicorn uvicorn); the reports are written to --output-dir.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'wsgi': lambda port, threads: [
+        sys.executable, '-m', 'gunicorn', 'budgetpro.wsgi:application', '--workers', '1',
+        '--threads', str(threads), '--bind', f'127.0.0.1:{port}', '--backlog', '2048',
+    ],
+    'asgi': lambda port, threads: [
+        sys.executable, '-m', 'uvicorn', 'budgetpro.asgi:application', '--workers', '1',
+        '--host', '127.0.0.1', '--port', str(port), '--backlog', '2048', '--no-access-log',
+    ],
+}
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'Server exited with status {process.returncode}')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'Server did not listen on port {port} within {timeout}s')
+
+
+def benchmark(name, args):
+    """Run benchmarks/run.py against a fresh server and return its report"""
+    output = Path(args.output_dir) / f'{name}.json'
+    env = {**os.environ, 'PERFORMANCE_METRICS': '1'}
+    if name == 'wsgi':
+        # gunicorn's fixed thread pool can keep one connection per thread
+        env.setdefault('DB_CONN_MAX_AGE', '600')
+    server = subprocess.Popen(
+        SERVERS[name](args.port, args.threads), cwd=BASE_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(args.port, server)
+        command = [
+            sys.executable, str(BASE_DIR / 'benchmarks' / 'run.py'), '--url', f'http://127.0.0.1:{args.port}',
+            '--concurrency', str(args.concurrency), '--requests', str(args.requests),
+            '--warmup', str(args.concurrency), '--output', str(output),
+        ]
+        for scenario in args.scenarios:
+            command += ['--scenario', scenario]
+        subprocess.run(command, cwd=BASE_DIR, env=env, check=True)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    return json.loads(output.read_text())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--concurrency', type=int, default=500, help='Concurrent clients')
+    parser.add_argument('--requests', type=int, default=5000, help='Measured requests per scenario')
+    parser.add_argument('--threads', type=int, default=32, help='Threads of the gunicorn worker')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--scenario', action='append', dest='scenarios',
+                        help='Scenario to run (default: chart_data and transaction_history)')
+    parser.add_argument('--output-dir', default='.', help='Where wsgi.json and asgi.json are written')
+    args = parser.parse_args(argv)
+    args.scenarios = args.scenarios or ['chart_data', 'transaction_history']
+
+    reports = {name: benchmark(name, args) for name in SERVERS}
+
+    print(f'{args.concurrency} concurrent clients, {args.requests} requests per scenario\n')
+    print('%-24s %-5s %12s %10s %10s %10s %7s' % ('scenario', 'mode', 'requests/s', 'p50 ms', 'p95 ms', 'p99 ms', 'errors'))
+    for scenario in args.scenarios:
+        for name, report in reports.items():
+            result = report['scenarios'][scenario]
+            print('%-24s %-5s %12.1f %10.1f %10.1f %10.1f %7d' % (
+                scenario, name, result['throughput_rps'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+                result['errors'],
+            ))
+
+
+if __name__ == '__main__':
+    main()
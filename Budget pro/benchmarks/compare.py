@@ -0,0 +1,70 @@
+"""Compare two benchmarks/run.py reports and fail on regressions.
+
+    python benchmarks/compare.py before.json after.json --max-regression 20
+
+Prints latency and query counts side by side. Exits with status 1 when a
+scenario's p95 latency grew by more than --max-regression percent, its
+maximum query count grew, or it started returning errors.
+"""
+import argparse
+import json
+import sys
+
+
+def change(before, after) -> str:
+    if not before:
+        return '   n/a'
+    return f'{(after - before) * 100 / before:+6.1f}%'
+
+
+def compare(before, after, max_regression):
+    """Report lines and the list of regressions between two reports"""
+    lines = [
+        f"before: {before['meta'].get('commit') or '?'} ({before['meta']['mode']}, "
+        f"{before['meta']['transactions']} transactions)",
+        f"after:  {after['meta'].get('commit') or '?'} ({after['meta']['mode']}, "
+        f"{after['meta']['transactions']} transactions)",
+        '',
+        '%-28s %10s %10s %8s %10s %10s %8s %9s' % (
+            'scenario', 'p50 before', 'p50 after', 'change', 'p95 before', 'p95 after', 'change', 'queries'),
+    ]
+    regressions = []
+    for name, old in before['scenarios'].items():
+        new = after['scenarios'].get(name)
+        if new is None:
+            lines.append(f'{name:<28} missing from the second report')
+            continue
+        old_queries = (old['queries'] or {}).get('max')
+        new_queries = (new['queries'] or {}).get('max')
+        lines.append('%-28s %10.2f %10.2f %8s %10.2f %10.2f %8s %9s' % (
+            name, old['p50_ms'], new['p50_ms'], change(old['p50_ms'], new['p50_ms']),
+            old['p95_ms'], new['p95_ms'], change(old['p95_ms'], new['p95_ms']),
+            f'{old_queries}->{new_queries}',
+        ))
+        if old['p95_ms'] and (new['p95_ms'] - old['p95_ms']) * 100 / old['p95_ms'] > max_regression:
+            regressions.append(f'{name}: p95 {old["p95_ms"]:.2f}ms -> {new["p95_ms"]:.2f}ms')
+        if old_queries is not None and new_queries is not None and new_queries > old_queries:
+            regressions.append(f'{name}: up to {new_queries} queries, was {old_queries}')
+        if new['errors'] > old['errors']:
+            regressions.append(f'{name}: {new["errors"]} errors, was {old["errors"]}')
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--max-regression', type=float, default=20.0,
+                        help='Allowed p95 latency increase in percent')
+    args = parser.parse_args(argv)
+
+    with open(args.before) as before, open(args.after) as after:
+        lines, regressions = compare(json.load(before), json.load(after), args.max_regression)
+    print('\n'.join(lines))
+    if regressions:
+        print('\nRegressions:\n  ' + '\n  '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,330 @@
+"""Drive the main Budget Pro views and report latency, throughput and queries as JSON.
+
+Seed a separate database first, then run the scenarios against it:
+
+    export SQLITE_PATH=/tmp/budgetpro-bench.sqlite3
+    python manage.py migrate
+    python manage.py seed_benchmark_data --scale 10k
+    python benchmarks/run.py --output before.json
+    python benchmarks/compare.py before.json after.json
+
+By default requests go through Django's test client in this process, which
+also captures the queries of every request. With --url the scenarios are sent
+over HTTP to a running server from --concurrency threads, all logged in as a
+seeded user; query counts then come from the Server-Timing header, which
+PerformanceMiddleware adds when PERFORMANCE_METRICS is on.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from http.cookiejar import CookieJar
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, HTTPRedirectHandler, Request, build_opener
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+QUERIES_IN_HEADER = re.compile(r'desc="(\d+) queries')
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    # Form data for the i-th request of a POST scenario
+    data: Optional[Callable[[int], Dict]] = None
+    authenticated: bool = True
+    # Run requests // divisor times, for scenarios dominated by fixed costs
+    divisor: int = 1
+
+
+def build_scenarios(expense_category_id, run_id) -> List[Scenario]:
+    return [
+        Scenario('home', 'GET', '/'),
+        Scenario('transaction_history', 'GET', '/transactions/'),
+        Scenario('transaction_history_search', 'GET', '/transactions/?search=uber'),
+        Scenario('chart_data', 'GET', '/api/chart-data/'),
+        Scenario('add_transaction', 'POST', '/transactions/add/', lambda i: {
+            'title': f'Benchmark purchase {i}', 'amount': '12.50', 'transaction_type': 'expense',
+            'category': expense_category_id,
+        }),
+        # Password hashing dominates signups, so fewer are run
+        Scenario('signup', 'POST', '/signup/', lambda i: {
+            'username': f'signup_{run_id}_{i}', 'email': f'signup_{run_id}_{i}@example.com',
+            'password1': 'Bench-Signup-Pass-1', 'password2': 'Bench-Signup-Pass-1',
+        }, authenticated=False, divisor=10),
+    ]
+
+
+def percentile(sorted_values, q) -> float:
+    """Linearly interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return float('nan')
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies, queries, errors, wall) -> Dict:
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'queries': {
+            'min': min(queries),
+            'max': max(queries),
+            'mean': round(sum(queries) / len(queries), 2),
+        } if queries else None,
+    }
+
+
+class ClientRunner:
+    """Sequential requests through django.test.Client in this process"""
+
+    def __init__(self, username):
+        from django.conf import settings
+        from django.contrib.auth.models import User
+        from django.db import connection
+        from django.test import Client
+
+        if 'testserver' not in settings.ALLOWED_HOSTS:
+            settings.ALLOWED_HOSTS.append('testserver')
+        self.connection = connection
+        self.user = User.objects.get(username=username)
+        self.clients = {True: Client(), False: Client()}
+        self.clients[True].force_login(self.user)
+
+    def expense_category_id(self):
+        from expenses.categories import get_catalogue
+        return get_catalogue().for_type('expense')[0].id
+
+    def request(self, scenario, i):
+        from django.test.utils import CaptureQueriesContext
+
+        client = self.clients[scenario.authenticated]
+        data = scenario.data(i) if scenario.data else None
+        with CaptureQueriesContext(self.connection) as captured:
+            started = time.perf_counter()
+            if scenario.method == 'POST':
+                response = client.post(scenario.path, data)
+            else:
+                response = client.get(scenario.path)
+            elapsed = time.perf_counter() - started
+        if scenario.name == 'signup':
+            # Signups get a fresh anonymous session each time
+            self.clients[False] = type(client)()
+        return elapsed, response.status_code, len(captured.captured_queries)
+
+    def run(self, scenario, count, warmup):
+        for i in range(warmup):
+            self.request(scenario, -1 - i)
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for i in range(count):
+            elapsed, status, query_count = self.request(scenario, i)
+            latencies.append(elapsed)
+            queries.append(query_count)
+            errors += status >= 400
+        return summarize(latencies, queries, errors, time.perf_counter() - started)
+
+
+class NoRedirect(HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpSession:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirect)
+
+    def cookie(self, name):
+        return next((cookie.value for cookie in self.cookies if cookie.name == name), None)
+
+    def request(self, method, path, data=None):
+        """(status, query count or None); redirects are returned, not followed"""
+        headers = {'Referer': self.base_url + path}
+        body = None
+        if method == 'POST':
+            headers['X-CSRFToken'] = self.cookie('csrftoken') or ''
+            body = urlencode(data or {}).encode()
+        request = Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                response.read()
+                status, timing = response.status, response.headers.get('Server-Timing')
+        except HTTPError as error:
+            error.read()
+            status, timing = error.code, error.headers.get('Server-Timing')
+        match = QUERIES_IN_HEADER.search(timing or '')
+        return status, int(match.group(1)) if match else None
+
+    def prepare(self, method, path):
+        """Fetch the CSRF cookie a POST to `path` needs, outside any timing"""
+        if method == 'POST' and self.cookie('csrftoken') is None:
+            self.request('GET', path)
+
+    def login(self, username, password):
+        self.prepare('POST', '/login/')
+        status, _ = self.request('POST', '/login/', {'username': username, 'password': password})
+        if status != 302:
+            raise SystemExit(f'Could not log in as {username} (HTTP {status})')
+
+
+class HttpRunner:
+    """Concurrent requests to a running server, one session per thread"""
+
+    def __init__(self, base_url, username, concurrency):
+        from expenses.management.commands.seed_benchmark_data import BENCHMARK_PASSWORD
+
+        self.base_url = base_url
+        self.concurrency = concurrency
+        # Every thread gets its own connection but shares one login, since
+        # hundreds of password checks would dominate the setup
+        login = HttpSession(base_url)
+        login.login(username, BENCHMARK_PASSWORD)
+        self.sessions = []
+        for _ in range(concurrency):
+            session = HttpSession(base_url)
+            for cookie in login.cookies:
+                session.cookies.set_cookie(cookie)
+            self.sessions.append(session)
+        self.local = threading.local()
+
+    def expense_category_id(self):
+        request = Request(f'{self.base_url}/api/categories-by-type/?transaction_type=expense')
+        with self.sessions[0].opener.open(request, timeout=60) as response:
+            return json.load(response)[0]['id']
+
+    def session_for(self, scenario):
+        if scenario.authenticated:
+            return self.sessions[self.local.index]
+        return HttpSession(self.base_url)
+
+    def run(self, scenario, count, warmup):
+        lock = threading.Lock()
+        latencies, queries, errors = [], [], [0]
+        counter = iter(range(-warmup, count))
+
+        def worker(index):
+            self.local.index = index
+            while True:
+                with lock:
+                    i = next(counter, None)
+                if i is None:
+                    return
+                session = self.session_for(scenario)
+                session.prepare(scenario.method, scenario.path)
+                data = scenario.data(i) if scenario.data else None
+                started = time.perf_counter()
+                status, query_count = session.request(scenario.method, scenario.path, data)
+                elapsed = time.perf_counter() - started
+                if i < 0:
+                    continue
+                with lock:
+                    latencies.append(elapsed)
+                    if query_count is not None:
+                        queries.append(query_count)
+                    errors[0] += status >= 400
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as pool:
+            list(pool.map(worker, range(self.concurrency)))
+        return summarize(latencies, queries, errors[0], time.perf_counter() - started)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--url', help='Benchmark a running server over HTTP instead of the test client')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='Threads used with --url')
+    parser.add_argument('--username', help='Seeded user to log in as (default: the first one)')
+    parser.add_argument('--scenario', action='append', dest='scenarios', help='Only run this scenario')
+    parser.add_argument('--output', help='Write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budgetpro.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from expenses.management.commands.seed_benchmark_data import USERNAME_PREFIX
+    from expenses.models import Transaction
+
+    username = args.username or (
+        User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk')
+        .values_list('username', flat=True).first()
+    )
+    if username is None:
+        raise SystemExit('No benchmark users; run manage.py seed_benchmark_data first')
+
+    if args.url:
+        runner = HttpRunner(args.url, username, args.concurrency)
+    else:
+        runner = ClientRunner(username)
+    run_id = int(time.time())
+    scenarios = build_scenarios(runner.expense_category_id(), run_id)
+    if args.scenarios:
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.scenarios]
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'mode': 'http' if args.url else 'client',
+            'url': args.url,
+            'concurrency': args.concurrency if args.url else 1,
+            'database': str(settings.DATABASES['default']['NAME']),
+            'transactions': Transaction.objects.count(),
+            'user_transactions': Transaction.objects.filter(user__username=username).count(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        },
+        'scenarios': {},
+    }
+    # Views that print (the development OTP notice) must not mix with the report
+    with contextlib.redirect_stdout(sys.stderr):
+        for scenario in scenarios:
+            count = max(args.requests // scenario.divisor, 1)
+            print(f'{scenario.name}: {count} requests')
+            report['scenarios'][scenario.name] = runner.run(scenario, count, args.warmup)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
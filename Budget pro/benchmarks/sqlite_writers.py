@@ -0,0 +1,127 @@
+"""Stress SQLite with concurrent transaction writers, stock versus tuned settings.
+
+    python benchmarks/sqlite_writers.py --threads 16 --writes 100
+
+For each profile a fresh database is migrated in a temporary directory and
+--threads threads save transactions the way add_transaction does (the
+insert plus the rollup, ledger and budget writes of the model signals),
+each on its own connection. Reports throughput, latency percentiles and
+how many saves failed with "database is locked". The stock profile runs
+with SQLITE_TUNED=0, the tuned one with the settings in budgetpro/settings.py.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from run import percentile  # noqa: E402
+
+PROFILES = {'stock': '0', 'tuned': '1'}
+
+
+def write_load(threads, writes):
+    """Run in a child process configured for one profile; returns its results"""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'budgetpro.settings')
+    import django
+    django.setup()
+    from django.contrib.auth.models import User
+    from django.db import OperationalError, connection
+    from expenses.models import Budget, Category, Transaction
+
+    users = [User.objects.create_user(username=f'writer_{i}', password='x') for i in range(threads)]
+    category = Category.objects.create(name='Food', transaction_type='expense')
+    for user in users:
+        Budget.objects.create(user=user, category=category, monthly_limit=Decimal('1000000.00'))
+    connection.close()
+
+    barrier = threading.Barrier(threads)
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def writer(user):
+        barrier.wait()
+        for i in range(writes):
+            started = time.perf_counter()
+            try:
+                Transaction(
+                    user=user, title=f'Lunch {i}', amount=Decimal('12.50'),
+                    transaction_type='expense', category=category,
+                ).save()
+            except OperationalError as error:
+                with lock:
+                    errors.append(str(error))
+                continue
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+        connection.close()
+
+    workers = [threading.Thread(target=writer, args=(user,)) for user in users]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'writes': len(latencies),
+        'failed': len(errors),
+        'locked': sum('locked' in error for error in errors),
+        'writes_per_second': round(len(latencies) / wall, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'saved_rows': Transaction.objects.count(),
+    }
+
+
+def run_profile(name, args):
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ, 'SQLITE_TUNED': PROFILES[name], 'SQLITE_PATH': str(Path(directory) / 'stress.sqlite3'),
+            'PERFORMANCE_METRICS': '0',
+        }
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], cwd=BASE_DIR, env=env, check=True)
+        output = subprocess.run(
+            [sys.executable, __file__, '--worker', '--threads', str(args.threads), '--writes', str(args.writes)],
+            cwd=BASE_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent writer threads')
+    parser.add_argument('--writes', type=int, default=100, help='Transactions saved per thread')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        print(json.dumps(write_load(args.threads, args.writes)))
+        return
+
+    print(f'{args.threads} writer threads, {args.writes} transactions each\n')
+    print('%-7s %10s %8s %8s %10s %9s %9s %9s' % (
+        'profile', 'writes/s', 'saved', 'failed', 'locked', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for name in PROFILES:
+        result = run_profile(name, args)
+        print('%-7s %10.1f %8d %8d %10d %9.2f %9.2f %9.2f' % (
+            name, result['writes_per_second'], result['writes'], result['failed'], result['locked'],
+            result['p50_ms'], result['p95_ms'], result['p99_ms'],
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack
+    'expenses.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -77,10 +79,42 @@ WSGI_APPLICATION = 'budgetpro.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # Point at another file, e.g. a seeded benchmark database
+        'NAME': os.getenv('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
     }
 }
 
+# SQLite tuned for concurrent requests. WAL lets readers run alongside the
+# single writer, and synchronous=NORMAL only fsyncs at checkpoints, which
+# is durable enough in WAL mode. Write transactions start with BEGIN
+# IMMEDIATE, so they queue on the busy timeout for the write lock. Under
+# the default deferred mode, a transaction that read first and then tries
+# to upgrade fails at once with "database is locked". SQLITE_TUNED=0 keeps
+# stock SQLite, for comparison with benchmarks/sqlite_writers.py.
+SQLITE_TUNED = os.getenv('SQLITE_TUNED', '1') == '1'
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+    'mmap_size': 256 * 1024 * 1024,
+    # Negative sizes are in KiB: 64 MiB of page cache per connection
+    'cache_size': -64 * 1024,
+}
+if SQLITE_TUNED:
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+        # Seconds a connection waits for the write lock before failing
+        'timeout': 20,
+    }
+    # Connections close after each request by default: under ASGI requests
+    # do not keep to one thread, and a persistent connection would be left
+    # open on every thread they touch. WSGI servers with a fixed thread pool
+    # can set e.g. DB_CONN_MAX_AGE=600 to skip reopening the file and
+    # rerunning the PRAGMAs on every request.
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', '0'))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
 
 # Cache
 # https://docs.djangoproject.com/en/4.2/topics/cache/
@@ -89,9 +123,28 @@ CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
         'LOCATION': 'unique-snowflake',
-    }
+    },
+    # Shared between worker processes; used by expenses.otp.CacheOTPStore
+    'otp': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('OTP_CACHE_DIR', str(BASE_DIR / 'otp_cache')),
+        'TIMEOUT': 600,
+    },
 }
 
+# Seconds a cached dashboard summary is kept; entries are also invalidated
+# as soon as the user's transactions change. The data versions behind this
+# cache and the API ETags live in CACHES, so deployments running several
+# worker processes need a backend shared between them.
+SUMMARY_CACHE_TIMEOUT = 60 * 60
+
+# One-time codes must be visible to every worker process, so they are not
+# kept in the per-process default cache. DatabaseOTPStore uses the
+# OneTimeCode table; CacheOTPStore uses the shared 'otp' cache above.
+OTP_STORE = os.getenv('OTP_STORE', 'expenses.otp.DatabaseOTPStore')
+# Wrong guesses allowed before a code stops working
+OTP_MAX_ATTEMPTS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -142,13 +195,49 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Email Configuration
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.environ.get('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@budgetpro.com')
+# Without credentials in development, outbox emails are printed to the console.
+# Set EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend and
+# EMAIL_FILE_PATH to capture them as files instead.
+EMAIL_BACKEND = os.environ.get(
+    'EMAIL_BACKEND',
+    'django.core.mail.backends.console.EmailBackend'
+    if DEBUG and not EMAIL_HOST_USER
+    else 'django.core.mail.backends.smtp.EmailBackend',
+)
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', os.path.join(BASE_DIR, 'sent_emails'))
+
+# Transaction history pagination
+TRANSACTIONS_PAGE_SIZE = 25
+TRANSACTIONS_MAX_PAGE_SIZE = 200
+
+# Rows written per bulk insert when importing bank statements
+IMPORT_BATCH_SIZE = 1000
+
+# Rows fetched from the database per round trip when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Request instrumentation by expenses.middleware.PerformanceMiddleware:
+# Server-Timing headers and per-process histograms served to staff at
+# /internal/metrics. GET requests running more queries than their view's
+# budget (default, or per view name) are logged and counted.
+PERFORMANCE_METRICS = os.getenv('PERFORMANCE_METRICS', '1' if DEBUG else '0') == '1'
+PERFORMANCE_QUERY_BUDGET = 10
+PERFORMANCE_QUERY_BUDGETS = {
+    'transaction_history': 5,
+}
+
+# Live dashboard updates streamed by /api/live/ (serve under ASGI). The
+# in-process broker only reaches tabs connected to the same worker, so
+# several workers need a broker shared between them (see expenses.live).
+LIVE_UPDATES_BROKER = os.getenv('LIVE_UPDATES_BROKER', 'expenses.live.InProcessBroker')
+# Seconds between keep-alive comments on an idle event stream
+LIVE_UPDATES_KEEPALIVE = 15
 
 # Authentication settings
 LOGIN_URL = '/login/'
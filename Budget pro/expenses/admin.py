@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Category, Transaction, Profile
+from .models import Category, Transaction, Profile, MonthlyRollup, OutboxMessage, RecurringRule, Budget, BudgetAlert, TransactionFlag, CategoryRule
 
 # Register your models here.
 
@@ -19,3 +19,52 @@ class TransactionAdmin(admin.ModelAdmin):
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone_number', 'occupation', 'date_of_birth', 'created_at')
     search_fields = ('user__username', 'phone_number', 'occupation')
+
+@admin.register(MonthlyRollup)
+class MonthlyRollupAdmin(admin.ModelAdmin):
+    list_display = ('user', 'year', 'month', 'category', 'transaction_type', 'total', 'count')
+    list_filter = ('transaction_type', 'year')
+    search_fields = ('user__username',)
+
+    # Derived from the transactions; fix drift with rebuild_rollups instead
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('channel', 'recipient', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('channel', 'status')
+    search_fields = ('recipient',)
+
+@admin.register(RecurringRule)
+class RecurringRuleAdmin(admin.ModelAdmin):
+    list_display = ('title', 'amount', 'transaction_type', 'frequency', 'interval', 'next_occurrence', 'user', 'is_active')
+    list_filter = ('frequency', 'transaction_type', 'is_active')
+    search_fields = ('title', 'user__username')
+
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ('category', 'monthly_limit', 'user', 'created_at')
+    search_fields = ('category__name', 'user__username')
+
+@admin.register(BudgetAlert)
+class BudgetAlertAdmin(admin.ModelAdmin):
+    list_display = ('budget', 'year', 'month', 'threshold', 'spent', 'created_at')
+    list_filter = ('threshold', 'year')
+
+@admin.register(TransactionFlag)
+class TransactionFlagAdmin(admin.ModelAdmin):
+    list_display = ('transaction', 'kind', 'score', 'reason', 'created_at')
+    list_filter = ('kind',)
+
+@admin.register(CategoryRule)
+class CategoryRuleAdmin(admin.ModelAdmin):
+    list_display = ('pattern', 'match_type', 'category', 'min_amount', 'max_amount', 'priority', 'user', 'is_active')
+    list_filter = ('match_type', 'is_active')
+    search_fields = ('pattern', 'user__username')
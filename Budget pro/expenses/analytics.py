@@ -0,0 +1,209 @@
+"""Monthly spending analytics computed with NumPy.
+
+A user's history is read from MonthlyRollup in one values_list fetch and
+turned into a (category x month) matrix, so the cost depends on the number
+of months and categories, never on the number of transactions. Everything
+after the fetch is array arithmetic.
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional
+
+import numpy as np
+from django.utils import timezone
+
+from .models import MonthlyRollup
+from .summary import shift_month
+
+ROLLING_WINDOWS = (3, 6, 12)
+# Most recent complete months used by the linear forecast
+FORECAST_MONTHS = 12
+# Longest window the analytics API will serve
+MAX_ANALYTICS_MONTHS = 120
+
+
+@dataclass
+class MonthlySeries:
+    months: List[date]
+    income: np.ndarray
+    expenses: np.ndarray
+    # Expense totals per category (rows) and month (columns)
+    by_category: np.ndarray
+    categories: List[Dict]
+
+
+def load_series(user, months: int = 12, today: date = None) -> MonthlySeries:
+    """Monthly totals from the user's first rollup (or `months` ago) to today.
+
+    Months without transactions are zero; rows dated after the current
+    month are ignored.
+    """
+    if today is None:
+        today = timezone.localdate()
+    current = today.year * 12 + today.month - 1
+    rows = list(
+        MonthlyRollup.objects.filter(user=user)
+        .values_list('year', 'month', 'transaction_type', 'category_id',
+                     'category__name', 'category__color', 'total')
+    )
+    if rows:
+        years, month_numbers, types, category_ids, names, colors, totals = zip(*rows)
+    else:
+        years = month_numbers = types = category_ids = names = colors = totals = ()
+
+    index = np.array(years, dtype=np.int64) * 12 + np.array(month_numbers, dtype=np.int64) - 1
+    totals = np.array(totals, dtype=np.float64)
+    is_income = np.array(types, dtype=object) == 'income'
+    category_ids = np.array([pk or 0 for pk in category_ids], dtype=np.int64)
+
+    start = min(int(index.min()) if len(index) else current, current - months + 1)
+    keep = index <= current
+    span = current - start + 1
+    position = index - start
+
+    income_rows = keep & is_income
+    expense_rows = keep & ~is_income
+    income = np.bincount(position[income_rows], weights=totals[income_rows], minlength=span)
+    expenses = np.bincount(position[expense_rows], weights=totals[expense_rows], minlength=span)
+
+    unique_ids, category_rows = np.unique(category_ids[expense_rows], return_inverse=True)
+    by_category = np.zeros((len(unique_ids), span))
+    np.add.at(by_category, (category_rows, position[expense_rows]), totals[expense_rows])
+
+    labels = {pk or 0: (name, color) for pk, name, color in zip(category_ids.tolist(), names, colors)}
+    categories = [
+        {
+            'id': int(pk) or None,
+            'name': labels[pk][0] or 'Uncategorized',
+            'color': labels[pk][1] or '#6c757d',
+        }
+        for pk in unique_ids.tolist()
+    ]
+    first = date(start // 12, start % 12 + 1, 1)
+    return MonthlySeries(
+        months=[shift_month(first, i) for i in range(span)],
+        income=income,
+        expenses=expenses,
+        by_category=by_category,
+        categories=categories,
+    )
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` months; NaN until enough months exist"""
+    result = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        sums = np.cumsum(np.concatenate(([0.0], values)))
+        result[window - 1:] = (sums[window:] - sums[:-window]) / window
+    return result
+
+
+def lagged_change(values: np.ndarray, lag: int):
+    """Absolute and percentage change against `lag` months earlier"""
+    delta = np.full(values.shape, np.nan)
+    percent = np.full(values.shape, np.nan)
+    if len(values) > lag:
+        previous = values[:-lag]
+        delta[lag:] = values[lag:] - previous
+        np.divide(delta[lag:] * 100, previous, out=percent[lag:], where=previous != 0)
+    return delta, percent
+
+
+def category_shares(by_category: np.ndarray, totals: np.ndarray):
+    """Each category's share of monthly spend and its linear trend.
+
+    The trend is the least-squares slope of the share in percentage points
+    per month, fitted over the months with any spend.
+    """
+    shares = np.full(by_category.shape, np.nan)
+    np.divide(by_category * 100, totals, out=shares, where=totals != 0)
+    active = totals != 0
+    trends = np.full(len(by_category), np.nan)
+    if active.sum() >= 2 and len(by_category):
+        x = np.flatnonzero(active)
+        trends = np.polyfit(x, shares[:, active].T, 1)[0]
+    return shares, trends
+
+
+def forecast_next_month(expenses: np.ndarray) -> Dict[str, Optional[float]]:
+    """Forecast spend for the month after the current (partial) one.
+
+    `linear` extrapolates a least-squares line through the last complete
+    months. `seasonal` scales the same month last year by how the last
+    three complete months compare with a year earlier; it is preferred
+    when there are 16 months of history to compute it.
+    """
+    complete = expenses[:-1]
+    recent = complete[-FORECAST_MONTHS:]
+    if len(recent) >= 2:
+        slope, intercept = np.polyfit(np.arange(len(recent)), recent, 1)
+        # Index len(recent) is the current month, the next one follows it
+        linear = float(slope * (len(recent) + 1) + intercept)
+    else:
+        linear = float(recent.mean()) if len(recent) else 0.0
+
+    seasonal = None
+    if len(complete) >= 15:
+        target = len(expenses) - 12
+        year_before = complete[-15:-12].sum()
+        ratio = complete[-3:].sum() / year_before if year_before else 1.0
+        seasonal = float(expenses[target] * ratio)
+
+    chosen = seasonal if seasonal is not None else linear
+    return {
+        'expenses': round(max(chosen, 0.0), 2),
+        'method': 'seasonal' if seasonal is not None else 'linear',
+        'linear': round(max(linear, 0.0), 2),
+        'seasonal': round(max(seasonal, 0.0), 2) if seasonal is not None else None,
+    }
+
+
+def as_list(values: np.ndarray) -> List[Optional[float]]:
+    """JSON-ready list with NaN as None"""
+    rounded = np.round(values, 2)
+    return [None if np.isnan(value) else value for value in rounded.tolist()]
+
+
+def build_analytics(user, months: int = 12, today: date = None) -> Dict:
+    """Trends, rolling averages and a forecast for the last `months` months"""
+    series = load_series(user, months, today)
+    window = slice(-months, None)
+    month_over_month, month_over_month_pct = lagged_change(series.expenses, 1)
+    year_over_year, year_over_year_pct = lagged_change(series.expenses, 12)
+    shares, trends = category_shares(series.by_category[:, window], series.expenses[window])
+    totals = series.by_category[:, window].sum(axis=1)
+    order = np.argsort(-totals, kind='stable')
+    next_month = shift_month(series.months[-1], 1)
+
+    return {
+        'months': [month.strftime('%Y-%m') for month in series.months[window]],
+        'labels': [month.strftime('%b %Y') for month in series.months[window]],
+        'income': as_list(series.income[window]),
+        'expenses': as_list(series.expenses[window]),
+        'rolling_average': {
+            str(size): {
+                'income': as_list(rolling_mean(series.income, size)[window]),
+                'expenses': as_list(rolling_mean(series.expenses, size)[window]),
+            }
+            for size in ROLLING_WINDOWS
+        },
+        'month_over_month': {
+            'expenses': as_list(month_over_month[window]),
+            'expenses_pct': as_list(month_over_month_pct[window]),
+        },
+        'year_over_year': {
+            'expenses': as_list(year_over_year[window]),
+            'expenses_pct': as_list(year_over_year_pct[window]),
+        },
+        'categories': [
+            dict(
+                series.categories[i],
+                total=round(float(totals[i]), 2),
+                share=as_list(shares[i]),
+                trend=None if np.isnan(trends[i]) else round(float(trends[i]), 2),
+            )
+            for i in order.tolist()
+            if totals[i]
+        ],
+        'forecast': dict(forecast_next_month(series.expenses), month=next_month.strftime('%Y-%m')),
+    }
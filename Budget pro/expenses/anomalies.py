@@ -0,0 +1,171 @@
+"""Batch detection of unusual transactions.
+
+Transactions added since the job's watermark are checked against the
+owner's recent history, loaded for a chunk of users at a time:
+
+- outliers: amounts whose robust z-score (0.6745 * deviation from the
+  median / median absolute deviation) within the user's category exceeds
+  OUTLIER_THRESHOLD;
+- duplicates: the same amount and payee charged again within
+  DUPLICATE_WINDOW.
+
+Statistics are computed with NumPy over the whole chunk at once, so a run
+costs a few queries per chunk and time linear in the rows it reads.
+"""
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .models import JobWatermark, Transaction, TransactionFlag
+
+JOB_NAME = 'anomalies'
+OUTLIER_THRESHOLD = 3.5
+# Smallest user-category group whose distribution is trusted
+MIN_GROUP_SIZE = 6
+DUPLICATE_WINDOW = timedelta(days=3)
+# History read before the earliest new transaction of each chunk
+HISTORY = timedelta(days=365)
+USERS_PER_CHUNK = 500
+
+
+@dataclass
+class DetectionResult:
+    users: int = 0
+    scanned: int = 0
+    outliers: int = 0
+    duplicates: int = 0
+    chunks: int = 0
+    last_id: int = 0
+    elapsed: float = 0.0
+
+
+def group_medians(groups: np.ndarray, values: np.ndarray):
+    """Median of `values` within each group and the group size, per element"""
+    if not len(values):
+        return np.empty(0), np.empty(0, dtype=np.int64)
+    order = np.lexsort((values, groups))
+    sorted_groups = groups[order]
+    sorted_values = values[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    counts = np.diff(np.r_[starts, len(values)])
+    medians = (sorted_values[starts + (counts - 1) // 2] + sorted_values[starts + counts // 2]) / 2
+    owner = np.repeat(np.arange(len(starts)), counts)
+    result = np.empty(len(values))
+    sizes = np.empty(len(values), dtype=np.int64)
+    result[order] = medians[owner]
+    sizes[order] = counts[owner]
+    return result, sizes
+
+
+def find_outliers(groups, amounts, is_new):
+    """Robust z-scores and the mask of new rows that are outliers"""
+    medians, sizes = group_medians(groups, amounts)
+    mads, _ = group_medians(groups, np.abs(amounts - medians))
+    scores = np.zeros(len(amounts))
+    np.divide(0.6745 * (amounts - medians), mads, out=scores, where=mads > 0)
+    flagged = is_new & (sizes >= MIN_GROUP_SIZE) & (np.abs(scores) > OUTLIER_THRESHOLD)
+    return flagged, scores, medians
+
+
+def find_duplicates(users, cents, titles, timestamps, ids, is_new):
+    """Rows repeating an earlier row's user, amount and payee within the window.
+
+    Returns (positions of the repeats, positions of the earlier rows).
+    """
+    order = np.lexsort((ids, timestamps, titles, cents, users))
+    current, previous = order[1:], order[:-1]
+    repeat = (
+        (users[current] == users[previous])
+        & (cents[current] == cents[previous])
+        & (titles[current] == titles[previous])
+        & (timestamps[current] - timestamps[previous] <= DUPLICATE_WINDOW.total_seconds())
+        & is_new[current]
+    )
+    return current[repeat], previous[repeat]
+
+
+def detect_chunk(user_ids, since, watermark, upper_id):
+    """Flag new transactions of `user_ids`; returns (scanned, outliers, duplicates)"""
+    rows = list(
+        Transaction.objects.filter(user_id__in=user_ids, pk__lte=upper_id)
+        .filter(Q(date__gte=since) | Q(pk__gt=watermark))
+        .values_list('pk', 'user_id', 'category_id', 'transaction_type', 'amount', 'date', 'title')
+    )
+    if not rows:
+        return 0, 0, 0
+    pks, users, categories, types, amounts, dates, titles = zip(*rows)
+
+    ids = np.array(pks, dtype=np.int64)
+    users = np.array(users, dtype=np.int64)
+    is_income = np.array(types, dtype=object) == 'income'
+    categories = np.array([category or 0 for category in categories], dtype=np.int64)
+    amounts = np.array(amounts, dtype=np.float64)
+    cents = np.round(amounts * 100).astype(np.int64)
+    timestamps = np.array([date.timestamp() for date in dates])
+    _, title_codes = np.unique(np.char.lower(np.char.strip(np.array(titles, dtype=str))), return_inverse=True)
+    is_new = ids > watermark
+
+    groups = (users << 32) | (categories << 1) | is_income
+    outliers, scores, medians = find_outliers(groups, amounts, is_new)
+    repeats, originals = find_duplicates(users, cents, title_codes, timestamps, ids, is_new)
+
+    flags = [
+        TransactionFlag(
+            transaction_id=int(ids[i]), kind='outlier', score=round(float(scores[i]), 2),
+            reason=f'{amounts[i]:.2f} against a usual {medians[i]:.2f}',
+        )
+        for i in np.flatnonzero(outliers)
+    ]
+    flags.extend(
+        TransactionFlag(
+            transaction_id=int(ids[i]), kind='duplicate',
+            score=round((timestamps[i] - timestamps[j]) / 86400, 2),
+            reason=f'Same amount and payee as transaction {ids[j]}',
+        )
+        for i, j in zip(repeats, originals)
+    )
+    TransactionFlag.objects.bulk_create(flags, ignore_conflicts=True)
+    return int(is_new.sum()), int(outliers.sum()), len(repeats)
+
+
+def run_detection(users_per_chunk=USERS_PER_CHUNK, full=False, progress=None) -> DetectionResult:
+    """Check every transaction added since the last run, a chunk of users at a time.
+
+    The watermark only moves after all chunks succeed; a failed run is
+    simply repeated, and flags already stored are kept as they are.
+    """
+    result = DetectionResult()
+    started = time.perf_counter()
+    mark, _ = JobWatermark.objects.get_or_create(name=JOB_NAME)
+    watermark = 0 if full else mark.last_id
+    upper_id = max(Transaction.objects.aggregate(last=Max('pk'))['last'] or 0, watermark)
+
+    earliest = list(
+        Transaction.objects.filter(pk__gt=watermark, pk__lte=upper_id)
+        .values('user_id').annotate(first=Min('date')).order_by('user_id')
+        .values_list('user_id', 'first')
+    )
+    result.users = len(earliest)
+    for offset in range(0, len(earliest), users_per_chunk):
+        chunk = earliest[offset:offset + users_per_chunk]
+        since = min(first for _, first in chunk) - HISTORY
+        with transaction.atomic():
+            scanned, outliers, duplicates = detect_chunk(
+                [user_id for user_id, _ in chunk], since, watermark, upper_id
+            )
+        result.scanned += scanned
+        result.outliers += outliers
+        result.duplicates += duplicates
+        result.chunks += 1
+        if progress:
+            progress(result)
+
+    JobWatermark.objects.filter(pk=mark.pk).update(last_id=upper_id, updated_at=timezone.now())
+    result.last_id = upper_id
+    result.elapsed = time.perf_counter() - started
+    return result
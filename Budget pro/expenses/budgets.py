@@ -0,0 +1,143 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Budget, BudgetAlert, MonthlyRollup
+from .outbox import enqueue_email
+
+
+def alert_levels(budget, previous, spent):
+    """Thresholds of `budget` crossed by spend going from `previous` to `spent`"""
+    return [
+        threshold for threshold in Budget.ALERT_THRESHOLDS
+        if previous < budget.monthly_limit * threshold / 100 <= spent
+    ]
+
+
+def record_alerts(crossings):
+    """Store and email (budget, year, month, threshold, spent) crossings.
+
+    Thresholds already alerted in that month are skipped, so each one is
+    reported at most once per month.
+    """
+    if not crossings:
+        return []
+    budget_ids = {budget.pk for budget, *_ in crossings}
+    seen = set(
+        BudgetAlert.objects.filter(budget_id__in=budget_ids).filter(
+            year__in={year for _, year, *_ in crossings},
+            month__in={month for _, _, month, *_ in crossings},
+        ).values_list('budget_id', 'year', 'month', 'threshold')
+    )
+    alerts = []
+    for budget, year, month, threshold, spent in crossings:
+        if (budget.pk, year, month, threshold) in seen:
+            continue
+        seen.add((budget.pk, year, month, threshold))
+        alerts.append(BudgetAlert(budget=budget, year=year, month=month, threshold=threshold, spent=spent))
+    BudgetAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+
+    for alert in alerts:
+        budget = alert.budget
+        if budget.user.email:
+            enqueue_email(
+                budget.user.email,
+                f'Budget Pro: {budget.category.name} budget at {alert.threshold}%',
+                f'You have spent {alert.spent} of your {budget.monthly_limit} '
+                f'{budget.category.name} budget for {alert.year}-{alert.month:02d}.',
+            )
+    return alerts
+
+
+def check_thresholds(deltas):
+    """Detect budget alerts caused by rollup changes.
+
+    `deltas` maps rollup bucket keys to the amount just added to them.
+    Called by rollups.py after every write, so no sweep over budgets is
+    ever needed; costs one query when none of the categories has a budget.
+    """
+    increases = {
+        key: amount for key, amount in deltas.items()
+        if key[4] == 'expense' and key[3] is not None and amount > 0
+    }
+    if not increases:
+        return []
+    budgets = {
+        (budget.user_id, budget.category_id): budget
+        for budget in Budget.objects.filter(
+            user_id__in={key[0] for key in increases},
+            category_id__in={key[3] for key in increases},
+        ).select_related('user', 'category')
+    }
+    increases = {key: amount for key, amount in increases.items() if (key[0], key[3]) in budgets}
+    if not increases:
+        return []
+
+    totals = defaultdict(Decimal)
+    rows = MonthlyRollup.objects.filter(
+        user_id__in={key[0] for key in increases},
+        category_id__in={key[3] for key in increases},
+        year__in={key[1] for key in increases},
+        month__in={key[2] for key in increases},
+        transaction_type='expense',
+    ).values_list('user_id', 'year', 'month', 'category_id', 'total')
+    for user_id, year, month, category_id, total in rows:
+        totals[user_id, year, month, category_id] += total
+
+    crossings = []
+    for (user_id, year, month, category_id, _), amount in increases.items():
+        budget = budgets[user_id, category_id]
+        spent = totals[user_id, year, month, category_id]
+        for threshold in alert_levels(budget, spent - amount, spent):
+            crossings.append((budget, year, month, threshold, spent))
+    return record_alerts(crossings)
+
+
+def check_budget(budget):
+    """Alert for thresholds the current month's spend already reached"""
+    today = timezone.localdate()
+    spent = current_spend(budget, today)
+    crossings = [
+        (budget, today.year, today.month, threshold, spent)
+        for threshold in alert_levels(budget, Decimal('-1'), spent)
+    ]
+    return record_alerts(crossings)
+
+
+def spend_subquery(year, month):
+    return Subquery(
+        MonthlyRollup.objects.filter(
+            user_id=OuterRef('user_id'),
+            category_id=OuterRef('category_id'),
+            year=year,
+            month=month,
+            transaction_type='expense',
+        ).values('total')[:1],
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def current_spend(budget, today=None) -> Decimal:
+    today = today or timezone.localdate()
+    total = MonthlyRollup.objects.filter(
+        user_id=budget.user_id, category_id=budget.category_id,
+        year=today.year, month=today.month, transaction_type='expense',
+    ).values_list('total', flat=True).first()
+    return total if total is not None else Decimal('0')
+
+
+def budget_progress(user, today=None):
+    """The user's budgets with this month's `spent`, in a single query"""
+    today = today or timezone.localdate()
+    return (
+        Budget.objects.filter(user=user)
+        .select_related('category')
+        .annotate(spent=Coalesce(
+            spend_subquery(today.year, today.month), Value(Decimal('0')),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ))
+        .order_by('category__name')
+    )
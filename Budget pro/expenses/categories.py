@@ -0,0 +1,88 @@
+"""Process-wide, read-mostly catalogue of categories.
+
+Categories are shared by all users and change rarely, so each process
+keeps one snapshot in memory and reloads it with a single query when the
+catalogue version moves. The version is a DataVersion row, so a bump made
+by any process (the Category signals, admin edits, bulk writers such as
+add_default_categories) reaches every other one.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .models import Category
+from .versions import UNSET, bump_version, get_version
+
+VERSION_KEY = 'categories:version'
+
+
+def catalogue_version() -> int:
+    """Generation of the Category table, bumped on every save and delete"""
+    return get_version(VERSION_KEY)
+
+
+def bump_catalogue_version():
+    bump_version(VERSION_KEY)
+
+
+@dataclass(frozen=True)
+class CategoryEntry:
+    id: int
+    name: str
+    color: str
+    transaction_type: str
+
+
+class Catalogue:
+    """Categories keyed by id and grouped by transaction type, in id order"""
+
+    def __init__(self, version: int, entries: List[CategoryEntry]):
+        self.version = version
+        self.entries = entries
+        self.by_id: Dict[int, CategoryEntry] = {entry.id: entry for entry in entries}
+        self.by_type: Dict[str, List[CategoryEntry]] = {'income': [], 'expense': []}
+        for entry in entries:
+            self.by_type.setdefault(entry.transaction_type, []).append(entry)
+
+    def get(self, category_id, transaction_type=None) -> Optional[CategoryEntry]:
+        """The category with `category_id`, if it exists and has `transaction_type`"""
+        try:
+            entry = self.by_id.get(int(category_id))
+        except (TypeError, ValueError):
+            return None
+        if entry is None or (transaction_type is not None and entry.transaction_type != transaction_type):
+            return None
+        return entry
+
+    def for_type(self, transaction_type) -> List[CategoryEntry]:
+        return self.by_type.get(transaction_type, [])
+
+    def as_json(self) -> Dict[str, List[Dict]]:
+        """{transaction_type: [{id, name, color}]} for embedding in pages"""
+        return {
+            transaction_type: [
+                {'id': entry.id, 'name': entry.name, 'color': entry.color} for entry in entries
+            ]
+            for transaction_type, entries in self.by_type.items()
+        }
+
+
+_catalogue: Optional[Catalogue] = None
+
+
+def get_catalogue() -> Catalogue:
+    """The current catalogue; costs one version lookup unless categories changed"""
+    global _catalogue
+    # Read before loading, so a change made during the load triggers a reload
+    version = catalogue_version()
+    if _catalogue is None or _catalogue.version != version:
+        _catalogue = load_catalogue(version)
+    return _catalogue
+
+
+def load_catalogue(version: int = UNSET) -> Catalogue:
+    """A fresh Catalogue read from the table, bypassing the shared snapshot"""
+    entries = [
+        CategoryEntry(**row)
+        for row in Category.objects.order_by('pk').values('id', 'name', 'color', 'transaction_type')
+    ]
+    return Catalogue(version, entries)
@@ -2,34 +2,25 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.contrib.auth import login, update_session_auth_hash
 from django.contrib.auth.models import User
-from django.core.cache import cache
 from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from .email_forms import CustomUserCreationForm, EmailVerificationForm, PasswordResetRequestForm, PasswordResetVerifyForm
-import random
+import secrets
 import string
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import EmailMessage
-import os
-
-# Only import twilio if credentials are available
-try:
-    from twilio.rest import Client
-    TWILIO_AVAILABLE = True
-except ImportError:
-    TWILIO_AVAILABLE = False
+from .outbox import enqueue_email, enqueue_sms
+from .otp import get_otp_store
 
 
 def generate_otp(length=6):
     """Generate a random OTP"""
-    return ''.join(random.choices(string.digits, k=length))
+    return ''.join(secrets.choice(string.digits) for _ in range(length))
 
 
 def send_otp_via_email(email, otp):
-    """Send OTP via email"""
-    try:
-        subject = 'Budget Pro Verification Code'
-        message = f'''
+    """Queue an OTP email; `run_outbox` delivers it outside the request"""
+    subject = 'Budget Pro Verification Code'
+    message = f'''
 Hello,
 
 Your verification code for Budget Pro is: {otp}
@@ -45,53 +36,14 @@ If you didn't request this code, please ignore this email.
 Best regards,
 Budget Pro Team
         '''
-        
-        # Check if we're in development mode
-        if settings.DEBUG and not os.environ.get('EMAIL_HOST_USER'):
-            # In development without real email credentials, print to console
-            print(f"=== EMAIL OTP ===")
-            print(f"To: {email}")
-            print(f"Subject: {subject}")
-            print(f"Message: {message}")
-            print(f"==============")
-            return True
-        
-        # Send actual email
-        email_message = EmailMessage(
-            subject=subject,
-            body=message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[email]
-        )
-        email_message.send()
-        
-        return True
-    except Exception as e:
-        print(f"Failed to send email: {e}")
-        # For development, print to console as fallback
-        print(f"Email OTP for {email}: {otp}")
-        return True
+    enqueue_email(email, subject, message, sensitive=True)
+    return True
 
 
 def send_otp_via_sms(phone_number, otp):
-    """Send OTP via SMS using Twilio"""
-    if not TWILIO_AVAILABLE or not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
-        # Fallback: Print to console for development
-        print(f"SMS OTP for {phone_number}: {otp}")
-        return True
-    
-    try:
-        from twilio.rest import Client
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        message = client.messages.create(
-            body=f"Your Budget Pro verification code is: {otp}",
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=phone_number
-        )
-        return True
-    except Exception as e:
-        print(f"Failed to send SMS: {e}")
-        return False
+    """Queue an OTP text message; `run_outbox` delivers it via Twilio"""
+    enqueue_sms(phone_number, f"Your Budget Pro verification code is: {otp}", sensitive=True)
+    return True
 
 
 def signup_with_email_verification(request):
@@ -101,18 +53,15 @@ def signup_with_email_verification(request):
         if form.is_valid():
             user = form.save(commit=False)
             
-            # Use fixed OTP for development
-            otp = "123456"
+            otp = generate_otp()
             
-            # Store OTP in cache with 10-minute expiration
-            cache.set(f'otp_signup_{user.email}', otp, 600)
-            
-            # For development, just notify that OTP is fixed
-            print(f"FIXED OTP for {user.email}: {otp}")
+            # Store a hash of the OTP with 10-minute expiration
+            get_otp_store().issue('signup', user.email, otp, 600)
             
             # Save user but keep inactive until verification
             user.save()
-            messages.success(request, f'Account created! Use OTP {otp} to verify your email.')
+            send_otp_via_email(user.email, otp)
+            messages.success(request, 'Account created! Enter the code we emailed you to verify your email.')
             # Store email in session for verification
             request.session['verification_email'] = user.email
             return redirect('verify_email')
@@ -130,18 +79,14 @@ def verify_email(request):
             email = form.cleaned_data['email']
             entered_otp = form.cleaned_data['otp']
             
-            # Get stored OTP
-            stored_otp = cache.get(f'otp_signup_{email}')
-            
-            if stored_otp and entered_otp == stored_otp:
+            # Check the OTP; a correct code is consumed by the store
+            if get_otp_store().verify('signup', email, entered_otp):
                 # OTP verified successfully
                 try:
                     user = User.objects.get(email=email)
                     user.is_active = True  # Activate user
                     user.save()
                     messages.success(request, 'Email verified successfully!')
-                    # Clear OTP from cache
-                    cache.delete(f'otp_signup_{email}')
                     # Log in user
                     login(request, user)
                     # Clear session
@@ -171,16 +116,13 @@ def resend_verification(request):
                     messages.info(request, 'This email is already verified.')
                     return redirect('login')
                 
-                # Use fixed OTP for development
-                otp = "123456"
+                otp = generate_otp()
                 
-                # Store OTP in cache with 10-minute expiration
-                cache.set(f'otp_signup_{email}', otp, 600)
+                # Store a hash of the OTP with 10-minute expiration
+                get_otp_store().issue('signup', email, otp, 600)
+                send_otp_via_email(email, otp)
                 
-                # For development, just notify that OTP is fixed
-                print(f"FIXED OTP for {email}: {otp}")
-                
-                messages.success(request, f'Use OTP {otp} to verify your email.')
+                messages.success(request, 'We emailed you a new verification code.')
                 request.session['verification_email'] = email
             except ObjectDoesNotExist:
                 messages.error(request, 'No account found with this email.')
@@ -202,16 +144,13 @@ def password_reset_request(request):
                     messages.error(request, 'This account is not verified. Please verify your email first.')
                     return redirect('resend_verification')
                 
-                # Use fixed OTP for development
-                otp = "123456"
-                
-                # Store OTP in cache with 10-minute expiration
-                cache.set(f'otp_reset_{email}', otp, 600)
+                otp = generate_otp()
                 
-                # For development, just notify that OTP is fixed
-                print(f"FIXED OTP for {email}: {otp}")
+                # Store a hash of the OTP with 10-minute expiration
+                get_otp_store().issue('reset', email, otp, 600)
+                send_otp_via_email(email, otp)
                 
-                messages.success(request, f'Use OTP {otp} to reset your password.')
+                messages.success(request, 'We emailed you a code to reset your password.')
                 # Store email in session for verification
                 request.session['reset_email'] = email
                 return redirect('password_reset_verify')
@@ -232,10 +171,8 @@ def password_reset_verify(request):
             entered_otp = form.cleaned_data['otp']
             new_password = form.cleaned_data['new_password1']
             
-            # Get stored OTP
-            stored_otp = cache.get(f'otp_reset_{email}')
-            
-            if stored_otp and entered_otp == stored_otp:
+            # Check the OTP; a correct code is consumed by the store
+            if get_otp_store().verify('reset', email, entered_otp):
                 # OTP verified successfully
                 try:
                     user = User.objects.get(email=email)
@@ -243,8 +180,6 @@ def password_reset_verify(request):
                     user.password = make_password(new_password)
                     user.save()
                     messages.success(request, 'Password reset successfully!')
-                    # Clear OTP from cache
-                    cache.delete(f'otp_reset_{email}')
                     # Clear session
                     if 'reset_email' in request.session:
                         del request.session['reset_email']
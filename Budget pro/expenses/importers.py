@@ -0,0 +1,240 @@
+import csv
+import io
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Iterator, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import categorization, ledger, rollups
+from .categories import get_catalogue
+from .models import Transaction
+
+DATE_FORMATS = ('%Y-%m-%d', '%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y')
+
+# Header aliases accepted in CSV statements, mapped to our field names
+CSV_COLUMNS = {
+    'date': 'date', 'posted': 'date', 'transaction date': 'date',
+    'title': 'title', 'payee': 'title', 'name': 'title',
+    'description': 'description', 'memo': 'description', 'notes': 'description',
+    'amount': 'amount', 'value': 'amount',
+    'type': 'transaction_type', 'transaction_type': 'transaction_type',
+    'category': 'category',
+}
+
+# Maximum number of row errors kept in an ImportResult
+MAX_REPORTED_ERRORS = 50
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    skipped: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.created / self.elapsed if self.elapsed else 0.0
+
+
+def iter_csv_rows(stream) -> Iterator[Dict[str, str]]:
+    """Yield CSV rows keyed by our field names, one line at a time"""
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = [CSV_COLUMNS.get(name.strip().lower()) for name in header]
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+        yield {column: value for column, value in zip(columns, values) if column}
+
+
+OFX_TOKEN = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+OFX_FIELDS = {'DTPOSTED': 'date', 'TRNAMT': 'amount', 'NAME': 'title', 'MEMO': 'description',
+              'TRNTYPE': 'ofx_type'}
+
+
+def iter_ofx_rows(stream, chunk_size=64 * 1024) -> Iterator[Dict[str, str]]:
+    """Yield STMTTRN records from an OFX 1.x (SGML) or 2.x (XML) statement.
+
+    The file is tokenized in chunks, so memory use does not depend on the
+    statement size. SGML leaf elements without closing tags are handled.
+    """
+    buffer = ''
+    record = None
+    while True:
+        chunk = stream.read(chunk_size)
+        buffer += chunk
+        # Keep a possibly incomplete trailing token for the next chunk
+        cut = buffer.rfind('<') if chunk else len(buffer)
+        if cut == -1:
+            buffer = ''
+            continue
+        for closing, tag, text in OFX_TOKEN.findall(buffer[:cut]):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                if closing and record is not None:
+                    yield record
+                    record = None
+                elif not closing:
+                    record = {}
+            elif record is not None and not closing and tag in OFX_FIELDS:
+                record[OFX_FIELDS[tag]] = text.strip()
+        buffer = buffer[cut:]
+        if not chunk:
+            break
+
+
+def parse_date(value: str) -> datetime:
+    value = (value or '').strip()
+    if not value:
+        raise ImportRowError('missing date')
+    ofx = re.match(r'^(\d{8})(\d{6})?', value)
+    if ofx:
+        parsed = datetime.strptime(ofx.group(1) + (ofx.group(2) or '000000'), '%Y%m%d%H%M%S')
+    else:
+        for date_format in DATE_FORMATS:
+            try:
+                parsed = datetime.strptime(value, date_format)
+                break
+            except ValueError:
+                continue
+        else:
+            try:
+                parsed = datetime.fromisoformat(value)
+            except ValueError:
+                raise ImportRowError(f'unrecognised date {value!r}')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class CategoryResolver:
+    """Category lookups against the in-memory catalogue.
+
+    Rows without a known category name are categorized by the user's rules
+    before falling back to "Other".
+    """
+
+    def __init__(self, user):
+        self.by_name: Dict[tuple, int] = {}
+        for category in get_catalogue().entries:
+            self.by_name.setdefault((category.name.strip().lower(), category.transaction_type), category.id)
+        self.fallback: Dict[str, Optional[int]] = {
+            'expense': self.by_name.get(('other', 'expense')),
+            'income': self.by_name.get(('other income', 'income')),
+        }
+        self.rules = categorization.get_matcher(user.pk)
+
+    def resolve(self, name, transaction_type, title='', amount=0) -> Optional[int]:
+        """Id of the category for a row"""
+        if name:
+            category_id = self.by_name.get((name.strip().lower(), transaction_type))
+            if category_id is not None:
+                return category_id
+        category_id = self.rules.match(title, amount, transaction_type)
+        if category_id is not None:
+            return category_id
+        return self.fallback[transaction_type]
+
+
+def build_transaction(user, row, categories: CategoryResolver) -> Transaction:
+    """Validate one parsed row and turn it into an unsaved Transaction"""
+    try:
+        amount = Decimal((row.get('amount') or '').replace(',', '').strip())
+    except InvalidOperation:
+        raise ImportRowError(f"invalid amount {row.get('amount')!r}")
+    if not amount.is_finite():
+        raise ImportRowError(f"invalid amount {row.get('amount')!r}")
+
+    transaction_type = (row.get('transaction_type') or '').strip().lower()
+    if transaction_type not in ('income', 'expense'):
+        if transaction_type:
+            raise ImportRowError(f'invalid type {transaction_type!r}')
+        transaction_type = 'expense' if amount < 0 else 'income'
+    amount = abs(amount).quantize(Decimal('0.01'))
+    if amount >= Decimal('100000000'):
+        raise ImportRowError(f'amount {amount} is too large')
+
+    title = (row.get('title') or '').strip()
+    description = (row.get('description') or '').strip()
+    if not title:
+        # Statements without a payee column carry it in the memo
+        title, description = description, ''
+    if not title:
+        raise ImportRowError('missing title')
+
+    return Transaction(
+        user=user,
+        title=title[:100],
+        amount=amount,
+        transaction_type=transaction_type,
+        category_id=categories.resolve(row.get('category'), transaction_type, title, amount),
+        date=parse_date(row.get('date')),
+        description=description,
+    )
+
+
+def import_transactions(user, rows, batch_size=1000, progress=None) -> ImportResult:
+    """Validate `rows` and insert them with one bulk_create per batch.
+
+    Each batch is written in its own database transaction together with
+    the rollup and ledger updates for the whole batch. Invalid rows are skipped and
+    reported in the result.
+    """
+    result = ImportResult()
+    categories = CategoryResolver(user)
+    started = time.perf_counter()
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            Transaction.objects.bulk_create(batch)
+            rollups.apply_transactions(batch)
+            ledger.apply_transactions(batch)
+        result.created += len(batch)
+        result.batches += 1
+        batch.clear()
+        if progress:
+            progress(result)
+
+    for line_number, row in enumerate(rows, start=1):
+        try:
+            batch.append(build_transaction(user, row, categories))
+        except ImportRowError as e:
+            result.skipped += 1
+            if len(result.errors) < MAX_REPORTED_ERRORS:
+                result.errors.append(f'Row {line_number}: {e}')
+            continue
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def detect_format(filename: str, requested: str = '') -> str:
+    if requested in ('csv', 'ofx'):
+        return requested
+    return 'ofx' if filename.lower().endswith(('.ofx', '.qfx')) else 'csv'
+
+
+def iter_rows(binary_stream, file_format: str):
+    """Rows from an uploaded or opened binary file in `file_format`"""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
+    if file_format == 'ofx':
+        return iter_ofx_rows(text)
+    return iter_csv_rows(text)
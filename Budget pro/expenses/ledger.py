@@ -0,0 +1,266 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .models import LedgerEntry, Transaction
+from .rollups import CENT
+
+ZERO = Decimal('0')
+# Rows written per bulk_create when a suffix is rebalanced
+REBALANCE_BATCH_SIZE = 1000
+
+
+def signed_amount(transaction_type, amount) -> Decimal:
+    amount = Decimal(str(amount))
+    return amount if transaction_type == 'income' else -amount
+
+
+def _after(date, transaction_id, inclusive=False):
+    """Entries ordered after the position (date, transaction_id)"""
+    tail = {'transaction_id__gte' if inclusive else 'transaction_id__gt': transaction_id}
+    return Q(date__gt=date) | Q(date=date, **tail)
+
+
+def balance_before(user_id, date, transaction_id) -> Decimal:
+    """Balance just before the position (date, transaction_id)"""
+    balance = (
+        LedgerEntry.objects.filter(user_id=user_id)
+        .filter(Q(date__lt=date) | Q(date=date, transaction_id__lt=transaction_id))
+        .order_by('-date', '-transaction_id')
+        .values_list('balance', flat=True)
+        .first()
+    )
+    return balance if balance is not None else ZERO
+
+
+def shift_suffix(user_id, date, transaction_id, delta, inclusive=False):
+    """Add `delta` to every balance after a position with one UPDATE"""
+    if delta:
+        LedgerEntry.objects.filter(user_id=user_id).filter(
+            _after(date, transaction_id, inclusive)
+        ).update(balance=F('balance') + delta)
+
+
+def post(tx):
+    """Add the entry for a new transaction and rebalance the entries after it"""
+    amount = signed_amount(tx.transaction_type, tx.amount)
+    with transaction.atomic():
+        # Usually an append, in which case the suffix is empty
+        shift_suffix(tx.user_id, tx.date, tx.pk, amount)
+        LedgerEntry.objects.create(
+            user_id=tx.user_id,
+            transaction_id=tx.pk,
+            date=tx.date,
+            amount=amount,
+            balance=balance_before(tx.user_id, tx.date, tx.pk) + amount,
+        )
+
+
+def unpost(user_id, date, transaction_id, amount):
+    """Remove a transaction's signed `amount` from the entries after it"""
+    with transaction.atomic():
+        LedgerEntry.objects.filter(transaction_id=transaction_id).delete()
+        shift_suffix(user_id, date, transaction_id, -amount)
+
+
+def repost(tx, previous):
+    """Update the ledger for an edited transaction.
+
+    `previous` is (user_id, date, signed amount) as stored before the edit.
+    When the position is unchanged only the entry and the suffix after it
+    are shifted by the difference; a moved entry is removed and re-posted.
+    """
+    old_user_id, old_date, old_amount = previous
+    amount = signed_amount(tx.transaction_type, tx.amount)
+    with transaction.atomic():
+        if (old_user_id, old_date) == (tx.user_id, tx.date):
+            if amount != old_amount:
+                LedgerEntry.objects.filter(transaction_id=tx.pk).update(amount=amount)
+                shift_suffix(tx.user_id, tx.date, tx.pk, amount - old_amount, inclusive=True)
+            return
+        unpost(old_user_id, old_date, tx.pk, old_amount)
+        post(tx)
+
+
+def rebalance_from(user_id, date=None, transaction_id=0):
+    """Recompute the user's entries from a position onwards in bulk.
+
+    Entries after the position are replaced with ones computed from the
+    transactions in a single ordered pass; with no `date` the user's whole
+    ledger is rebuilt.
+    """
+    with transaction.atomic():
+        entries = LedgerEntry.objects.filter(user_id=user_id)
+        transactions = Transaction.objects.filter(user_id=user_id)
+        balance = ZERO
+        if date is not None:
+            balance = balance_before(user_id, date, transaction_id)
+            entries = entries.filter(_after(date, transaction_id, inclusive=True))
+            transactions = transactions.filter(
+                Q(date__gt=date) | Q(date=date, pk__gte=transaction_id)
+            )
+        entries.delete()
+
+        batch = []
+        rows = transactions.order_by('date', 'pk').values_list('pk', 'date', 'transaction_type', 'amount')
+        for pk, tx_date, transaction_type, amount in rows.iterator(chunk_size=REBALANCE_BATCH_SIZE):
+            amount = signed_amount(transaction_type, amount)
+            balance += amount
+            batch.append(LedgerEntry(
+                user_id=user_id, transaction_id=pk, date=tx_date, amount=amount, balance=balance,
+            ))
+            if len(batch) >= REBALANCE_BATCH_SIZE:
+                LedgerEntry.objects.bulk_create(batch)
+                batch = []
+        LedgerEntry.objects.bulk_create(batch)
+
+
+def latest_entries(user_ids):
+    """Map user id to the (date, transaction id, balance) of its last entry"""
+    last = LedgerEntry.objects.filter(user_id=OuterRef('pk')).order_by('-date', '-transaction_id')
+    rows = User.objects.filter(pk__in=user_ids).annotate(
+        last_date=Subquery(last.values('date')[:1]),
+        last_transaction=Subquery(last.values('transaction_id')[:1]),
+        last_balance=Subquery(last.values('balance')[:1]),
+    ).values_list('pk', 'last_date', 'last_transaction', 'last_balance')
+    return {
+        pk: (date, transaction_id, Decimal(str(balance)).quantize(CENT))
+        for pk, date, transaction_id, balance in rows
+        if date is not None
+    }
+
+
+def suffix_entries(starts):
+    """Entries after each user's start position, as {user id: [entry, ...]}.
+
+    `starts` maps user id to a (date, transaction id) position.
+    """
+    suffixes = defaultdict(list)
+    user_ids = list(starts)
+    # Chunked to keep the OR expression well inside SQLite's depth limit
+    for offset in range(0, len(user_ids), 100):
+        condition = Q()
+        for user_id in user_ids[offset:offset + 100]:
+            condition |= Q(user_id=user_id) & _after(*starts[user_id])
+        rows = LedgerEntry.objects.filter(condition).order_by('date', 'transaction_id').only(
+            'pk', 'user_id', 'date', 'transaction_id', 'amount', 'balance'
+        )
+        for entry in rows:
+            suffixes[entry.user_id].append(entry)
+    return suffixes
+
+
+def apply_transactions(transactions):
+    """Post many new transactions with a fixed number of queries.
+
+    Used by batch writers that bypass model signals. New entries are
+    merged with the existing entries after them: each new entry's balance
+    comes from its neighbour, and existing entries are shifted by the sum
+    of the new amounts before them, one UPDATE per distinct shift.
+    """
+    by_user = defaultdict(list)
+    for tx in transactions:
+        by_user[tx.user_id].append(tx)
+    if not by_user:
+        return
+
+    with transaction.atomic():
+        tails = latest_entries(list(by_user))
+        starts = {}
+        for user_id, user_transactions in by_user.items():
+            user_transactions.sort(key=lambda tx: (tx.date, tx.pk))
+            first = user_transactions[0]
+            tail = tails.get(user_id)
+            if tail is not None and (first.date, first.pk) < tail[:2]:
+                starts[user_id] = (first.date, first.pk)
+        suffixes = suffix_entries(starts)
+
+        entries = []
+        shifts = defaultdict(list)
+        for user_id, user_transactions in by_user.items():
+            suffix = suffixes.get(user_id, [])
+            tail = tails.get(user_id)
+            previous_balance = tail[2] if tail is not None and not suffix else None
+            added = ZERO
+            position = 0
+            for tx in user_transactions:
+                while position < len(suffix) and (
+                    (suffix[position].date, suffix[position].transaction_id) < (tx.date, tx.pk)
+                ):
+                    shifts[added].append(suffix[position].pk)
+                    previous_balance = suffix[position].balance
+                    position += 1
+                amount = signed_amount(tx.transaction_type, tx.amount)
+                added += amount
+                if position < len(suffix):
+                    # Stored balance just before the next existing entry
+                    before = suffix[position].balance - suffix[position].amount
+                elif previous_balance is not None:
+                    before = previous_balance
+                else:
+                    before = ZERO
+                entries.append(LedgerEntry(
+                    user_id=user_id, transaction_id=tx.pk, date=tx.date, amount=amount, balance=before + added,
+                ))
+            for entry in suffix[position:]:
+                shifts[added].append(entry.pk)
+
+        LedgerEntry.objects.bulk_create(entries, batch_size=REBALANCE_BATCH_SIZE)
+        for delta, pks in shifts.items():
+            if delta:
+                for offset in range(0, len(pks), REBALANCE_BATCH_SIZE):
+                    LedgerEntry.objects.filter(pk__in=pks[offset:offset + REBALANCE_BATCH_SIZE]).update(
+                        balance=F('balance') + delta
+                    )
+
+
+def rebuild_for_users(user_ids):
+    with transaction.atomic():
+        for user_id in user_ids:
+            rebalance_from(user_id)
+
+
+def current_balance(user) -> Decimal:
+    """Balance after the user's latest transaction, from one index lookup"""
+    balance = (
+        LedgerEntry.objects.filter(user=user)
+        .order_by('-date', '-transaction_id')
+        .values_list('balance', flat=True)
+        .first()
+    )
+    return balance if balance is not None else ZERO
+
+
+def balance_as_of(user, when) -> Decimal:
+    """Balance including every transaction dated at or before `when`"""
+    balance = (
+        LedgerEntry.objects.filter(user=user, date__lte=when)
+        .order_by('-date', '-transaction_id')
+        .values_list('balance', flat=True)
+        .first()
+    )
+    return balance if balance is not None else ZERO
+
+
+def find_mismatches(user_ids):
+    """Return (transaction id, expected, actual) for wrong or missing entries"""
+    actual = dict(
+        LedgerEntry.objects.filter(user_id__in=user_ids).values_list('transaction_id', 'balance')
+    )
+    balances = defaultdict(lambda: ZERO)
+    mismatches = []
+    rows = (
+        Transaction.objects.filter(user_id__in=user_ids)
+        .order_by('user_id', 'date', 'pk')
+        .values_list('pk', 'user_id', 'transaction_type', 'amount')
+    )
+    for pk, user_id, transaction_type, amount in rows.iterator():
+        balances[user_id] += signed_amount(transaction_type, amount)
+        found = actual.pop(pk, None)
+        if found != balances[user_id]:
+            mismatches.append((pk, balances[user_id], found))
+    mismatches.extend((pk, None, found) for pk, found in actual.items())
+    return mismatches
@@ -0,0 +1,180 @@
+"""Live dashboard updates pushed to open tabs over server-sent events.
+
+A committed change to a user's transactions publishes a small delta (new
+totals, balance and the affected category and month buckets, read from the
+rollups) to the broker configured by settings.LIVE_UPDATES_BROKER; the
+live_updates view streams it to that user's dashboards. Batch writers
+publish a `reload` event instead, asking the page to refetch the charts.
+
+InProcessBroker only reaches tabs connected to the same process, which
+suits a single ASGI worker. Deployments with several workers need a
+broker shared between them that implements the same three methods.
+
+Streams are only offered to requests served over ASGI; under WSGI each
+open stream would hold a worker thread for as long as the tab is open.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, Set, Tuple
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.utils.module_loading import import_string
+
+from .models import MonthlyRollup
+from .summary import PeriodTotal, lifetime_totals
+
+# Events a slow tab may fall behind by before it is told to reload
+QUEUE_SIZE = 100
+
+
+class BaseBroker:
+    def subscribe(self, user_id) -> asyncio.Queue:
+        """Queue receiving `user_id`'s events; call from the event loop"""
+        raise NotImplementedError
+
+    def unsubscribe(self, user_id, queue):
+        raise NotImplementedError
+
+    def publish(self, user_id, event: dict):
+        """Deliver `event` to every subscriber of `user_id`; safe from any thread"""
+        raise NotImplementedError
+
+    def has_subscribers(self, user_id) -> bool:
+        """Whether an event for `user_id` is worth computing"""
+        return True
+
+
+class InProcessBroker(BaseBroker):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues: Dict[int, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = defaultdict(set)
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        with self._lock:
+            self._queues[user_id].add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            subscribers = self._queues.get(user_id, set())
+            subscribers.difference_update({entry for entry in subscribers if entry[1] is queue})
+            if not subscribers:
+                self._queues.pop(user_id, None)
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._queues.get(user_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(_deliver, queue, event)
+
+    def has_subscribers(self, user_id):
+        with self._lock:
+            return bool(self._queues.get(user_id))
+
+
+def _deliver(queue, event):
+    if queue.full():
+        # The tab has fallen behind; replace its backlog with one reload
+        while not queue.empty():
+            queue.get_nowait()
+        event = {'type': 'reload'}
+    queue.put_nowait(event)
+
+
+_broker = None
+
+
+def get_broker() -> BaseBroker:
+    """The broker configured by settings.LIVE_UPDATES_BROKER"""
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.LIVE_UPDATES_BROKER)()
+    return _broker
+
+
+def streaming_supported(request) -> bool:
+    """Whether `request` is served over ASGI, where an idle stream costs no thread"""
+    return isinstance(request, ASGIRequest)
+
+
+def build_delta(user_id, buckets: Iterable[Tuple]) -> dict:
+    """Totals, balance and the given rollup buckets after a change.
+
+    `buckets` are rollup keys (user, year, month, category, type) touched
+    by the change; three small rollup queries and one ledger lookup cover
+    them, whatever the size of the user's history.
+    """
+    # ledger imports rollups, which publishes through this module
+    from . import ledger
+
+    buckets = set(buckets)
+    income, expenses = lifetime_totals(user_id)
+    months = sorted({(year, month) for _, year, month, _, _ in buckets})
+    categories = {category_id for _, _, _, category_id, kind in buckets if kind == 'expense' and category_id}
+
+    rollups = MonthlyRollup.objects.filter(user_id=user_id)
+    month_filter = Q()
+    for year, month in months:
+        month_filter |= Q(year=year, month=month)
+    month_rows = {
+        (row['year'], row['month']): row
+        for row in rollups.filter(month_filter).values('year', 'month').annotate(
+            income=Sum('total', filter=Q(transaction_type='income')),
+            expenses=Sum('total', filter=Q(transaction_type='expense')),
+        ).order_by()
+    } if months else {}
+    category_rows = rollups.filter(transaction_type='expense', category_id__in=categories).values(
+        'category_id', 'category__name', 'category__color',
+    ).annotate(total=Sum('total')).order_by() if categories else []
+
+    return {
+        'type': 'transaction',
+        'totals': {
+            'income': float(income),
+            'expenses': float(expenses),
+            'balance': float(ledger.current_balance(user_id)),
+        },
+        'months': [
+            {
+                'label': PeriodTotal(start=date(year, month, 1)).label,
+                'year': year,
+                'month': month,
+                'income': float(month_rows.get((year, month), {}).get('income') or 0),
+                'expenses': float(month_rows.get((year, month), {}).get('expenses') or 0),
+            }
+            for year, month in months
+        ],
+        'categories': [
+            {
+                'id': row['category_id'],
+                'name': row['category__name'],
+                'color': row['category__color'],
+                'total': float(row['total'] or 0),
+            }
+            for row in category_rows
+        ],
+    }
+
+
+def transaction_changed(user_id, buckets):
+    """Publish a delta for `buckets` once the surrounding transaction commits"""
+    def publish():
+        broker = get_broker()
+        if broker.has_subscribers(user_id):
+            broker.publish(user_id, build_delta(user_id, buckets))
+    transaction.on_commit(publish)
+
+
+def data_reloaded(user_ids):
+    """Ask `user_ids`' dashboards to refetch everything after a batch write"""
+    def publish():
+        broker = get_broker()
+        for user_id in user_ids:
+            broker.publish(user_id, {'type': 'reload'})
+    transaction.on_commit(publish)
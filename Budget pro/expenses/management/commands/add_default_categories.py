@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from expenses.categories import bump_catalogue_version
 from expenses.models import Category
 
 
@@ -29,24 +30,24 @@ class Command(BaseCommand):
         ]
 
         all_categories = expense_categories + income_categories
-        created_count = 0
+        existing = set(Category.objects.values_list('name', 'transaction_type'))
+        missing = []
         
         for cat_data in all_categories:
-            category, created = Category.objects.get_or_create(
-                name=cat_data['name'],
-                transaction_type=cat_data['transaction_type'],
-                defaults={'color': cat_data['color']}
-            )
-            if created:
-                created_count += 1
+            if (cat_data['name'], cat_data['transaction_type']) in existing:
                 self.stdout.write(
-                    self.style.SUCCESS(f'Created category: {category.name} ({category.transaction_type})')  # type: ignore
+                    self.style.WARNING(f'Category already exists: {cat_data["name"]} ({cat_data["transaction_type"]})')  # type: ignore
                 )
             else:
+                missing.append(Category(**cat_data))
                 self.stdout.write(
-                    self.style.WARNING(f'Category already exists: {category.name} ({category.transaction_type})')  # type: ignore
+                    self.style.SUCCESS(f'Created category: {cat_data["name"]} ({cat_data["transaction_type"]})')  # type: ignore
                 )
+        
+        Category.objects.bulk_create(missing)
+        # bulk_create skips the signals that refresh the cached catalogue
+        bump_catalogue_version()
 
         self.stdout.write(
-            self.style.SUCCESS(f'\nTotal categories created: {created_count}')  # type: ignore
-        )
\ No newline at end of file
+            self.style.SUCCESS(f'\nTotal categories created: {len(missing)}')  # type: ignore
+        )
@@ -0,0 +1,152 @@
+import random
+import time
+from datetime import datetime, time as day_time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from expenses import ledger, rollups
+from expenses.models import Category, LedgerEntry, Transaction
+from expenses.summary import last_months
+
+USERNAME_PREFIX = 'bench_user_'
+
+
+class Command(BaseCommand):
+    help = ('Seed benchmark transactions and compare query plans and timings for the '
+            'dashboard, history and chart queries with and without the Transaction indexes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--rows', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Executions per query when timing')
+        parser.add_argument('--skip-seed', action='store_true',
+                            help='Reuse benchmark users seeded by an earlier run')
+        parser.add_argument('--cleanup', action='store_true',
+                            help='Delete the benchmark users and their transactions when done')
+
+    def handle(self, *args, **options):
+        if not options['skip_seed']:
+            self.seed(options['users'], options['rows'], options['batch_size'])
+
+        user = User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk').first()
+        if user is None:
+            raise CommandError('No benchmark users found; run without --skip-seed first')
+
+        indexes = Transaction._meta.indexes
+        self.drop_indexes(indexes)
+        try:
+            self.stdout.write(self.style.WARNING('\n=== Without composite indexes ==='))  # type: ignore
+            before = self.measure(user, options['repeat'])
+        finally:
+            self.create_indexes(indexes)
+        self.stdout.write(self.style.WARNING('\n=== With composite indexes ==='))  # type: ignore
+        after = self.measure(user, options['repeat'])
+
+        self.stdout.write('\n%-28s %12s %12s %9s' % ('query', 'before (ms)', 'after (ms)', 'speedup'))
+        for name in before:
+            speedup = before[name] / after[name] if after[name] else float('inf')
+            self.stdout.write('%-28s %12.3f %12.3f %8.1fx' % (name, before[name], after[name], speedup))
+
+        if options['cleanup']:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+    def seed(self, user_count, row_count, batch_size):
+        categories = list(Category.objects.all())
+        if not categories:
+            raise CommandError('No categories found; run add_default_categories first')
+        by_type = {
+            'income': [c for c in categories if c.transaction_type == 'income'] or categories,
+            'expense': [c for c in categories if c.transaction_type == 'expense'] or categories,
+        }
+
+        User.objects.bulk_create(
+            [User(username=f'{USERNAME_PREFIX}{i}', password='!') for i in range(user_count)],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX).values_list('pk', flat=True)
+        )
+
+        rng = random.Random(42)
+        now = timezone.now()
+        started = time.perf_counter()
+        created = 0
+        while created < row_count:
+            batch = []
+            for _ in range(min(batch_size, row_count - created)):
+                transaction_type = 'income' if rng.random() < 0.2 else 'expense'
+                batch.append(Transaction(
+                    user_id=rng.choice(user_ids),
+                    title=f'Benchmark {transaction_type}',
+                    amount=Decimal(rng.randint(100, 500000)) / 100,
+                    transaction_type=transaction_type,
+                    category=rng.choice(by_type[transaction_type]),
+                    date=now - timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 3)),
+                ))
+            Transaction.objects.bulk_create(batch)
+            created += len(batch)
+            self.stdout.write(f'Seeded {created}/{row_count} transactions', ending='\r')
+        self.stdout.write(f'\nSeeded {created} transactions in {time.perf_counter() - started:.1f}s')
+
+        # bulk_create skips the rollup and ledger signals
+        for start in range(0, len(user_ids), 500):
+            rollups.rebuild_for_users(user_ids[start:start + 500])
+            ledger.rebuild_for_users(user_ids[start:start + 500])
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def drop_indexes(self, indexes):
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.remove_index(Transaction, index)
+
+    def create_indexes(self, indexes):
+        with connection.schema_editor() as editor:
+            for index in indexes:
+                editor.add_index(Transaction, index)
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def queries(self, user):
+        """(name, queryset) pairs mirroring the hot paths of each view"""
+        month_start = timezone.make_aware(datetime.combine(last_months(6)[0], day_time.min))
+        user_rows = Transaction.objects.filter(user=user)
+        return [
+            ('home: recent', user_rows[:5]),
+            ('home: balance',
+             LedgerEntry.objects.filter(user=user).order_by('-date', '-transaction_id').values('balance')[:1]),
+            ('history: first page', user_rows[:50]),
+            ('history: income total',
+             user_rows.filter(transaction_type='income').values('user').annotate(total=Sum('amount'))),
+            ('chart_data: monthly series',
+             user_rows.filter(date__gte=month_start)
+             .annotate(period=TruncMonth('date'))
+             .values('period')
+             .annotate(
+                 income=Sum('amount', filter=Q(transaction_type='income')),
+                 expenses=Sum('amount', filter=Q(transaction_type='expense')),
+             )
+             .order_by()),
+        ]
+
+    def measure(self, user, repeat):
+        timings = {}
+        for name, queryset in self.queries(user):
+            self.stdout.write(f'\n{name}\n{queryset.explain()}')
+            started = time.perf_counter()
+            for _ in range(repeat):
+                list(queryset.all())
+            timings[name] = (time.perf_counter() - started) * 1000 / repeat
+        return timings
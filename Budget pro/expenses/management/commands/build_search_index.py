@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from expenses import search
+
+
+class Command(BaseCommand):
+    help = 'Build the full-text search index over existing transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Transactions indexed per statement')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        alias = options['database']
+        vendor = connections[alias].vendor
+
+        if vendor == 'sqlite':
+            indexed = search.rebuild_sqlite_index(
+                alias, options['batch_size'],
+                progress=lambda count: self.stdout.write(f'Indexed {count} transactions'),
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Search index rebuilt with {indexed} transactions')  # type: ignore
+            )
+        elif vendor == 'postgresql':
+            with connections[alias].cursor() as cursor:
+                cursor.execute(f'REINDEX INDEX {search.POSTGRES_INDEX_NAME}')
+            self.stdout.write(
+                self.style.SUCCESS('Search index rebuilt')  # type: ignore
+            )
+        else:
+            raise CommandError(f'No full-text index support for the {vendor} backend')
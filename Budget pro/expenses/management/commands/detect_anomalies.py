@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.anomalies import USERS_PER_CHUNK, run_detection
+
+
+class Command(BaseCommand):
+    help = 'Flag unusual amounts and duplicate charges among transactions added since the last run'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-users', type=int, default=USERS_PER_CHUNK,
+                            help='Users whose transactions are analysed together')
+        parser.add_argument('--full', action='store_true',
+                            help='Check every transaction instead of only those added since the last run')
+
+    def handle(self, *args, **options):
+        if options['chunk_users'] < 1:
+            raise CommandError('--chunk-users must be positive')
+
+        result = run_detection(
+            users_per_chunk=options['chunk_users'],
+            full=options['full'],
+            progress=lambda r: self.stdout.write(f'Processed {r.chunks} chunks', ending='\r'),
+        )
+
+        self.stdout.write('')
+        self.stdout.write(
+            self.style.SUCCESS(  # type: ignore
+                f'Checked {result.scanned} transactions of {result.users} users: '
+                f'{result.outliers} unusual amounts, {result.duplicates} possible duplicates '
+                f'({result.elapsed:.2f}s, watermark {result.last_id})'
+            )
+        )
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses import importers
+
+
+class Command(BaseCommand):
+    help = 'Import transactions for a user from a CSV or OFX bank statement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Statement file to import')
+        parser.add_argument('--user', required=True, help='Username that will own the transactions')
+        parser.add_argument('--format', choices=['csv', 'ofx'], default='',
+                            help='File format (detected from the extension by default)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per bulk insert')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:  # type: ignore
+            raise CommandError(f"User {options['user']!r} does not exist")
+
+        file_format = importers.detect_format(options['path'], options['format'])
+        try:
+            statement = open(options['path'], 'rb')
+        except OSError as e:
+            raise CommandError(str(e))
+
+        with statement:
+            result = importers.import_transactions(
+                user,
+                importers.iter_rows(statement, file_format),
+                batch_size=options['batch_size'],
+                progress=lambda r: self.stdout.write(f'Imported {r.created} rows', ending='\r'),
+            )
+
+        self.stdout.write('')
+        for error in result.errors:
+            self.stdout.write(self.style.WARNING(error))  # type: ignore
+        self.stdout.write(
+            self.style.SUCCESS(  # type: ignore
+                f'Imported {result.created} transactions in {result.batches} batches, '
+                f'skipped {result.skipped} rows ({result.rows_per_second:.0f} rows/s)'
+            )
+        )
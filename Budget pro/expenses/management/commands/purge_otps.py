@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from expenses import outbox
+from expenses.otp import DEFAULT_TTL, get_otp_store
+
+
+class Command(BaseCommand):
+    help = 'Delete expired one-time codes and the outbox messages that carried them; run periodically, e.g. from cron'
+
+    def handle(self, *args, **options):
+        # Codes older than their lifetime are useless, delivered or not
+        messages = outbox.purge_sensitive(timedelta(seconds=DEFAULT_TTL))
+        self.stdout.write(f'Deleted {messages} outbox messages carrying expired codes')
+
+        store = get_otp_store()
+        deleted = store.purge_expired()
+        if deleted is None:
+            self.stdout.write(
+                f'{type(store).__name__} relies on its cache timeout to expire codes; nothing to purge'
+            )
+            return
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired one-time codes'))  # type: ignore
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.rollups import find_mismatches, rebuild_for_users
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the monthly rollup table from transactions and verify it against the raw data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of users rebuilt per database transaction')
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help='Only rebuild the given user id (can be repeated)')
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Compare rollups with transactions without rebuilding')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        if options['users']:
+            user_ids = user_ids.filter(pk__in=options['users'])
+        user_ids = list(user_ids)
+
+        mismatches = []
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            if not options['verify_only']:
+                rebuild_for_users(batch)
+            mismatches.extend(find_mismatches(batch))
+            self.stdout.write(f'Processed {min(start + batch_size, len(user_ids))}/{len(user_ids)} users')
+
+        for key, expected, actual in mismatches:
+            self.stdout.write(
+                self.style.ERROR(f'Mismatch {key}: expected {expected}, found {actual}')  # type: ignore
+            )
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} rollup bucket(s) do not match transactions')
+
+        self.stdout.write(
+            self.style.SUCCESS('Rollups match transaction data')  # type: ignore
+        )
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.outbox import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued emails and SMS messages from the outbox table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Messages claimed and sent per batch')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds to sleep when the outbox is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the messages that are due now and exit')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        while True:
+            result = process_batch(options['batch_size'])
+            if result.claimed:
+                self.stdout.write(
+                    f'Sent {result.sent}, retrying {result.retried}, failed {result.failed} '
+                    f'of {result.claimed} messages'
+                )
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from expenses.recurring import run_due
+
+
+class Command(BaseCommand):
+    help = 'Post the due occurrences of all active recurring rules; safe to rerun'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Post occurrences up to this day (YYYY-MM-DD, default today)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rules processed per database transaction')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        today = None
+        if options['date']:
+            try:
+                today = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('--date must be in YYYY-MM-DD format')
+
+        result = run_due(
+            today,
+            batch_size=options['batch_size'],
+            progress=lambda r: self.stdout.write(f'Processed {r.rules} rules', ending='\r'),
+        )
+
+        self.stdout.write('')
+        self.stdout.write(
+            self.style.SUCCESS(  # type: ignore
+                f'Posted {result.posted} transactions from {result.rules} rules in {result.batches} batches, '
+                f'skipped {result.skipped} already posted ({result.elapsed:.2f}s)'
+            )
+        )
+        if result.failed:
+            self.stderr.write(f'{result.failed} rules failed and stay due; see the log for details')
@@ -0,0 +1,155 @@
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from expenses import ledger, rollups
+from expenses.categories import load_catalogue
+from expenses.models import Profile, Transaction
+
+USERNAME_PREFIX = 'benchmark_'
+# Password of every seeded user, for load generators that log in over HTTP
+BENCHMARK_PASSWORD = 'benchmark-pass-42'
+
+# (users, transactions) per --scale
+SCALES = {
+    '10k': (100, 10_000),
+    '1m': (2_000, 1_000_000),
+    '10m': (20_000, 10_000_000),
+}
+
+# (category, type, payees, median amount, relative frequency)
+TEMPLATES = [
+    ('Food & Dining', 'expense', ['Whole Foods', "Trader Joe's", 'Starbucks', 'Chipotle', 'Corner Bakery', 'Pizza Hut'], 24, 34),
+    ('Transportation', 'expense', ['Uber', 'Lyft', 'Shell', 'Metro Card', 'Chevron'], 18, 14),
+    ('Shopping', 'expense', ['Amazon', 'Target', 'IKEA', 'Best Buy', 'H&M'], 45, 12),
+    ('Entertainment', 'expense', ['Netflix', 'Spotify', 'AMC Theatres', 'Steam'], 15, 8),
+    ('Utilities', 'expense', ['City Electric', 'Water Utility', 'Comcast', 'Verizon Wireless'], 80, 6),
+    ('Rent & Housing', 'expense', ['Monthly Rent', 'Home Insurance', 'HOA Fee'], 1400, 3),
+    ('Healthcare', 'expense', ['CVS Pharmacy', 'Dental Care', 'City Clinic'], 40, 3),
+    ('Education', 'expense', ['Coursera', 'Campus Bookstore'], 30, 2),
+    ('Other', 'expense', ['ATM Withdrawal', 'Bank Fee'], 20, 4),
+    ('Salary', 'income', ['Payroll ACME Corp', 'Payroll Globex'], 3500, 8),
+    ('Freelance', 'income', ['Upwork', 'Client Payment'], 600, 3),
+    ('Investment', 'income', ['Dividend', 'Savings Interest'], 40, 2),
+    ('Gift', 'income', ['Birthday Gift'], 100, 1),
+]
+
+
+class Command(BaseCommand):
+    help = ('Seed users with realistic transactions for the benchmarks/ suite, '
+            'keeping rollups and the ledger in step')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='10k',
+                            help='Preset number of users and transactions')
+        parser.add_argument('--users', type=int, help='Override the number of users')
+        parser.add_argument('--rows', type=int, help='Override the number of transactions')
+        parser.add_argument('--months', type=int, default=24,
+                            help='Spread transactions over this many months before today')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42, help='Random seed, for repeatable datasets')
+
+    def handle(self, *args, **options):
+        user_count, row_count = SCALES[options['scale']]
+        user_count = options['users'] or user_count
+        row_count = options['rows'] if options['rows'] is not None else row_count
+        batch_size = options['batch_size']
+        if user_count < 1 or row_count < 0 or batch_size < 1 or options['months'] < 1:
+            raise CommandError('--users, --batch-size and --months must be positive')
+        if User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+            raise CommandError('Benchmark users already exist; seed into a fresh database (see SQLITE_PATH)')
+
+        templates = self.resolve_templates()
+        started = time.perf_counter()
+        user_ids = self.create_users(user_count, batch_size)
+
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        span = options['months'] * 30 * 24 * 60
+        weights = [template[4] for template in templates]
+        per_user, extra = divmod(row_count, user_count)
+        created = 0
+        batch = []
+
+        def flush():
+            # Same path as statement imports: one bulk insert, then the
+            # rollups and ledger for the whole batch
+            with transaction.atomic():
+                Transaction.objects.bulk_create(batch)
+                rollups.apply_transactions(batch)
+                ledger.apply_transactions(batch)
+            batch.clear()
+            self.stdout.write(f'Seeded {created}/{row_count} transactions', ending='\r')
+
+        for index, user_id in enumerate(user_ids):
+            for template in rng.choices(templates, weights, k=per_user + (index < extra)):
+                category_id, transaction_type, payees, median = template[:4]
+                batch.append(Transaction(
+                    user_id=user_id,
+                    title=rng.choice(payees),
+                    amount=Decimal(f'{max(rng.lognormvariate(math.log(median), 0.6), 0.5):.2f}'),
+                    transaction_type=transaction_type,
+                    category_id=category_id,
+                    date=now - timedelta(minutes=rng.randrange(span)),
+                ))
+                created += 1
+            # Flush between users, so each user's rows land in one batch
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(  # type: ignore
+            f'\nSeeded {user_count} users and {created} transactions in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def resolve_templates(self):
+        """TEMPLATES with category ids, creating the default categories if needed"""
+        # Read the table directly: the shared snapshot only moves on once
+        # category changes commit, and this runs inside the seeding transaction
+        catalogue = load_catalogue()
+        if not catalogue.entries:
+            call_command('add_default_categories', stdout=StringIO())
+            catalogue = load_catalogue()
+        by_name = {(entry.name, entry.transaction_type): entry.id for entry in catalogue.entries}
+        templates = []
+        for name, transaction_type, payees, median, weight in TEMPLATES:
+            category_id = by_name.get((name, transaction_type))
+            if category_id is None:
+                fallback = catalogue.for_type(transaction_type)
+                if not fallback:
+                    raise CommandError(f'No {transaction_type} categories found')
+                category_id = fallback[0].id
+            templates.append((category_id, transaction_type, payees, median, weight))
+        return templates
+
+    def create_users(self, user_count, batch_size):
+        password = make_password(BENCHMARK_PASSWORD)
+        width = len(str(user_count - 1))
+        User.objects.bulk_create(
+            [
+                User(username=f'{USERNAME_PREFIX}{i:0{width}d}', email=f'{USERNAME_PREFIX}{i}@example.com',
+                     password=password)
+                for i in range(user_count)
+            ],
+            batch_size=batch_size,
+        )
+        user_ids = list(
+            User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk').values_list('pk', flat=True)
+        )
+        # bulk_create skips the signal that gives every user a profile
+        Profile.objects.bulk_create([Profile(user_id=user_id) for user_id in user_ids], batch_size=batch_size)
+        return user_ids
@@ -0,0 +1,184 @@
+"""In-process request metrics collected by PerformanceMiddleware.
+
+Each worker process keeps fixed-bucket histograms per view and metric;
+`render_prometheus` serves them in the Prometheus text format together
+with percentiles estimated from the buckets. Nothing is shared between
+processes, so a scraper should collect every worker.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# (name, help, buckets) of the histograms kept for every view
+HISTOGRAMS = (
+    ('budgetpro_request_duration_seconds', 'Wall time of requests by view', SECONDS_BUCKETS),
+    ('budgetpro_db_queries', 'Database queries per request by view', QUERY_BUCKETS),
+    ('budgetpro_db_duration_seconds', 'Database time per request by view', SECONDS_BUCKETS),
+    ('budgetpro_template_duration_seconds', 'Template rendering time per request by view', SECONDS_BUCKETS),
+    ('budgetpro_response_size_bytes', 'Response body size by view', BYTES_BUCKETS),
+)
+
+current_stats: ContextVar[Optional['RequestStats']] = ContextVar('current_stats', default=None)
+
+
+class RequestStats:
+    """Counters for one request, filled in by the database and template hooks"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self._template_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # The last slot counts observations above every bound (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        rows = []
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            rows.append(('+Inf' if bound == float('inf') else format_value(bound), total))
+        return rows
+
+    def quantile(self, q) -> float:
+        """Estimate by linear interpolation inside the bucket holding the rank"""
+        if not self.count:
+            return float('nan')
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return float(self.buckets[-1])
+                lower = self.buckets[index - 1] if index else 0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return float(self.buckets[-1])
+
+
+class Registry:
+    """Per-process histograms and counters, keyed by view name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.over_budget: Dict[str, int] = {}
+
+    def observe(self, view, duration, stats: RequestStats, size, over_budget=False):
+        values = (duration, stats.queries, stats.db_time, stats.template_time, size)
+        with self._lock:
+            for (name, _, buckets), value in zip(HISTOGRAMS, values):
+                if value is None:
+                    continue
+                histogram = self.histograms.get((name, view))
+                if histogram is None:
+                    histogram = self.histograms[name, view] = Histogram(buckets)
+                histogram.observe(value)
+            if over_budget:
+                self.over_budget[view] = self.over_budget.get(view, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.over_budget.clear()
+
+
+registry = Registry()
+
+
+def format_value(value) -> str:
+    if isinstance(value, float) and value != value:
+        return 'NaN'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(source: Registry = registry) -> str:
+    lines = []
+    with source._lock:
+        for name, help_text, _ in HISTOGRAMS:
+            views = sorted(view for metric, view in source.histograms if metric == name)
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+            for view in views:
+                histogram = source.histograms[name, view]
+                label = f'view="{escape_label(view)}"'
+                for bound, total in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {total}')
+                lines.append(f'{name}_sum{{{label}}} {format_value(histogram.sum)}')
+                lines.append(f'{name}_count{{{label}}} {histogram.count}')
+
+            # Percentiles are estimated here as well, for readers without PromQL
+            quantile_name = f'{name}_quantile'
+            lines += [f'# HELP {quantile_name} {help_text}, percentiles estimated from the histogram',
+                      f'# TYPE {quantile_name} gauge']
+            for view in views:
+                histogram = source.histograms[name, view]
+                for q in QUANTILES:
+                    lines.append(
+                        f'{quantile_name}{{view="{escape_label(view)}",quantile="{q}"}} '
+                        f'{format_value(round(histogram.quantile(q), 6))}'
+                    )
+
+        name = 'budgetpro_query_budget_exceeded_total'
+        lines += [f'# HELP {name} Requests that ran more queries than their view budget',
+                  f'# TYPE {name} counter']
+        for view, count in sorted(source.over_budget.items()):
+            lines.append(f'{name}{{view="{escape_label(view)}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def instrument_templates():
+    """Time top-level template renders of the request in `current_stats`"""
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, 'instrumented', False):
+        return
+    original = Template.render
+
+    def render(self, context=None, request=None):
+        stats = current_stats.get()
+        if stats is None:
+            return original(self, context, request)
+        # Templates rendered while rendering another one are already timed
+        stats._template_depth += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            stats._template_depth -= 1
+            if not stats._template_depth:
+                stats.template_time += time.perf_counter() - started
+
+    render.instrumented = True
+    Template.render = render
@@ -0,0 +1,91 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PerformanceMiddleware:
+    """Measure every request and report it in Server-Timing and /internal/metrics.
+
+    Records wall time, database query count and time (through
+    connection.execute_wrapper), template rendering time and response size
+    per view. GET requests running more queries than the view's budget
+    are logged and counted, so N+1 regressions show up immediately. Enabled by
+    settings.PERFORMANCE_METRICS; place it first in MIDDLEWARE.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        metrics.instrument_templates()
+
+    def wrap_queries(self, stats):
+        """Count queries on this thread's connections until the stack closes"""
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats.execute))
+        return stack
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = metrics.RequestStats()
+        token = metrics.current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            with self.wrap_queries(stats):
+                response = self.get_response(request)
+        finally:
+            metrics.current_stats.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            # Under ASGI, sync views and the async ORM run the request's
+            # queries on one thread-sensitive thread; wrap its connections
+            stack = await sync_to_async(self.wrap_queries)(stats)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            metrics.current_stats.reset(token)
+        return self.record(request, response, stats, time.perf_counter() - started)
+
+    def record(self, request, response, stats, duration):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        # Streamed bodies are produced after this point and are not measured
+        size = None if response.streaming else len(response.content)
+        budget = settings.PERFORMANCE_QUERY_BUDGETS.get(view, settings.PERFORMANCE_QUERY_BUDGET)
+        # Writes fan out into rollup, ledger and budget updates, so only
+        # reads are held to the budget
+        over_budget = request.method in ('GET', 'HEAD') and stats.queries > budget
+        if over_budget:
+            logger.warning('%s ran %d queries, over its budget of %d (%s)', view, stats.queries, budget, request.path)
+        metrics.registry.observe(view, duration, stats, size, over_budget)
+
+        queries = f'{stats.queries} queries' + (f', over budget of {budget}' if over_budget else '')
+        response['Server-Timing'] = ', '.join([
+            f'total;dur={duration * 1000:.1f}',
+            f'db;dur={stats.db_time * 1000:.1f};desc="{queries}"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+        ])
+        return response
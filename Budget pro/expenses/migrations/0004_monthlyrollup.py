@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def populate_rollups(apps, schema_editor):
+    Transaction = apps.get_model('expenses', 'Transaction')
+    MonthlyRollup = apps.get_model('expenses', 'MonthlyRollup')
+    rows = (
+        Transaction.objects.annotate(period=TruncMonth('date'))
+        .values('user_id', 'period', 'category_id', 'transaction_type')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    rollups = []
+    for row in rows.iterator():
+        period = timezone.localtime(row['period'])
+        rollups.append(MonthlyRollup(
+            user_id=row['user_id'],
+            year=period.year,
+            month=period.month,
+            category_id=row['category_id'],
+            transaction_type=row['transaction_type'],
+            total=row['total'],
+            count=row['count'],
+        ))
+    MonthlyRollup.objects.bulk_create(rollups, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0003_category_transaction_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('transaction_type', models.CharField(choices=[('income', 'Income'), ('expense', 'Expense')], max_length=10)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='expenses.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'year', 'month'], name='rollup_user_month_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'year', 'month', 'category', 'transaction_type'), name='unique_monthly_rollup')],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+from django.db import OperationalError, migrations
+
+# The index definitions are copied here rather than imported from
+# expenses.search, so later changes to that module cannot change what this
+# migration does.
+FTS_TABLE = 'expenses_transaction_fts'
+
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='expenses_transaction', content_rowid='id',
+        tokenize='unicode61', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON expenses_transaction BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON expenses_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON expenses_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+SQLITE_DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+BATCH_SIZE = 5000
+
+
+def postgres_index():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    return GinIndex(SearchVector('title', 'description', config='simple'), name='txn_search_gin_idx')
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        try:
+            with connection.cursor() as cursor:
+                for statement in SQLITE_INDEX_SQL:
+                    cursor.execute(statement)
+        except OperationalError:
+            # SQLite built without FTS5; searches fall back to icontains
+            return
+        with connection.cursor() as cursor:
+            last_id = 0
+            while True:
+                cursor.execute(
+                    'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM expenses_transaction '
+                    'WHERE id > %s ORDER BY id LIMIT %s)',
+                    [last_id, BATCH_SIZE],
+                )
+                upper_id, count = cursor.fetchone()
+                if not count:
+                    break
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE}(rowid, title, description) '
+                    'SELECT id, title, description FROM expenses_transaction '
+                    'WHERE id > %s AND id <= %s',
+                    [last_id, upper_id],
+                )
+                last_id = upper_id
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    elif connection.vendor == 'postgresql':
+        Transaction = apps.get_model('expenses', 'Transaction')
+        schema_editor.add_index(Transaction, postgres_index())
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for statement in SQLITE_DROP_SQL:
+                try:
+                    cursor.execute(statement)
+                except OperationalError:
+                    pass
+    elif connection.vendor == 'postgresql':
+        Transaction = apps.get_model('expenses', 'Transaction')
+        schema_editor.remove_index(Transaction, postgres_index())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
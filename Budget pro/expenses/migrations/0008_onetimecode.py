@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0007_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OneTimeCode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purpose', models.CharField(max_length=20)),
+                ('email', models.EmailField(max_length=254)),
+                ('code_hash', models.CharField(max_length=64)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='otp_expires_idx')],
+                'constraints': [models.UniqueConstraint(fields=('purpose', 'email'), name='unique_otp_purpose_email')],
+            },
+        ),
+    ]
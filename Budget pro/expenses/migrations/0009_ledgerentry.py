@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:36
+
+import django.db.models.deletion
+from django.conf import settings
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_ledger(apps, schema_editor):
+    Transaction = apps.get_model('expenses', 'Transaction')
+    LedgerEntry = apps.get_model('expenses', 'LedgerEntry')
+    rows = Transaction.objects.order_by('user_id', 'date', 'pk').values_list(
+        'pk', 'user_id', 'date', 'transaction_type', 'amount'
+    )
+    entries, balances = [], {}
+    for pk, user_id, date, transaction_type, amount in rows.iterator():
+        amount = amount if transaction_type == 'income' else -amount
+        balances[user_id] = balances.get(user_id, Decimal('0')) + amount
+        entries.append(LedgerEntry(
+            user_id=user_id, transaction_id=pk, date=date, amount=amount, balance=balances[user_id],
+        ))
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0008_onetimecode'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=14)),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entry', to='expenses.transaction')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date', 'transaction'], name='ledger_user_date_idx')],
+            },
+        ),
+        migrations.RunPython(populate_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:47
+
+import django.core.validators
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fix_zero_intervals(apps, schema_editor):
+    # Rules saved with interval 0 never advanced; treat them as every period
+    RecurringRule = apps.get_model('expenses', 'RecurringRule')
+    RecurringRule.objects.filter(interval__lt=1).update(interval=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0014_dataversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recurringrule',
+            name='interval',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.RunPython(fix_zero_intervals, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='recurringrule',
+            constraint=models.CheckConstraint(condition=models.Q(('interval__gte', 1)), name='recurring_interval_positive'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0015_recurring_interval_positive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxmessage',
+            name='sensitive',
+            field=models.BooleanField(default=False),
+        ),
+    ]
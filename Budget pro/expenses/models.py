@@ -1,4 +1,8 @@
-from django.db import models
+import re
+
+from django.core.exceptions import ValidationError
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from typing import Any
@@ -56,9 +60,344 @@ class Transaction(models.Model):
     date = models.DateTimeField(default=timezone.now)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(default=timezone.now)
+    # Set on transactions posted by the recurring scheduler
+    recurring_rule = models.ForeignKey(
+        'RecurringRule', on_delete=models.SET_NULL, null=True, blank=True, related_name='transactions'
+    )
+    occurrence_date = models.DateField(null=True, blank=True)
     
     class Meta:
         ordering = ['-date']
+        constraints = [
+            # Reruns of the scheduler cannot post an occurrence twice
+            models.UniqueConstraint(
+                fields=['recurring_rule', 'occurrence_date'],
+                condition=models.Q(recurring_rule__isnull=False),
+                name='unique_recurring_occurrence',
+            ),
+        ]
+        indexes = [
+            # Recent/history listings: WHERE user_id = ? ORDER BY date DESC
+            models.Index(fields=['user', '-date'], name='txn_user_date_idx'),
+            # Totals and date-range series filtered by type
+            models.Index(fields=['user', 'transaction_type', 'date'], name='txn_user_type_date_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Keep the row and its rollup update (see signals.py) in one transaction
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+    
+    def __str__(self) -> str:
+        return f"{self.title} - {self.amount}" if self.title and self.amount else "Unnamed Transaction"
+
+class MonthlyRollup(models.Model):
+    """Per-user totals for one calendar month, category and transaction type.
+
+    Maintained incrementally from Transaction signals. Rows are only ever
+    summed, so a duplicate bucket (e.g. two rows for a deleted category)
+    does not affect results. `rebuild_rollups` recomputes the table.
+    """
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'year', 'month', 'category', 'transaction_type'],
+                name='unique_monthly_rollup',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'year', 'month'], name='rollup_user_month_idx'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.year}-{self.month:02d} {self.transaction_type}: {self.total}"
+
+class OutboxMessage(models.Model):
+    """Outbound email or SMS waiting to be delivered by `run_outbox`"""
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    CHANNELS = [
+        ('email', 'Email'),
+        ('sms', 'SMS'),
+    ]
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    channel = models.CharField(max_length=10, choices=CHANNELS)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    # Bodies carrying secrets such as one-time codes are cleared once the
+    # message is sent or abandoned
+    sensitive = models.BooleanField(default=False)
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.channel} to {self.recipient} ({self.status})"
+
+
+class OneTimeCode(models.Model):
+    """Hashed OTP for one (purpose, email) pair, used by DatabaseOTPStore"""
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    purpose = models.CharField(max_length=20)
+    email = models.EmailField()
+    code_hash = models.CharField(max_length=64)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['purpose', 'email'], name='unique_otp_purpose_email'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.purpose} code for {self.email}"
+
+class LedgerEntry(models.Model):
+    """Running balance of a user's account after one transaction.
+
+    Entries are ordered by (date, transaction id); `balance` includes the
+    entry's own signed `amount`. Maintained from Transaction signals, see
+    ledger.py. `rebuild_ledger` recomputes the table.
+    """
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    transaction = models.OneToOneField(Transaction, on_delete=models.CASCADE, related_name='ledger_entry')
+    date = models.DateTimeField()
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    
+    class Meta:
+        indexes = [
+            # Balance lookups: WHERE user_id = ? AND date <= ? ORDER BY date DESC, transaction_id DESC
+            models.Index(fields=['user', 'date', 'transaction'], name='ledger_user_date_idx'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.user_id} {self.date:%Y-%m-%d}: {self.balance}"
+
+class RecurringRule(models.Model):
+    """Template for a transaction repeated on a schedule.
+
+    Occurrences fall every `interval` days, weeks, months or years from
+    `start_date`; monthly and yearly rules keep the start day, clamped to
+    the end of shorter months. `run_recurring` posts due occurrences and
+    advances `next_occurrence`.
+    """
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    FREQUENCIES = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    title = models.CharField(max_length=100)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_type = models.CharField(max_length=10, choices=Transaction.TRANSACTION_TYPES)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    description = models.TextField(blank=True)
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES, default='monthly')
+    interval = models.PositiveSmallIntegerField(default=1, validators=[MinValueValidator(1)])
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    next_occurrence = models.DateField(blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            # An interval of 0 would post the same occurrence forever
+            models.CheckConstraint(condition=models.Q(interval__gte=1), name='recurring_interval_positive'),
+        ]
+        indexes = [
+            # Scheduler scan: WHERE is_active AND next_occurrence <= today
+            models.Index(fields=['is_active', 'next_occurrence'], name='recurring_due_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        if self.next_occurrence is None:
+            self.next_occurrence = self.start_date
+        super().save(*args, **kwargs)
+    
+    def __str__(self) -> str:
+        return f"{self.title} ({self.get_frequency_display()})"  # type: ignore
+
+class Budget(models.Model):
+    """Monthly spending limit for one of a user's expense categories.
+
+    Spend is read from MonthlyRollup, which is kept current as transactions
+    change; crossings of ALERT_THRESHOLDS are recorded as BudgetAlert rows
+    when the spend is written (see budgets.py).
+    """
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    # Percentages of the limit that raise an alert
+    ALERT_THRESHOLDS = (80, 100)
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    monthly_limit = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_budget_category'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.category} budget: {self.monthly_limit}"
+
+class BudgetAlert(models.Model):
+    """A budget's spend reaching `threshold` percent in one month"""
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='alerts')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    threshold = models.PositiveSmallIntegerField()
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            # Falling back below a threshold and crossing it again does not re-alert
+            models.UniqueConstraint(fields=['budget', 'year', 'month', 'threshold'], name='unique_budget_alert'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.budget} reached {self.threshold}% in {self.year}-{self.month:02d}"
+
+class TransactionFlag(models.Model):
+    """Unusual transaction found by the `detect_anomalies` job"""
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    KINDS = [
+        ('outlier', 'Unusual amount'),
+        ('duplicate', 'Possible duplicate'),
+    ]
+    
+    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='flags')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # Robust z-score for outliers, days since the earlier charge for duplicates
+    score = models.FloatField(default=0)
+    reason = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['transaction', 'kind'], name='unique_transaction_flag'),
+        ]
+    
+    def __str__(self) -> str:
+        return f"{self.get_kind_display()}: {self.transaction_id}"  # type: ignore
+
+class JobWatermark(models.Model):
+    """Highest Transaction id a batch job has processed, by job name"""
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    name = models.CharField(max_length=50, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self) -> str:
+        return f"{self.name} at {self.last_id}"
+
+class CategoryRule(models.Model):
+    """Picks a category for transactions whose title and amount match.
+
+    A blank pattern matches every title. When several rules match, the one
+    with the lowest `priority` (then the oldest) wins; rules whose category
+    is of the other transaction type are ignored.
+    """
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    MATCH_TYPES = [
+        ('contains', 'Title contains'),
+        ('regex', 'Title matches regex'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='category_rules')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE)
+    match_type = models.CharField(max_length=10, choices=MATCH_TYPES, default='contains')
+    pattern = models.CharField(max_length=200, blank=True)
+    min_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_amount = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    priority = models.PositiveIntegerField(default=100)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['priority', 'pk']
+    
+    def clean(self):
+        if self.match_type == 'regex' and self.pattern:
+            try:
+                re.compile(self.pattern)
+            except re.error as e:
+                raise ValidationError({'pattern': f'Invalid regular expression: {e}'})
+        if self.min_amount is not None and self.max_amount is not None and self.min_amount > self.max_amount:
+            raise ValidationError({'max_amount': 'The maximum amount must not be below the minimum.'})
+    
+    def __str__(self) -> str:
+        return f"{self.get_match_type_display()} {self.pattern!r} -> {self.category}"  # type: ignore
+
+class DataVersion(models.Model):
+    """Generation counter behind cache keys and ETags, by key (see versions.py).
+
+    Kept in the database so that every web process and management command
+    sees the same value; a per-process cache would hide their bumps.
+    """
+    # Add type hint for the objects manager to satisfy static type checkers
+    objects: models.Manager
+    
+    key = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField()
     
     def __str__(self) -> str:
-        return f"{self.title} - {self.amount}" if self.title and self.amount else "Unnamed Transaction"
\ No newline at end of file
+        return f"{self.key} at {self.value}"
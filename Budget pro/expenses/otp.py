@@ -0,0 +1,180 @@
+import math
+import os
+import tempfile
+import time
+import zlib
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files import locks
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+from .models import OneTimeCode
+
+# Default lifetime of an OTP in seconds
+DEFAULT_TTL = 600
+# Lock files serialising CacheOTPStore updates; keys are spread over them by hash
+LOCK_STRIPES = 16
+
+
+def normalize_email(email) -> str:
+    return (email or '').strip().lower()
+
+
+def hash_code(purpose, email, code) -> str:
+    """Keyed hash of a code; plain codes are never stored"""
+    return salted_hmac('expenses.otp', f'{purpose}:{email}:{code}').hexdigest()
+
+
+class BaseOTPStore:
+    """Storage for one active OTP per (purpose, email).
+
+    Subclasses must be usable from several worker processes at once, so
+    any of them can verify a code issued by another.
+    """
+
+    def __init__(self, max_attempts=None):
+        self.max_attempts = max_attempts or settings.OTP_MAX_ATTEMPTS
+
+    def issue(self, purpose, email, code, ttl=DEFAULT_TTL):
+        """Store `code`, replacing any earlier code for the same pair"""
+        raise NotImplementedError
+
+    def verify(self, purpose, email, code) -> bool:
+        """Check `code`; a correct code is consumed, a wrong one counts an attempt"""
+        raise NotImplementedError
+
+    def discard(self, purpose, email):
+        raise NotImplementedError
+
+    def purge_expired(self) -> Optional[int]:
+        """Delete expired codes and return how many were removed.
+
+        None means the store expires codes by itself and there is nothing
+        to purge.
+        """
+        raise NotImplementedError
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """Codes in the OneTimeCode table, looked up by its (purpose, email) key"""
+
+    def issue(self, purpose, email, code, ttl=DEFAULT_TTL):
+        email = normalize_email(email)
+        OneTimeCode.objects.update_or_create(
+            purpose=purpose,
+            email=email,
+            defaults={
+                'code_hash': hash_code(purpose, email, code),
+                'attempts': 0,
+                'expires_at': timezone.now() + timedelta(seconds=ttl),
+                'created_at': timezone.now(),
+            },
+        )
+
+    def verify(self, purpose, email, code) -> bool:
+        email = normalize_email(email)
+        with transaction.atomic():
+            entry = (
+                OneTimeCode.objects.select_for_update()
+                .filter(purpose=purpose, email=email, expires_at__gt=timezone.now())
+                .first()
+            )
+            if entry is None or entry.attempts >= self.max_attempts:
+                return False
+            if constant_time_compare(entry.code_hash, hash_code(purpose, email, code)):
+                entry.delete()
+                return True
+            OneTimeCode.objects.filter(pk=entry.pk).update(attempts=F('attempts') + 1)
+            return False
+
+    def discard(self, purpose, email):
+        OneTimeCode.objects.filter(purpose=purpose, email=normalize_email(email)).delete()
+
+    def purge_expired(self) -> int:
+        deleted, _ = OneTimeCode.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class CacheOTPStore(BaseOTPStore):
+    """Codes in a cache alias shared by all workers (file or database backed).
+
+    Expiry is the cache timeout, so the backend's own culling purges
+    expired codes. The default LocMemCache is per process and unsuitable.
+
+    Each code is a single entry holding its hash, wrong-guess count and
+    expiry. Cache backends do not update entries atomically across
+    processes, so every change to an entry holds an exclusive lock on a
+    file in `lock_dir` (the cache directory for the file-based backend).
+    """
+
+    def __init__(self, alias='otp', lock_dir=None, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = caches[alias]
+        self.lock_dir = lock_dir or getattr(self.cache, '_dir', None) or tempfile.gettempdir()
+
+    def _key(self, purpose, email):
+        return f'otp:{purpose}:{email}'
+
+    @contextmanager
+    def _locked(self, key):
+        # Keys share a fixed set of lock files, so none are left behind
+        stripe = zlib.crc32(key.encode()) % LOCK_STRIPES
+        os.makedirs(self.lock_dir, exist_ok=True)
+        with open(os.path.join(self.lock_dir, f'otp-{stripe}.lock'), 'ab') as f:
+            locks.lock(f, locks.LOCK_EX)
+            try:
+                yield
+            finally:
+                locks.unlock(f)
+
+    def issue(self, purpose, email, code, ttl=DEFAULT_TTL):
+        email = normalize_email(email)
+        key = self._key(purpose, email)
+        with self._locked(key):
+            self.cache.set(key, (hash_code(purpose, email, code), 0, time.time() + ttl), ttl)
+
+    def verify(self, purpose, email, code) -> bool:
+        email = normalize_email(email)
+        key = self._key(purpose, email)
+        with self._locked(key):
+            entry = self.cache.get(key)
+            if entry is None:
+                return False
+            code_hash, attempts, expires_at = entry
+            remaining = expires_at - time.time()
+            if remaining <= 0 or attempts >= self.max_attempts:
+                return False
+            if constant_time_compare(code_hash, hash_code(purpose, email, code)):
+                self.cache.delete(key)
+                return True
+            # Keep the code's own expiry rather than restarting the timeout
+            self.cache.set(key, (code_hash, attempts + 1, expires_at), math.ceil(remaining))
+            return False
+
+    def discard(self, purpose, email):
+        key = self._key(purpose, normalize_email(email))
+        with self._locked(key):
+            self.cache.delete(key)
+
+    def purge_expired(self):
+        # Entries are dropped by the cache timeout, not by purge_otps
+        return None
+
+
+_store = None
+
+
+def get_otp_store() -> BaseOTPStore:
+    """The store configured by settings.OTP_STORE"""
+    global _store
+    if _store is None:
+        _store = import_string(settings.OTP_STORE)()
+    return _store
@@ -0,0 +1,143 @@
+import uuid
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxMessage
+
+# Retry delay after the first failure, doubled on every further attempt
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(hours=1)
+# A message claimed longer ago than this belongs to a crashed worker
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+
+@dataclass
+class BatchResult:
+    claimed: int = 0
+    sent: int = 0
+    retried: int = 0
+    failed: int = 0
+
+
+def enqueue_email(recipient, subject, body, sensitive=False) -> OutboxMessage:
+    return OutboxMessage.objects.create(
+        channel='email', recipient=recipient, subject=subject, body=body, sensitive=sensitive,
+    )
+
+
+def enqueue_sms(recipient, body, sensitive=False) -> OutboxMessage:
+    return OutboxMessage.objects.create(channel='sms', recipient=recipient, body=body, sensitive=sensitive)
+
+
+def retry_delay(attempts) -> timedelta:
+    return min(RETRY_BASE_DELAY * (2 ** (attempts - 1)), RETRY_MAX_DELAY)
+
+
+def claim_batch(batch_size):
+    """Mark up to `batch_size` due messages as sending and return them.
+
+    The claim is a single conditional UPDATE tagged with a fresh token, so
+    several workers can poll the table without sending a message twice.
+    """
+    now = timezone.now()
+    due = Q(status='pending', next_attempt_at__lte=now) | Q(status='sending', claimed_at__lt=now - CLAIM_TIMEOUT)
+    ids = list(
+        OutboxMessage.objects.filter(due).order_by('next_attempt_at').values_list('pk', flat=True)[:batch_size]
+    )
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    OutboxMessage.objects.filter(due, pk__in=ids).update(status='sending', claim_token=token, claimed_at=now)
+    return list(OutboxMessage.objects.filter(claim_token=token, status='sending'))
+
+
+class SmsSender:
+    """Twilio client created on first use and reused for the whole batch"""
+
+    def __init__(self):
+        self.client = None
+
+    def send(self, message):
+        if not (settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN):
+            # Development fallback, as before the outbox existed
+            print(f"SMS for {message.recipient}: {message.body}")
+            return
+        if self.client is None:
+            from twilio.rest import Client
+            self.client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+        self.client.messages.create(body=message.body, from_=settings.TWILIO_PHONE_NUMBER, to=message.recipient)
+
+
+def process_batch(batch_size=100) -> BatchResult:
+    """Deliver one batch of due messages over a single SMTP connection"""
+    messages = claim_batch(batch_size)
+    result = BatchResult(claimed=len(messages))
+    if not messages:
+        return result
+
+    connection = None
+    sms = SmsSender()
+    try:
+        for message in messages:
+            message.attempts += 1
+            try:
+                if message.channel == 'email':
+                    if connection is None:
+                        connection = get_connection()
+                        connection.open()
+                    EmailMessage(
+                        subject=message.subject,
+                        body=message.body,
+                        from_email=settings.DEFAULT_FROM_EMAIL,
+                        to=[message.recipient],
+                        connection=connection,
+                    ).send()
+                else:
+                    sms.send(message)
+            except Exception as e:
+                message.last_error = str(e)
+                if message.attempts >= message.max_attempts:
+                    message.status = 'failed'
+                    result.failed += 1
+                else:
+                    message.status = 'pending'
+                    message.next_attempt_at = timezone.now() + retry_delay(message.attempts)
+                    result.retried += 1
+                # A broken SMTP session is reopened for the next message
+                if connection is not None and message.channel == 'email':
+                    connection.close()
+                    connection = None
+            else:
+                message.status = 'sent'
+                message.sent_at = timezone.now()
+                message.last_error = ''
+                result.sent += 1
+            if message.sensitive and message.status in ('sent', 'failed'):
+                message.body = ''
+            message.claim_token = ''
+            message.save(update_fields=[
+                'status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'claim_token', 'body',
+            ])
+    finally:
+        if connection is not None:
+            connection.close()
+    return result
+
+
+def purge_sensitive(older_than: timedelta) -> int:
+    """Delete sensitive messages created more than `older_than` ago.
+
+    Messages still being sent are left to finish; their bodies are cleared
+    when they do.
+    """
+    deleted, _ = (
+        OutboxMessage.objects.filter(sensitive=True, created_at__lt=timezone.now() - older_than)
+        .exclude(status='sending')
+        .delete()
+    )
+    return deleted
@@ -0,0 +1,74 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(obj) -> str:
+    raw = f'{obj.date.isoformat()}|{obj.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_part, pk_part = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        return datetime.fromisoformat(date_part), int(pk_part)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(str(e))
+
+
+class KeysetPage:
+    """One page of a queryset ordered newest first by (date, id).
+
+    Seeking with `after` (older rows) or `before` (newer rows) uses a
+    WHERE clause on the last row seen instead of OFFSET, so every page
+    costs the same index range scan no matter how deep the user goes.
+    """
+
+    def __init__(self, queryset, page_size, after=None, before=None):
+        self.page_size = page_size
+        if before:
+            date, pk = decode_cursor(before)
+            rows = list(
+                queryset.filter(Q(date__gt=date) | Q(date=date, pk__gt=pk))
+                .order_by('date', 'pk')[:page_size + 1]
+            )
+            self._has_previous = len(rows) > page_size
+            self._has_next = True
+            self.object_list = list(reversed(rows[:page_size]))
+        else:
+            if after:
+                date, pk = decode_cursor(after)
+                queryset = queryset.filter(Q(date__lt=date) | Q(date=date, pk__lt=pk))
+            rows = list(queryset.order_by('-date', '-pk')[:page_size + 1])
+            self._has_next = len(rows) > page_size
+            self._has_previous = bool(after)
+            self.object_list = rows[:page_size]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self) -> bool:
+        return self._has_previous and bool(self.object_list)
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+    @property
+    def next_cursor(self) -> str:
+        return encode_cursor(self.object_list[-1]) if self.has_next() else ''
+
+    @property
+    def previous_cursor(self) -> str:
+        return encode_cursor(self.object_list[0]) if self.has_previous() else ''
@@ -0,0 +1,4 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_dataversion"."value" AS "value" FROM "expenses_dataversion" WHERE "expenses_dataversion"."key" = ? ORDER BY "expenses_dataversion"."id" ASC LIMIT ?
+SELECT "expenses_monthlyrollup"."year" AS "year", "expenses_monthlyrollup"."month" AS "month", "expenses_monthlyrollup"."transaction_type" AS "transaction_type", "expenses_monthlyrollup"."category_id" AS "category_id", "expenses_category"."name" AS "category__name", "expenses_category"."color" AS "category__color", "expenses_monthlyrollup"."total" AS "total" FROM "expenses_monthlyrollup" LEFT OUTER JOIN "expenses_category" ON ("expenses_monthlyrollup"."category_id" = "expenses_category"."id") WHERE "expenses_monthlyrollup"."user_id" = ?
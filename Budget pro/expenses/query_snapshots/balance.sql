@@ -0,0 +1,3 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_ledgerentry"."balance" AS "balance" FROM "expenses_ledgerentry" WHERE "expenses_ledgerentry"."user_id" = ? ORDER BY "expenses_ledgerentry"."date" DESC, "expenses_ledgerentry"."transaction_id" DESC LIMIT ?
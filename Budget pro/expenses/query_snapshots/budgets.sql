@@ -0,0 +1,3 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_budget"."id", "expenses_budget"."user_id", "expenses_budget"."category_id", "expenses_budget"."monthly_limit", "expenses_budget"."created_at", (CAST(COALESCE((SELECT U0."total" AS "total" FROM "expenses_monthlyrollup" U0 WHERE (U0."category_id" = ("expenses_budget"."category_id") AND U0."month" = ? AND U0."transaction_type" = ? AND U0."user_id" = ("expenses_budget"."user_id") AND U0."year" = ?) LIMIT ?), (CAST(? AS NUMERIC))) AS NUMERIC)) AS "spent", "expenses_category"."id", "expenses_category"."name", "expenses_category"."color", "expenses_category"."transaction_type" FROM "expenses_budget" INNER JOIN "expenses_category" ON ("expenses_budget"."category_id" = "expenses_category"."id") WHERE "expenses_budget"."user_id" = ? ORDER BY "expenses_category"."name" ASC
@@ -0,0 +1,2 @@
+SELECT "expenses_dataversion"."value" AS "value" FROM "expenses_dataversion" WHERE "expenses_dataversion"."key" = ? ORDER BY "expenses_dataversion"."id" ASC LIMIT ?
+SELECT "expenses_dataversion"."value" AS "value" FROM "expenses_dataversion" WHERE "expenses_dataversion"."key" = ? ORDER BY "expenses_dataversion"."id" ASC LIMIT ?
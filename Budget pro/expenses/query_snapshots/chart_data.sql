@@ -0,0 +1,6 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_dataversion"."value" AS "value" FROM "expenses_dataversion" WHERE "expenses_dataversion"."key" = ? ORDER BY "expenses_dataversion"."id" ASC LIMIT ?
+SELECT "expenses_dataversion"."value" AS "value" FROM "expenses_dataversion" WHERE "expenses_dataversion"."key" = ? ORDER BY "expenses_dataversion"."id" ASC LIMIT ?
+SELECT "expenses_monthlyrollup"."year" AS "year", "expenses_monthlyrollup"."month" AS "month", (CAST(SUM("expenses_monthlyrollup"."total") FILTER (WHERE "expenses_monthlyrollup"."transaction_type" = ?) AS NUMERIC)) AS "income", (CAST(SUM("expenses_monthlyrollup"."total") FILTER (WHERE "expenses_monthlyrollup"."transaction_type" = ?) AS NUMERIC)) AS "expenses" FROM "expenses_monthlyrollup" WHERE "expenses_monthlyrollup"."user_id" = ? GROUP BY ?, ?
+SELECT "expenses_monthlyrollup"."category_id" AS "category_id", "expenses_category"."name" AS "category__name", "expenses_category"."color" AS "category__color", (CAST(SUM("expenses_monthlyrollup"."total") AS NUMERIC)) AS "category_total", SUM("expenses_monthlyrollup"."count") AS "category_count" FROM "expenses_monthlyrollup" INNER JOIN "expenses_category" ON ("expenses_monthlyrollup"."category_id" = "expenses_category"."id") WHERE ("expenses_monthlyrollup"."category_id" IS NOT NULL AND "expenses_monthlyrollup"."transaction_type" = ? AND "expenses_monthlyrollup"."user_id" = ?) GROUP BY ?, ?, ? HAVING SUM("expenses_monthlyrollup"."count") > ? ORDER BY ? DESC
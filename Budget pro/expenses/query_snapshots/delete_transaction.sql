@@ -0,0 +1,4 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_transaction"."id", "expenses_transaction"."user_id", "expenses_transaction"."title", "expenses_transaction"."amount", "expenses_transaction"."transaction_type", "expenses_transaction"."category_id", "expenses_transaction"."date", "expenses_transaction"."description", "expenses_transaction"."created_at", "expenses_transaction"."recurring_rule_id", "expenses_transaction"."occurrence_date" FROM "expenses_transaction" WHERE ("expenses_transaction"."id" = ? AND "expenses_transaction"."user_id" = ?) LIMIT ?
+SELECT "expenses_category"."id", "expenses_category"."name", "expenses_category"."color", "expenses_category"."transaction_type" FROM "expenses_category" WHERE "expenses_category"."id" = ? LIMIT ?
@@ -0,0 +1,3 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_transaction"."date" AS "date", "expenses_transaction"."title" AS "title", "expenses_transaction"."amount" AS "amount", "expenses_transaction"."transaction_type" AS "transaction_type", "expenses_category"."name" AS "category__name", "expenses_transaction"."description" AS "description" FROM "expenses_transaction" LEFT OUTER JOIN "expenses_category" ON ("expenses_transaction"."category_id" = "expenses_category"."id") WHERE "expenses_transaction"."user_id" = ? ORDER BY ? DESC, "expenses_transaction"."id" DESC
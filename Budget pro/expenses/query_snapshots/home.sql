@@ -0,0 +1,7 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_dataversion"."value" AS "value" FROM "expenses_dataversion" WHERE "expenses_dataversion"."key" = ? ORDER BY "expenses_dataversion"."id" ASC LIMIT ?
+SELECT "expenses_monthlyrollup"."year" AS "year", "expenses_monthlyrollup"."month" AS "month", (CAST(SUM("expenses_monthlyrollup"."total") FILTER (WHERE "expenses_monthlyrollup"."transaction_type" = ?) AS NUMERIC)) AS "income", (CAST(SUM("expenses_monthlyrollup"."total") FILTER (WHERE "expenses_monthlyrollup"."transaction_type" = ?) AS NUMERIC)) AS "expenses" FROM "expenses_monthlyrollup" WHERE "expenses_monthlyrollup"."user_id" = ? GROUP BY ?, ?
+SELECT "expenses_monthlyrollup"."category_id" AS "category_id", "expenses_category"."name" AS "category__name", "expenses_category"."color" AS "category__color", (CAST(SUM("expenses_monthlyrollup"."total") AS NUMERIC)) AS "category_total", SUM("expenses_monthlyrollup"."count") AS "category_count" FROM "expenses_monthlyrollup" INNER JOIN "expenses_category" ON ("expenses_monthlyrollup"."category_id" = "expenses_category"."id") WHERE ("expenses_monthlyrollup"."category_id" IS NOT NULL AND "expenses_monthlyrollup"."transaction_type" = ? AND "expenses_monthlyrollup"."user_id" = ?) GROUP BY ?, ?, ? HAVING SUM("expenses_monthlyrollup"."count") > ? ORDER BY ? DESC
+SELECT "expenses_ledgerentry"."balance" AS "balance" FROM "expenses_ledgerentry" WHERE "expenses_ledgerentry"."user_id" = ? ORDER BY "expenses_ledgerentry"."date" DESC, "expenses_ledgerentry"."transaction_id" DESC LIMIT ?
+SELECT "expenses_transaction"."id", "expenses_transaction"."user_id", "expenses_transaction"."title", "expenses_transaction"."amount", "expenses_transaction"."transaction_type", "expenses_transaction"."category_id", "expenses_transaction"."date", "expenses_transaction"."description", "expenses_transaction"."created_at", "expenses_transaction"."recurring_rule_id", "expenses_transaction"."occurrence_date", "expenses_category"."id", "expenses_category"."name", "expenses_category"."color", "expenses_category"."transaction_type" FROM "expenses_transaction" LEFT OUTER JOIN "expenses_category" ON ("expenses_transaction"."category_id" = "expenses_category"."id") WHERE "expenses_transaction"."user_id" = ? ORDER BY "expenses_transaction"."date" DESC LIMIT ?
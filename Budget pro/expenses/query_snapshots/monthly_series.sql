@@ -0,0 +1,3 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT django_datetime_trunc(?, "expenses_transaction"."date", ?, ?) AS "period", (CAST(SUM("expenses_transaction"."amount") FILTER (WHERE "expenses_transaction"."transaction_type" = ?) AS NUMERIC)) AS "income", (CAST(SUM("expenses_transaction"."amount") FILTER (WHERE "expenses_transaction"."transaction_type" = ?) AS NUMERIC)) AS "expenses" FROM "expenses_transaction" WHERE ("expenses_transaction"."date" >= ? AND "expenses_transaction"."user_id" = ?) GROUP BY ?
@@ -0,0 +1,4 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_profile"."id", "expenses_profile"."user_id", "expenses_profile"."phone_number", "expenses_profile"."date_of_birth", "expenses_profile"."occupation", "expenses_profile"."profile_picture", "expenses_profile"."created_at" FROM "expenses_profile" WHERE "expenses_profile"."user_id" = ? LIMIT ?
+SELECT COUNT(*) AS "__count" FROM "expenses_transaction" WHERE "expenses_transaction"."user_id" = ?
@@ -0,0 +1,7 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT "expenses_dataversion"."value" AS "value" FROM "expenses_dataversion" WHERE "expenses_dataversion"."key" = ? ORDER BY "expenses_dataversion"."id" ASC LIMIT ?
+SELECT "expenses_dataversion"."value" AS "value" FROM "expenses_dataversion" WHERE "expenses_dataversion"."key" = ? ORDER BY "expenses_dataversion"."id" ASC LIMIT ?
+SELECT "expenses_categoryrule"."id", "expenses_categoryrule"."user_id", "expenses_categoryrule"."category_id", "expenses_categoryrule"."match_type", "expenses_categoryrule"."pattern", "expenses_categoryrule"."min_amount", "expenses_categoryrule"."max_amount", "expenses_categoryrule"."priority", "expenses_categoryrule"."is_active", "expenses_categoryrule"."created_at", "expenses_category"."id", "expenses_category"."name", "expenses_category"."color", "expenses_category"."transaction_type" FROM "expenses_categoryrule" INNER JOIN "expenses_category" ON ("expenses_categoryrule"."category_id" = "expenses_category"."id") WHERE ("expenses_categoryrule"."is_active" AND "expenses_categoryrule"."user_id" = ?) ORDER BY "expenses_categoryrule"."priority" ASC, "expenses_categoryrule"."id" ASC
+SELECT "expenses_transaction"."id", "expenses_transaction"."user_id", "expenses_transaction"."title", "expenses_transaction"."amount", "expenses_transaction"."transaction_type", "expenses_transaction"."category_id", "expenses_transaction"."date" FROM "expenses_transaction" WHERE ("expenses_transaction"."user_id" = ? AND "expenses_transaction"."id" > ?) ORDER BY "expenses_transaction"."id" ASC LIMIT ?
+SELECT "expenses_transaction"."id", "expenses_transaction"."user_id", "expenses_transaction"."title", "expenses_transaction"."amount", "expenses_transaction"."transaction_type", "expenses_transaction"."category_id", "expenses_transaction"."date" FROM "expenses_transaction" WHERE ("expenses_transaction"."user_id" = ? AND "expenses_transaction"."id" > ?) ORDER BY "expenses_transaction"."id" ASC LIMIT ?
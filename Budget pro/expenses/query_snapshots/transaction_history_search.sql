@@ -0,0 +1,4 @@
+SELECT "django_session"."session_key", "django_session"."session_data", "django_session"."expire_date" FROM "django_session" WHERE ("django_session"."expire_date" > ? AND "django_session"."session_key" = ?) LIMIT ?
+SELECT "auth_user"."id", "auth_user"."password", "auth_user"."last_login", "auth_user"."is_superuser", "auth_user"."username", "auth_user"."first_name", "auth_user"."last_name", "auth_user"."email", "auth_user"."is_staff", "auth_user"."is_active", "auth_user"."date_joined" FROM "auth_user" WHERE "auth_user"."id" = ? LIMIT ?
+SELECT (CAST(SUM("expenses_transaction"."amount") FILTER (WHERE "expenses_transaction"."transaction_type" = ?) AS NUMERIC)) AS "income", (CAST(SUM("expenses_transaction"."amount") FILTER (WHERE "expenses_transaction"."transaction_type" = ?) AS NUMERIC)) AS "expenses" FROM "expenses_transaction" WHERE ("expenses_transaction"."user_id" = ? AND "expenses_transaction"."amount" >= ? AND "expenses_transaction"."date" >= ? AND "expenses_transaction"."id" IN (SELECT rowid FROM expenses_transaction_fts WHERE expenses_transaction_fts MATCH ?))
+SELECT "expenses_transaction"."id", "expenses_transaction"."title", "expenses_transaction"."amount", "expenses_transaction"."transaction_type", "expenses_transaction"."category_id", "expenses_transaction"."date", EXISTS(SELECT ? AS "a" FROM "expenses_transactionflag" U0 WHERE (U0."kind" = ? AND U0."transaction_id" = ("expenses_transaction"."id")) LIMIT ?) AS "is_outlier", EXISTS(SELECT ? AS "a" FROM "expenses_transactionflag" U0 WHERE (U0."kind" = ? AND U0."transaction_id" = ("expenses_transaction"."id")) LIMIT ?) AS "is_duplicate", "expenses_category"."id", "expenses_category"."name", "expenses_category"."color" FROM "expenses_transaction" LEFT OUTER JOIN "expenses_category" ON ("expenses_transaction"."category_id" = "expenses_category"."id") WHERE ("expenses_transaction"."user_id" = ? AND "expenses_transaction"."amount" >= ? AND "expenses_transaction"."date" >= ? AND "expenses_transaction"."id" IN (SELECT rowid FROM expenses_transaction_fts WHERE expenses_transaction_fts MATCH ?)) ORDER BY "expenses_transaction"."date" DESC, "expenses_transaction"."id" DESC LIMIT ?
@@ -0,0 +1,151 @@
+import calendar
+import logging
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import ledger, rollups
+from .models import RecurringRule, Transaction
+
+logger = logging.getLogger(__name__)
+
+# Occurrences posted per rule in one run; a rule that is further behind
+# catches up on the following runs
+MAX_OCCURRENCES_PER_RULE = 366
+
+
+@dataclass
+class RunResult:
+    rules: int = 0
+    posted: int = 0
+    skipped: int = 0
+    failed: int = 0
+    batches: int = 0
+    elapsed: float = 0.0
+
+
+def add_months(day: date, months: int, anchor_day: int) -> date:
+    """`day` moved by `months`, on `anchor_day` or the last day of a short month"""
+    index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(index, 12)
+    month += 1
+    return date(year, month, min(anchor_day, calendar.monthrange(year, month)[1]))
+
+
+def next_date(rule, current: date) -> date:
+    """The occurrence of `rule` that follows `current`"""
+    if rule.frequency == 'daily':
+        return current + timedelta(days=rule.interval)
+    if rule.frequency == 'weekly':
+        return current + timedelta(weeks=rule.interval)
+    months = rule.interval * (12 if rule.frequency == 'yearly' else 1)
+    return add_months(current, months, rule.start_date.day)
+
+
+def due_dates(rule, today: date):
+    """Occurrences of `rule` from next_occurrence up to `today` and end_date"""
+    dates = []
+    current = rule.next_occurrence
+    while current <= today and (rule.end_date is None or current <= rule.end_date):
+        if len(dates) >= MAX_OCCURRENCES_PER_RULE:
+            break
+        dates.append(current)
+        following = next_date(rule, current)
+        if following <= current:
+            raise ValueError(f'Recurring rule {rule.pk} does not advance past {current}')
+        current = following
+    return dates, current
+
+
+def build_transaction(rule, occurrence: date, posted_at: datetime) -> Transaction:
+    return Transaction(
+        user_id=rule.user_id,
+        title=rule.title,
+        amount=rule.amount,
+        transaction_type=rule.transaction_type,
+        category_id=rule.category_id,
+        description=rule.description,
+        date=posted_at,
+        recurring_rule=rule,
+        occurrence_date=occurrence,
+    )
+
+
+def post_batch(rules, today: date, result: RunResult):
+    """Post the due occurrences of `rules` and advance their schedules.
+
+    Runs in one database transaction, so a crash leaves neither the
+    transactions nor the advanced next_occurrence behind, and the rule
+    objects are not modified. Occurrences that
+    already exist (unique rule + occurrence date) are skipped.
+    """
+    pending = []
+    midnights = {}
+    # Rules mostly share a few next dates, so group them per UPDATE
+    schedules = defaultdict(list)
+    for rule in rules:
+        dates, next_occurrence = due_dates(rule, today)
+        is_active = rule.end_date is None or next_occurrence <= rule.end_date
+        schedules[next_occurrence, is_active].append(rule.pk)
+        for day in dates:
+            if day not in midnights:
+                midnights[day] = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            pending.append(build_transaction(rule, day, midnights[day]))
+
+    with transaction.atomic():
+        posted = set()
+        if pending:
+            posted = set(
+                Transaction.objects.filter(
+                    recurring_rule__in=[rule.pk for rule in rules],
+                    occurrence_date__gte=min(tx.occurrence_date for tx in pending),
+                ).values_list('recurring_rule_id', 'occurrence_date')
+            )
+        new = [tx for tx in pending if (tx.recurring_rule_id, tx.occurrence_date) not in posted]
+        Transaction.objects.bulk_create(new, batch_size=1000)
+        rollups.apply_transactions(new)
+        ledger.apply_transactions(new)
+        for (next_occurrence, is_active), pks in schedules.items():
+            RecurringRule.objects.filter(pk__in=pks).update(next_occurrence=next_occurrence, is_active=is_active)
+
+    result.rules += len(rules)
+    result.posted += len(new)
+    result.skipped += len(pending) - len(new)
+    result.batches += 1
+
+
+def run_due(today=None, batch_size=1000, progress=None) -> RunResult:
+    """Post every due occurrence of all active rules, `batch_size` rules at a time.
+
+    A rule that fails is logged, counted in `failed` and left due, so the
+    next run tries it again.
+    """
+    today = today or timezone.localdate()
+    result = RunResult()
+    started = time.perf_counter()
+    due = RecurringRule.objects.filter(is_active=True, next_occurrence__lte=today).order_by('pk')
+    last_pk = 0
+    while True:
+        rules = list(due.filter(pk__gt=last_pk)[:batch_size])
+        if not rules:
+            break
+        try:
+            post_batch(rules, today, result)
+        except Exception:
+            # Retry the batch one rule at a time so a broken rule only
+            # holds back itself
+            for rule in rules:
+                try:
+                    post_batch([rule], today, result)
+                except Exception:
+                    logger.exception('Could not post recurring rule %s', rule.pk)
+                    result.failed += 1
+        last_pk = rules[-1].pk
+        if progress:
+            progress(result)
+    result.elapsed = time.perf_counter() - started
+    return result
@@ -0,0 +1,177 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from . import live
+from .budgets import check_thresholds
+from .models import MonthlyRollup, Transaction
+from .summary import bump_data_version
+
+CENT = Decimal('0.01')
+
+
+def bucket_for(user_id, date, category_id, transaction_type):
+    """Rollup key for a transaction; months follow the local TIME_ZONE"""
+    local = timezone.localtime(date) if timezone.is_aware(date) else date
+    return (user_id, local.year, local.month, category_id, transaction_type)
+
+
+def apply_delta(key, amount, count):
+    """Atomically add `amount` and `count` to the rollup bucket `key`.
+
+    Budget thresholds crossed by the change are recorded in the same
+    database transaction.
+    """
+    amount = Decimal(str(amount))
+    with transaction.atomic():
+        _add_to_bucket(key, amount, count)
+        check_thresholds({key: amount})
+
+
+def _add_to_bucket(key, amount, count):
+    user_id, year, month, category_id, transaction_type = key
+    bucket = MonthlyRollup.objects.filter(
+        user_id=user_id,
+        year=year,
+        month=month,
+        category_id=category_id,
+        transaction_type=transaction_type,
+    )
+    bump_data_version(user_id)
+    with transaction.atomic():
+        if bucket.update(total=F('total') + amount, count=F('count') + count):
+            return
+        try:
+            with transaction.atomic():
+                MonthlyRollup.objects.create(
+                    user_id=user_id,
+                    year=year,
+                    month=month,
+                    category_id=category_id,
+                    transaction_type=transaction_type,
+                    total=amount,
+                    count=count,
+                )
+        except IntegrityError:
+            # Another writer created the bucket first
+            bucket.update(total=F('total') + amount, count=F('count') + count)
+
+
+def apply_transactions(transactions, sign=1):
+    """Fold many transactions into the rollup with a handful of queries.
+
+    Used by batch writers (imports, recurring postings) that bypass model
+    signals; pass `sign=-1` when the rows are being removed. Existing
+    buckets receiving the same delta share one UPDATE, missing buckets are
+    created with bulk_create, and budget alerts are checked once for all.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for tx in transactions:
+        key = bucket_for(tx.user_id, tx.date, tx.category_id, tx.transaction_type)
+        deltas[key][0] += Decimal(str(tx.amount)) * sign
+        deltas[key][1] += sign
+    if not deltas:
+        return
+
+    user_ids = {key[0] for key in deltas}
+    with transaction.atomic():
+        existing = {}
+        rows = MonthlyRollup.objects.filter(
+            user_id__in=user_ids,
+            year__in={key[1] for key in deltas},
+            month__in={key[2] for key in deltas},
+        ).values_list('pk', 'user_id', 'year', 'month', 'category_id', 'transaction_type')
+        for pk, *key in rows:
+            existing.setdefault(tuple(key), pk)
+
+        by_delta = defaultdict(list)
+        missing = []
+        for key, (amount, count) in deltas.items():
+            if key in existing:
+                by_delta[amount, count].append(existing[key])
+            else:
+                missing.append(key)
+        for (amount, count), pks in by_delta.items():
+            MonthlyRollup.objects.filter(pk__in=pks).update(total=F('total') + amount, count=F('count') + count)
+        try:
+            with transaction.atomic():
+                MonthlyRollup.objects.bulk_create([
+                    MonthlyRollup(
+                        user_id=key[0], year=key[1], month=key[2], category_id=key[3],
+                        transaction_type=key[4], total=deltas[key][0], count=deltas[key][1],
+                    )
+                    for key in missing
+                ])
+        except IntegrityError:
+            # Another writer created some of the buckets first
+            for key in missing:
+                _add_to_bucket(key, *deltas[key])
+        check_thresholds({key: amount for key, (amount, _) in deltas.items()})
+        for user_id in user_ids:
+            bump_data_version(user_id)
+        live.data_reloaded(user_ids)
+
+
+def compute_rollups(user_ids):
+    """Build unsaved rollup rows for `user_ids` from the raw transactions"""
+    rows = (
+        Transaction.objects.filter(user_id__in=user_ids)
+        .annotate(period=TruncMonth('date'))
+        .values('user_id', 'period', 'category_id', 'transaction_type')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    rollups = []
+    for row in rows:
+        period = timezone.localtime(row['period'])
+        rollups.append(MonthlyRollup(
+            user_id=row['user_id'],
+            year=period.year,
+            month=period.month,
+            category_id=row['category_id'],
+            transaction_type=row['transaction_type'],
+            # SQLite sums decimals as floats
+            total=row['total'].quantize(CENT),
+            count=row['count'],
+        ))
+    return rollups
+
+
+def rebuild_for_users(user_ids):
+    """Replace the rollup rows of `user_ids` with freshly computed ones"""
+    with transaction.atomic():
+        MonthlyRollup.objects.filter(user_id__in=user_ids).delete()
+        MonthlyRollup.objects.bulk_create(compute_rollups(user_ids))
+        for user_id in user_ids:
+            bump_data_version(user_id)
+        live.data_reloaded(user_ids)
+
+
+def find_mismatches(user_ids):
+    """Return (key, expected, actual) for buckets that disagree with raw data"""
+    expected = defaultdict(lambda: (Decimal('0'), 0))
+    for rollup in compute_rollups(user_ids):
+        key = (rollup.user_id, rollup.year, rollup.month, rollup.category_id, rollup.transaction_type)
+        expected[key] = (rollup.total, rollup.count)
+
+    actual = defaultdict(lambda: (Decimal('0'), 0))
+    rows = (
+        MonthlyRollup.objects.filter(user_id__in=user_ids)
+        .values('user_id', 'year', 'month', 'category_id', 'transaction_type')
+        .annotate(sum_total=Sum('total'), sum_count=Sum('count'))
+        .order_by()
+    )
+    for row in rows:
+        key = (row['user_id'], row['year'], row['month'], row['category_id'], row['transaction_type'])
+        if row['sum_total'] or row['sum_count']:
+            actual[key] = (row['sum_total'].quantize(CENT), row['sum_count'])
+
+    mismatches = []
+    for key in set(expected) | set(actual):
+        if expected[key] != actual[key]:
+            mismatches.append((key, expected[key], actual[key]))
+    return mismatches
@@ -0,0 +1,205 @@
+import re
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.db import OperationalError, connections
+from django.db.models import F, FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+FTS_TABLE = 'expenses_transaction_fts'
+
+# External-content FTS5 table over Transaction.title/description. Triggers
+# keep it in sync for every write path, including bulk_create and
+# QuerySet.update(). SQLite table rebuilds drop triggers, so migrations
+# that remake expenses_transaction must recreate them. Migration 0006 keeps
+# its own copy of these statements; change them here for new code only.
+SQLITE_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, description,
+        content='expenses_transaction', content_rowid='id',
+        tokenize='unicode61', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON expenses_transaction BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON expenses_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON expenses_transaction BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+SQLITE_DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+POSTGRES_INDEX_NAME = 'txn_search_gin_idx'
+POSTGRES_CONFIG = 'simple'
+
+# Query parameters understood by filter_transactions()
+FILTER_PARAMS = ('search', 'min_amount', 'max_amount', 'start_date', 'end_date')
+
+_fts_ready = {}
+
+
+def install_sqlite_index(cursor):
+    for statement in SQLITE_INDEX_SQL:
+        cursor.execute(statement)
+
+
+def search_vector():
+    """tsvector expression matching the PostgreSQL GIN index"""
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('title', 'description', config=POSTGRES_CONFIG)
+
+
+def postgres_index():
+    from django.contrib.postgres.indexes import GinIndex
+    return GinIndex(search_vector(), name=POSTGRES_INDEX_NAME)
+
+
+def tokenize(text):
+    return re.findall(r'\w+', text or '')
+
+
+def fts_available(alias):
+    """Whether the FTS5 table exists on the SQLite database `alias`"""
+    if alias not in _fts_ready:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE]
+            )
+            _fts_ready[alias] = cursor.fetchone() is not None
+    return _fts_ready[alias]
+
+
+def search_transactions(queryset, text, ranked=False):
+    """Restrict `queryset` to transactions matching every word of `text`.
+
+    Each word matches as a prefix of a word in the title or description.
+    With `ranked=True` rows get a `rank` annotation (higher is better).
+    Falls back to icontains when no full-text index is available.
+    """
+    tokens = tokenize(text)
+    vendor = connections[queryset.db].vendor
+
+    if tokens and vendor == 'sqlite' and fts_available(queryset.db):
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        queryset = queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]
+        ))
+        if ranked:
+            # bm25() is lower for better matches
+            queryset = queryset.annotate(rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = expenses_transaction.id',
+                [match], output_field=FloatField(),
+            ))
+        return queryset
+
+    if tokens and vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchQuery, SearchRank
+        query = SearchQuery(' & '.join(f'{token}:*' for token in tokens),
+                            config=POSTGRES_CONFIG, search_type='raw')
+        queryset = queryset.annotate(search=search_vector()).filter(search=query)
+        if ranked:
+            queryset = queryset.annotate(rank=SearchRank(F('search'), query))
+        return queryset
+
+    queryset = queryset.filter(Q(title__icontains=text) | Q(description__icontains=text))
+    if ranked:
+        queryset = queryset.annotate(rank=RawSQL('0', [], output_field=FloatField()))
+    return queryset
+
+
+def parse_amount(value):
+    try:
+        return Decimal(value) if value else None
+    except InvalidOperation:
+        return None
+
+
+def parse_day(value, end=False):
+    """Aware datetime at the start (or end) of the local day `value`"""
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d').date() if value else None
+    except ValueError:
+        return None
+    if day is None:
+        return None
+    return timezone.make_aware(datetime.combine(day, time.max if end else time.min))
+
+
+def filter_transactions(queryset, params, ranked=False):
+    """Apply the transaction history filters found in `params` (a QueryDict).
+
+    Supported keys are FILTER_PARAMS; invalid values are ignored.
+    Returns (queryset, cleaned filters).
+    """
+    filters = {
+        'search': (params.get('search') or '').strip(),
+        'min_amount': parse_amount(params.get('min_amount')),
+        'max_amount': parse_amount(params.get('max_amount')),
+        'start_date': parse_day(params.get('start_date')),
+        'end_date': parse_day(params.get('end_date'), end=True),
+    }
+    if filters['min_amount'] is not None:
+        queryset = queryset.filter(amount__gte=filters['min_amount'])
+    if filters['max_amount'] is not None:
+        queryset = queryset.filter(amount__lte=filters['max_amount'])
+    if filters['start_date'] is not None:
+        queryset = queryset.filter(date__gte=filters['start_date'])
+    if filters['end_date'] is not None:
+        queryset = queryset.filter(date__lte=filters['end_date'])
+    if filters['search']:
+        queryset = search_transactions(queryset, filters['search'], ranked=ranked)
+    return queryset, filters
+
+
+def rebuild_sqlite_index(alias, batch_size, progress=None):
+    """Repopulate the FTS5 table from expenses_transaction in id batches"""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        install_sqlite_index(cursor)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+        last_id, indexed = 0, 0
+        while True:
+            # Reads of an external-content table go to the content table, so
+            # batch boundaries come from expenses_transaction itself
+            cursor.execute(
+                'SELECT MAX(id), COUNT(*) FROM (SELECT id FROM expenses_transaction '
+                'WHERE id > %s ORDER BY id LIMIT %s)',
+                [last_id, batch_size],
+            )
+            upper_id, count = cursor.fetchone()
+            if not count:
+                break
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, title, description) '
+                'SELECT id, title, description FROM expenses_transaction '
+                'WHERE id > %s AND id <= %s',
+                [last_id, upper_id],
+            )
+            indexed += count
+            last_id = upper_id
+            if progress:
+                progress(indexed)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    _fts_ready[alias] = True
+    return indexed
+
+
+def drop_sqlite_index(cursor):
+    for statement in SQLITE_DROP_SQL:
+        try:
+            cursor.execute(statement)
+        except OperationalError:
+            pass
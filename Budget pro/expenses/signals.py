@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from decimal import Decimal
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile
+from .models import Budget, Category, CategoryRule, Profile, Transaction
+from . import budgets, categorization, ledger, live, rollups
+from .categories import bump_catalogue_version
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -19,4 +22,101 @@ def save_user_profile(sender, instance, **kwargs):
         else:
             Profile.objects.create(user=instance)
     except Exception:
-        pass
\ No newline at end of file
+        pass
+
+@receiver(pre_save, sender=Transaction)
+def remember_rollup_bucket(sender, instance, raw=False, **kwargs):
+    # Capture the stored row so an edit can move its amount between buckets
+    # and ledger positions
+    instance._rollup_previous = None
+    instance._ledger_previous = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    previous = Transaction.objects.filter(pk=instance.pk).values(
+        'user_id', 'date', 'category_id', 'transaction_type', 'amount'
+    ).first()
+    if previous:
+        instance._rollup_previous = (
+            rollups.bucket_for(previous['user_id'], previous['date'],
+                               previous['category_id'], previous['transaction_type']),
+            previous['amount'],
+        )
+        instance._ledger_previous = (
+            previous['user_id'],
+            previous['date'],
+            ledger.signed_amount(previous['transaction_type'], previous['amount']),
+        )
+
+@receiver(post_save, sender=Transaction)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    key = rollups.bucket_for(instance.user_id, instance.date, instance.category_id, instance.transaction_type)
+    amount = Decimal(str(instance.amount))
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is None:
+        rollups.apply_delta(key, amount, 1)
+        return
+    old_key, old_amount = previous
+    if old_key == key:
+        if amount != old_amount:
+            rollups.apply_delta(key, amount - old_amount, 0)
+    else:
+        rollups.apply_delta(old_key, -old_amount, -1)
+        rollups.apply_delta(key, amount, 1)
+
+@receiver(post_save, sender=Transaction)
+def update_ledger_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous is None:
+        ledger.post(instance)
+    else:
+        ledger.repost(instance, previous)
+
+@receiver(post_delete, sender=Transaction)
+def update_rollup_on_delete(sender, instance, origin=None, **kwargs):
+    # Deleting a user cascades to both transactions and rollups
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    key = rollups.bucket_for(instance.user_id, instance.date, instance.category_id, instance.transaction_type)
+    rollups.apply_delta(key, -Decimal(str(instance.amount)), -1)
+    ledger.unpost(instance.user_id, instance.date, instance.pk,
+                  ledger.signed_amount(instance.transaction_type, instance.amount))
+
+@receiver(post_save, sender=Transaction)
+def publish_live_update_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    buckets = [rollups.bucket_for(instance.user_id, instance.date, instance.category_id, instance.transaction_type)]
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is not None:
+        buckets.append(previous[0])
+    live.transaction_changed(instance.user_id, buckets)
+
+@receiver(post_delete, sender=Transaction)
+def publish_live_update_on_delete(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User) or getattr(origin, 'model', None) is User:
+        return
+    live.transaction_changed(instance.user_id, [
+        rollups.bucket_for(instance.user_id, instance.date, instance.category_id, instance.transaction_type),
+    ])
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_catalogue(sender, **kwargs):
+    bump_catalogue_version()
+
+
+@receiver(post_save, sender=Budget)
+def check_new_budget(sender, instance, raw=False, **kwargs):
+    # A new or lowered limit may already be exceeded this month
+    if not raw:
+        budgets.check_budget(instance)
+
+@receiver(post_save, sender=CategoryRule)
+@receiver(post_delete, sender=CategoryRule)
+def invalidate_category_rules(sender, instance, **kwargs):
+    categorization.bump_rules_version(instance.user_id)
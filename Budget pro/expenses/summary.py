@@ -0,0 +1,300 @@
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import List
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from .models import MonthlyRollup, Transaction
+from .versions import aget_version, bump_version, get_version
+
+
+@dataclass
+class CategoryTotal:
+    id: int
+    name: str
+    color: str
+    total: Decimal
+
+
+GRANULARITIES = {
+    'month': TruncMonth,
+    'week': TruncWeek,
+    'day': TruncDay,
+}
+
+# Longest window the monthly series API will serve
+MAX_SERIES_MONTHS = 120
+
+
+@dataclass
+class PeriodTotal:
+    start: date
+    granularity: str = 'month'
+    income: Decimal = Decimal('0')
+    expenses: Decimal = Decimal('0')
+
+    @property
+    def label(self) -> str:
+        if self.granularity == 'month':
+            return self.start.strftime('%b %Y')
+        return self.start.strftime('%d %b %Y')
+
+
+@dataclass
+class DashboardSummary:
+    total_income: Decimal = Decimal('0')
+    total_expenses: Decimal = Decimal('0')
+    expense_categories: List[CategoryTotal] = field(default_factory=list)
+    monthly: List[PeriodTotal] = field(default_factory=list)
+
+    @property
+    def balance(self) -> Decimal:
+        return self.total_income - self.total_expenses
+
+
+def shift_month(month: date, delta: int) -> date:
+    """Return the first day of the month `delta` months away from `month`"""
+    index = month.year * 12 + (month.month - 1) + delta
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def last_months(count: int, today: date = None) -> List[date]:
+    """First days of the last `count` calendar months, oldest first"""
+    if today is None:
+        today = timezone.localdate()
+    current = today.replace(day=1)
+    return [shift_month(current, -i) for i in range(count - 1, -1, -1)]
+
+
+def bucket_starts(months: int, granularity: str, today: date = None) -> List[date]:
+    """Start dates of every bucket covering the last `months` calendar months.
+
+    Weekly buckets begin on Monday, so the first bucket may start a few
+    days before the first of the month to keep it a whole week.
+    """
+    if today is None:
+        today = timezone.localdate()
+    month_starts = last_months(months, today)
+    if granularity == 'month':
+        return month_starts
+    first = month_starts[0]
+    if granularity == 'week':
+        first -= timedelta(days=first.weekday())
+        step = timedelta(weeks=1)
+    else:
+        step = timedelta(days=1)
+    starts = []
+    current = first
+    while current <= today:
+        starts.append(current)
+        current += step
+    return starts
+
+
+def period_series(user, months: int = 6, granularity: str = 'month') -> List[PeriodTotal]:
+    """Income and expense totals per period for the last `months` months.
+
+    Runs a single grouped query over `Transaction.date` starting at local
+    midnight of the first bucket and fills periods without transactions
+    with zeros, so the cost does not grow with the number of buckets.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    starts = bucket_starts(months, granularity)
+    buckets = {start: PeriodTotal(start=start, granularity=granularity) for start in starts}
+    window_start = timezone.make_aware(datetime.combine(starts[0], time.min))
+
+    rows = (
+        Transaction.objects.filter(user=user, date__gte=window_start)
+        .annotate(period=GRANULARITIES[granularity]('date'))
+        .values('period')
+        .annotate(
+            income=Sum('amount', filter=Q(transaction_type='income')),
+            expenses=Sum('amount', filter=Q(transaction_type='expense')),
+        )
+        .order_by()
+    )
+    for row in rows:
+        bucket = buckets.get(timezone.localtime(row['period']).date())
+        if bucket is not None:
+            bucket.income += row['income'] or Decimal('0')
+            bucket.expenses += row['expenses'] or Decimal('0')
+    return list(buckets.values())
+
+
+def lifetime_totals(user):
+    """(income, expenses) over all of `user`'s transactions, from the rollups"""
+    totals = MonthlyRollup.objects.filter(user=user).aggregate(
+        income=Sum('total', filter=Q(transaction_type='income')),
+        expenses=Sum('total', filter=Q(transaction_type='expense')),
+    )
+    return totals['income'] or Decimal('0'), totals['expenses'] or Decimal('0')
+
+
+def build_summary(user, months: int = 6) -> DashboardSummary:
+    """Compute dashboard totals for `user` from the monthly rollup table.
+
+    The first query groups the user's rollup rows by calendar month with
+    conditional sums for income and expenses; lifetime totals are the sum
+    of those rows and the last `months` of them feed the bar chart. The
+    second query groups expenses by category. Both read a few dozen rollup
+    rows regardless of how many transactions the user has.
+    """
+    return _fill_summary(list(_monthly_rows(user)), list(_category_rows(user)), months)
+
+
+def _monthly_rows(user):
+    """Income and expense totals per calendar month"""
+    return (
+        MonthlyRollup.objects.filter(user=user)
+        .values('year', 'month')
+        .annotate(
+            income=Sum('total', filter=Q(transaction_type='income')),
+            expenses=Sum('total', filter=Q(transaction_type='expense')),
+        )
+        .order_by()
+    )
+
+
+def _fill_summary(monthly_rows, category_rows, months) -> DashboardSummary:
+    summary = DashboardSummary()
+    window = {m: PeriodTotal(start=m) for m in last_months(months)}
+    for row in monthly_rows:
+        income = row['income'] or Decimal('0')
+        expenses = row['expenses'] or Decimal('0')
+        summary.total_income += income
+        summary.total_expenses += expenses
+
+        bucket = window.get(date(row['year'], row['month'], 1))
+        if bucket is not None:
+            bucket.income += income
+            bucket.expenses += expenses
+    summary.monthly = list(window.values())
+    summary.expense_categories = _category_totals(category_rows)
+    return summary
+
+
+def _category_rows(user):
+    """Lifetime expense totals per category, largest first"""
+    return (
+        MonthlyRollup.objects.filter(
+            user=user, transaction_type='expense', category__isnull=False
+        )
+        .values('category_id', 'category__name', 'category__color')
+        .annotate(category_total=Sum('total'), category_count=Sum('count'))
+        .filter(category_count__gt=0)
+        .order_by('-category_total')
+    )
+
+
+def _category_totals(rows) -> List[CategoryTotal]:
+    return [
+        CategoryTotal(
+            id=row['category_id'],
+            name=row['category__name'],
+            color=row['category__color'],
+            total=row['category_total'],
+        )
+        for row in rows
+    ]
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+async def abuild_summary(user, months: int = 6) -> DashboardSummary:
+    """build_summary() for async views, with the same two queries.
+
+    They are awaited one after the other: Django runs async ORM calls on
+    the request's single thread-sensitive executor, so issuing them under
+    asyncio.gather() would not overlap them on this backend.
+    """
+    monthly_rows = await _alist(_monthly_rows(user))
+    category_rows = await _alist(_category_rows(user))
+    return _fill_summary(monthly_rows, category_rows, months)
+
+
+# Per-user summary cache. Entries are keyed by a per-user generation that
+# bump_data_version() advances whenever the user's rollups change, so stale
+# entries are never read and simply expire.
+HITS_KEY = 'summary_cache:hits'
+MISSES_KEY = 'summary_cache:misses'
+
+
+def _version_key(user_id) -> str:
+    return f'summary_cache:version:{user_id}'
+
+
+def data_version(user_id) -> int:
+    """Current generation of `user_id`'s financial data"""
+    return get_version(_version_key(user_id))
+
+
+async def adata_version(user_id) -> int:
+    return await aget_version(_version_key(user_id))
+
+
+def bump_data_version(user_id):
+    """Invalidate cached summaries (and ETags) for `user_id`"""
+    bump_version(_version_key(user_id))
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, timeout=None)
+
+
+async def _acount(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 1, timeout=None)
+
+
+def _summary_key(user_id, version, months) -> str:
+    return f'summary_cache:summary:{user_id}:{version}:{months}:{timezone.localdate():%Y%m}'
+
+
+def get_summary(user, months: int = 6) -> DashboardSummary:
+    """build_summary() served from the cache until the user's data changes"""
+    key = _summary_key(user.pk, data_version(user.pk), months)
+    summary = cache.get(key)
+    if summary is not None:
+        _count(HITS_KEY)
+        return summary
+    _count(MISSES_KEY)
+    summary = build_summary(user, months)
+    cache.set(key, summary, settings.SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+async def aget_summary(user, months: int = 6) -> DashboardSummary:
+    """get_summary() for async views, sharing its cache entries"""
+    key = _summary_key(user.pk, await adata_version(user.pk), months)
+    summary = await cache.aget(key)
+    if summary is not None:
+        await _acount(HITS_KEY)
+        return summary
+    await _acount(MISSES_KEY)
+    summary = await abuild_summary(user, months)
+    await cache.aset(key, summary, settings.SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def summary_cache_stats() -> dict:
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
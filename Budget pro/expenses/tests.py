@@ -1,3 +1,1632 @@
-from django.test import TestCase
+import asyncio
+import csv
+import difflib
+import threading
+import json
+import os
+import re
+import shutil
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend as LocmemEmailBackend
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Budget, BudgetAlert, Category, CategoryRule, DataVersion, LedgerEntry, MonthlyRollup, OneTimeCode, OutboxMessage, Profile, RecurringRule, Transaction, TransactionFlag
+from .rollups import find_mismatches
+from .search import search_transactions
+from . import analytics, anomalies, categories, categorization, importers, ledger, live, metrics, otp, outbox, recurring, rollups, search
+from .otp import CacheOTPStore, DatabaseOTPStore
+from .urls import urlpatterns
+from .summary import abuild_summary, bucket_starts, build_summary, bump_data_version, data_version, get_summary, last_months, period_series, summary_cache_stats
+
+
+class DashboardSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.salary = Category.objects.create(name='Salary', transaction_type='income')
+        self.food = Category.objects.create(name='Food', color='#FF6384', transaction_type='expense')
+        self.rent = Category.objects.create(name='Rent', color='#4BC0C0', transaction_type='expense')
+
+    def add(self, amount, transaction_type, category, when=None):
+        return Transaction.objects.create(
+            user=self.user,
+            title='t',
+            amount=Decimal(amount),
+            transaction_type=transaction_type,
+            category=category,
+            date=when or timezone.now(),
+        )
+
+    def seed(self, count):
+        months = last_months(12)
+        for i in range(count):
+            month = months[i % len(months)]
+            when = timezone.make_aware(datetime(month.year, month.month, 1 + i % 28))
+            self.add('10.00', 'expense', self.food if i % 2 else self.rent, when)
+            self.add('25.00', 'income', self.salary, when)
+
+    def test_totals_and_categories(self):
+        self.add('100.00', 'income', self.salary)
+        self.add('30.00', 'expense', self.food)
+        self.add('50.00', 'expense', self.rent)
+
+        summary = build_summary(self.user)
+
+        self.assertEqual(summary.total_income, Decimal('100.00'))
+        self.assertEqual(summary.total_expenses, Decimal('80.00'))
+        self.assertEqual(summary.balance, Decimal('20.00'))
+        self.assertEqual([c.name for c in summary.expense_categories], ['Rent', 'Food'])
+        self.assertEqual(summary.monthly[-1].income, Decimal('100.00'))
+        self.assertEqual(summary.monthly[-1].expenses, Decimal('80.00'))
+
+    def test_first_hour_of_month_is_counted(self):
+        month = last_months(1)[0]
+        self.add('12.00', 'expense', self.food, timezone.make_aware(datetime(month.year, month.month, 1)))
+
+        summary = build_summary(self.user)
+
+        self.assertEqual(summary.monthly[-1].expenses, Decimal('12.00'))
+
+    def test_query_count_is_independent_of_data_size(self):
+        self.seed(5)
+        with self.assertNumQueries(2):
+            build_summary(self.user)
+
+        self.seed(200)
+        with self.assertNumQueries(2):
+            build_summary(self.user)
+
+    def test_chart_data_response(self):
+        self.seed(24)
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('chart_data'))
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['monthly']['labels']), 6)
+        self.assertEqual(data['income_expense']['data'], [600.0, 240.0])
+
+    def test_async_summary_matches_sync_summary(self):
+        self.seed(30)
+        # Outside the six-month window, so only the lifetime totals see it
+        self.add('7.00', 'expense', self.food, timezone.now() - timezone.timedelta(days=400))
+
+        with self.assertNumQueries(2):
+            summary = async_to_sync(abuild_summary)(self.user)
+
+        self.assertEqual(summary, build_summary(self.user))
+
+    async def test_chart_data_served_asynchronously(self):
+        await sync_to_async(self.seed)(3)
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('chart_data'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['income_expense']['data'], [75.0, 30.0])
+
+        await self.async_client.get(reverse('chart_data'))
+        stats = await sync_to_async(summary_cache_stats)()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+        cached = await self.async_client.get(reverse('chart_data'), headers={'If-None-Match': response['ETag']})
+        self.assertEqual(cached.status_code, 304)
+
+
+class PeriodSeriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='bob', password='pass12345')
+        self.food = Category.objects.create(name='Food', transaction_type='expense')
+
+    def test_month_starts_are_calendar_aligned(self):
+        starts = last_months(24, date(2024, 3, 31))
+
+        self.assertEqual(len(starts), 24)
+        self.assertEqual(starts[0], date(2022, 4, 1))
+        self.assertEqual(starts[-1], date(2024, 3, 1))
+        self.assertEqual(len(set(starts)), 24)
+
+    def test_week_buckets_start_on_monday(self):
+        starts = bucket_starts(1, 'week', date(2024, 5, 15))
+
+        self.assertEqual(starts[0], date(2024, 4, 29))
+        self.assertTrue(all(start.weekday() == 0 for start in starts))
+
+    def test_empty_buckets_are_zero_filled(self):
+        month = last_months(3)[0]
+        Transaction.objects.create(
+            user=self.user, title='t', amount=Decimal('5.00'), transaction_type='expense',
+            category=self.food, date=timezone.make_aware(datetime(month.year, month.month, 1)),
+        )
+
+        with self.assertNumQueries(1):
+            series = period_series(self.user, 3, 'month')
+
+        self.assertEqual([p.expenses for p in series], [Decimal('5.00'), 0, 0])
+
+    def test_long_daily_window_is_one_query(self):
+        with self.assertNumQueries(1):
+            series = period_series(self.user, 120, 'day')
+        self.assertGreater(len(series), 3600)
+
+    def test_endpoint_validates_parameters(self):
+        self.client.force_login(self.user)
+        url = reverse('monthly_series')
+
+        self.assertEqual(self.client.get(url, {'months': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'months': 121}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'granularity': 'year'}).status_code, 400)
+
+        data = self.client.get(url, {'months': 24}).json()
+        self.assertEqual(len(data['labels']), 24)
+
+
+class MonthlyRollupTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='carol', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Food', transaction_type='expense')
+            self.rent = Category.objects.create(name='Rent', transaction_type='expense')
+        self.january = timezone.make_aware(datetime(2024, 1, 15))
+        self.february = timezone.make_aware(datetime(2024, 2, 3))
+
+    def bucket(self, month, category):
+        return MonthlyRollup.objects.get(user=self.user, year=2024, month=month, category=category)
+
+    def test_create_edit_and_delete_move_amounts_between_buckets(self):
+        tx = Transaction.objects.create(
+            user=self.user, title='Lunch', amount=Decimal('20.00'), transaction_type='expense',
+            category=self.food, date=self.january,
+        )
+        self.assertEqual(self.bucket(1, self.food).total, Decimal('20.00'))
+
+        tx.amount = '35.00'
+        tx.save()
+        self.assertEqual(self.bucket(1, self.food).total, Decimal('35.00'))
+
+        tx.date = self.february
+        tx.category = self.rent
+        tx.save()
+        self.assertEqual(self.bucket(1, self.food).count, 0)
+        self.assertEqual(self.bucket(2, self.rent).total, Decimal('35.00'))
+
+        tx.delete()
+        self.assertEqual(self.bucket(2, self.rent).total, Decimal('0.00'))
+        self.assertEqual(find_mismatches([self.user.pk]), [])
+
+    def test_views_keep_rollups_in_sync(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('add_transaction'), {
+            'title': 'Lunch', 'amount': '12.50', 'transaction_type': 'expense',
+            'category': self.food.pk, 'date': '2024-01-15',
+        })
+        tx = Transaction.objects.get(user=self.user)
+        self.client.post(reverse('edit_transaction', args=[tx.pk]), {
+            'title': 'Lunch', 'amount': '15.00', 'transaction_type': 'expense',
+            'category': self.rent.pk, 'date': '2024-02-01',
+        })
+        self.assertEqual(self.bucket(2, self.rent).total, Decimal('15.00'))
+
+        self.client.post(reverse('delete_transaction', args=[tx.pk]))
+        self.assertEqual(find_mismatches([self.user.pk]), [])
+
+    def test_rebuild_command_restores_drifted_rollups(self):
+        Transaction.objects.create(
+            user=self.user, title='Lunch', amount=Decimal('20.00'), transaction_type='expense',
+            category=self.food, date=self.january,
+        )
+        MonthlyRollup.objects.update(total=Decimal('99.00'))
+        self.assertEqual(len(find_mismatches([self.user.pk])), 1)
+
+        call_command('rebuild_rollups', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(self.bucket(1, self.food).total, Decimal('20.00'))
+
+    def test_deleting_user_removes_rollups(self):
+        Transaction.objects.create(
+            user=self.user, title='Lunch', amount=Decimal('20.00'), transaction_type='expense',
+            category=self.food, date=self.january,
+        )
+        self.user.delete()
+        self.assertFalse(MonthlyRollup.objects.exists())
+
+    def test_admin_cannot_edit_rollups(self):
+        Transaction.objects.create(
+            user=self.user, title='Lunch', amount=Decimal('20.00'), transaction_type='expense',
+            category=self.food, date=self.january,
+        )
+        admin = User.objects.create_superuser(username='admin', password='pass12345')
+        self.client.force_login(admin)
+        bucket = self.bucket(1, self.food)
+
+        self.assertEqual(self.client.get(reverse('admin:expenses_monthlyrollup_add')).status_code, 403)
+        response = self.client.post(reverse('admin:expenses_monthlyrollup_change', args=[bucket.pk]), {
+            'user': self.user.pk, 'year': 2024, 'month': 1, 'category': self.food.pk,
+            'transaction_type': 'expense', 'total': '999.00', 'count': 1,
+        })
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.bucket(1, self.food).total, Decimal('20.00'))
+
+
+class TransactionHistoryPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='dave', password='pass12345')
+        self.food = Category.objects.create(name='Food', transaction_type='expense')
+        same_time = timezone.make_aware(datetime(2024, 1, 1, 9))
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=self.user, title=f'Item {i}', amount=Decimal('1.00'), transaction_type='expense',
+                category=self.food, date=same_time if i % 3 == 0 else same_time + timezone.timedelta(hours=i),
+            )
+            for i in range(25)
+        ])
+        self.client.force_login(self.user)
+
+    def walk(self, page_size):
+        seen, params = [], {'page_size': page_size}
+        while True:
+            response = self.client.get(reverse('transaction_history'), params)
+            page = response.context['page_obj']
+            seen.extend(t.pk for t in page)
+            if not page.has_next():
+                return seen, response
+            params = {'page_size': page_size, 'after': page.next_cursor}
+
+    def test_walks_every_row_once_in_order(self):
+        seen, _ = self.walk(4)
+
+        expected = list(Transaction.objects.filter(user=self.user).order_by('-date', '-pk').values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_to_prior_page(self):
+        first = self.client.get(reverse('transaction_history'), {'page_size': 5}).context['page_obj']
+        second = self.client.get(reverse('transaction_history'), {'page_size': 5, 'after': first.next_cursor}).context['page_obj']
+        back = self.client.get(reverse('transaction_history'), {'page_size': 5, 'before': second.previous_cursor}).context['page_obj']
+
+        self.assertEqual([t.pk for t in back], [t.pk for t in first])
+        self.assertFalse(back.has_previous())
+
+    def test_page_query_count_does_not_depend_on_depth(self):
+        first = self.client.get(reverse('transaction_history'), {'page_size': 5}).context['page_obj']
+        with self.assertNumQueries(4):
+            self.client.get(reverse('transaction_history'), {'page_size': 5})
+        with self.assertNumQueries(4):
+            self.client.get(reverse('transaction_history'), {'page_size': 5, 'after': first.next_cursor})
+
+    def test_invalid_cursor_redirects_to_first_page(self):
+        response = self.client.get(reverse('transaction_history'), {'after': 'garbage'})
+        self.assertRedirects(response, reverse('transaction_history'))
+
+
+class TransactionSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='erin', password='pass12345')
+        self.food = Category.objects.create(name='Food', transaction_type='expense')
+        self.coffee = self.add('Morning coffee', '4.50', 'Cafe near office', datetime(2024, 3, 1))
+        self.groceries = self.add('Groceries', '82.10', 'Weekly shop, coffee beans', datetime(2024, 3, 9))
+        self.rent = self.add('Rent', '900.00', '', datetime(2024, 4, 1))
+
+    def add(self, title, amount, description, when):
+        return Transaction.objects.create(
+            user=self.user, title=title, amount=Decimal(amount), transaction_type='expense',
+            category=self.food, description=description, date=timezone.make_aware(when),
+        )
+
+    def search(self, text):
+        return set(search_transactions(Transaction.objects.filter(user=self.user), text))
+
+    def test_prefix_match_on_title_and_description(self):
+        self.assertEqual(self.search('coff'), {self.coffee, self.groceries})
+        self.assertEqual(self.search('coffee bea'), {self.groceries})
+
+    def test_index_follows_updates_deletes_and_bulk_writes(self):
+        Transaction.objects.filter(pk=self.rent.pk).update(title='Rent and coffee')
+        self.assertIn(self.rent, self.search('coffee'))
+
+        coffee_pk = self.coffee.pk
+        self.coffee.delete()
+        self.assertNotIn(coffee_pk, {t.pk for t in self.search('coffee')})
+
+        Transaction.objects.bulk_create([Transaction(
+            user=self.user, title='Espresso machine', amount=Decimal('1.00'),
+            transaction_type='expense', category=self.food,
+        )])
+        self.assertEqual(len(self.search('espres')), 1)
+
+    def test_history_combines_search_with_amount_and_date_ranges(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('transaction_history'), {
+            'search': 'coffee', 'min_amount': '10', 'start_date': '2024-03-02', 'end_date': '2024-03-31',
+        })
+        self.assertEqual(list(response.context['transactions']), [self.groceries])
+        self.assertEqual(response.context['total_expenses'], Decimal('82.10'))
+
+    def test_search_api_orders_by_rank(self):
+        self.add('Coffee coffee coffee', '3.00', 'coffee', datetime(2024, 1, 1))
+        self.client.force_login(self.user)
+
+        results = self.client.get(reverse('search_transactions'), {'search': 'coffee'}).json()['results']
+
+        self.assertEqual(results[0]['title'], 'Coffee coffee coffee')
+        self.assertEqual(len(results), 3)
+
+    def test_build_search_index_command(self):
+        call_command('build_search_index', batch_size=1, stdout=StringIO())
+        self.assertEqual(self.search('groc'), {self.groceries})
+
+
+class SummaryCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='frank', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Food', transaction_type='expense')
+            self.tx = Transaction.objects.create(
+                user=self.user, title='Lunch', amount=Decimal('10.00'), transaction_type='expense', category=self.food,
+            )
+
+    def test_repeated_reads_are_served_from_cache(self):
+        get_summary(self.user)
+        with self.assertNumQueries(1):  # the data version
+            summary = get_summary(self.user)
+
+        self.assertEqual(summary.total_expenses, Decimal('10.00'))
+        self.assertEqual(summary_cache_stats()['hits'], 1)
+        self.assertEqual(summary_cache_stats()['misses'], 1)
+
+    def test_writes_invalidate_only_the_owner(self):
+        other = User.objects.create_user(username='grace', password='pass12345')
+        get_summary(self.user)
+        get_summary(other)
+
+        self.tx.amount = Decimal('15.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tx.save()
+
+        self.assertEqual(get_summary(self.user).total_expenses, Decimal('15.00'))
+        with self.assertNumQueries(1):
+            get_summary(other)
+
+    def test_edits_bump_the_version_once_on_commit(self):
+        version = data_version(self.user.pk)
+        self.tx.amount = Decimal('20.00')
+        self.tx.date = self.tx.date - timezone.timedelta(days=62)  # moves between monthly buckets
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tx.save()
+                self.assertEqual(data_version(self.user.pk), version)
+
+        bumps = [query for query in queries if query['sql'].startswith('UPDATE "expenses_dataversion"')]
+        self.assertEqual(len(bumps), 1)
+        self.assertEqual(data_version(self.user.pk), version + 1)
+
+    def test_bumps_from_other_processes_invalidate(self):
+        get_summary(self.user)
+        # What a rollup writer in another worker or a management command leaves behind
+        DataVersion.objects.filter(key=f'summary_cache:version:{self.user.pk}').update(value=F('value') + 1)
+        MonthlyRollup.objects.filter(user=self.user).update(total=Decimal('12.00'))
+
+        self.assertEqual(get_summary(self.user).total_expenses, Decimal('12.00'))
+        self.assertEqual(summary_cache_stats()['misses'], 2)
+
+    def test_delete_and_bulk_rebuild_invalidate(self):
+        get_summary(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tx.delete()
+        self.assertEqual(get_summary(self.user).total_expenses, 0)
+
+        Transaction.objects.bulk_create([Transaction(
+            user=self.user, title='Dinner', amount=Decimal('7.00'), transaction_type='expense', category=self.food,
+        )])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('rebuild_rollups', stdout=StringIO())
+        self.assertEqual(get_summary(self.user).total_expenses, Decimal('7.00'))
+
+
+class ConditionalApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='heidi', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Food', transaction_type='expense')
+        self.client.force_login(self.user)
+
+    def test_chart_data_answers_304_without_queries_until_data_changes(self):
+        first = self.client.get(reverse('chart_data'))
+        etag = first['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        with self.assertNumQueries(3):  # session, user and data version lookups only
+            second = self.client.get(reverse('chart_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(
+                user=self.user, title='Lunch', amount=Decimal('10.00'), transaction_type='expense', category=self.food,
+            )
+        third = self.client.get(reverse('chart_data'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], etag)
+
+    def test_categories_etag_changes_with_category_table(self):
+        url = reverse('categories_by_type')
+        etag = self.client.get(url, {'transaction_type': 'expense'})['ETag']
+
+        self.assertEqual(self.client.get(url, {'transaction_type': 'expense'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.client.get(url, {'transaction_type': 'income'})['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Travel', transaction_type='expense')
+        self.assertEqual(self.client.get(url, {'transaction_type': 'expense'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+OFX_STATEMENT = """OFXHEADER:100
+DATA:OFXSGML
+
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240115120000[-5:EST]
+<TRNAMT>-42.50
+<NAME>Grocery Store
+<MEMO>Weekly shop
+</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240131<TRNAMT>1500.00<NAME>Payroll</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class StatementImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ivan', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Food & Dining', transaction_type='expense')
+            self.other = Category.objects.create(name='Other', transaction_type='expense')
+            self.salary = Category.objects.create(name='Salary', transaction_type='income')
+
+    def test_csv_import_batches_rows_and_updates_rollups(self):
+        lines = ['Date,Title,Amount,Type,Category']
+        lines += [f'2024-01-{day:02d},Lunch {day},-{day}.00,,food & dining' for day in range(1, 11)]
+        lines += ['2024-01-20,Salary,3000,income,Salary', 'not-a-date,Broken,1,,', '2024-01-21,,5,,', ',Undated,2,,']
+
+        result = importers.import_transactions(
+            self.user, importers.iter_csv_rows(StringIO('\n'.join(lines))), batch_size=4
+        )
+
+        self.assertEqual((result.created, result.skipped, result.batches), (11, 3, 3))
+        self.assertEqual(result.errors[-1], 'Row 14: missing date')
+        self.assertEqual(Transaction.objects.filter(user=self.user, category=self.food).count(), 10)
+        self.assertEqual(find_mismatches([self.user.pk]), [])
+        self.assertEqual(build_summary(self.user).total_income, Decimal('3000.00'))
+
+    def test_ofx_rows_are_parsed_across_chunks(self):
+        rows = list(importers.iter_ofx_rows(StringIO(OFX_STATEMENT), chunk_size=16))
+
+        self.assertEqual(rows[0], {'ofx_type': 'DEBIT', 'date': '20240115120000[-5:EST]', 'amount': '-42.50',
+                                   'title': 'Grocery Store', 'description': 'Weekly shop'})
+        self.assertEqual(rows[1]['title'], 'Payroll')
+
+    def test_upload_view_imports_ofx(self):
+        self.client.force_login(self.user)
+        upload = SimpleUploadedFile('statement.ofx', OFX_STATEMENT.encode())
+
+        response = self.client.post(reverse('import_transactions'), {'statement': upload})
+
+        self.assertRedirects(response, reverse('transaction_history'))
+        grocery = Transaction.objects.get(user=self.user, title='Grocery Store')
+        self.assertEqual((grocery.amount, grocery.transaction_type, grocery.category), (Decimal('42.50'), 'expense', self.other))
+        self.assertEqual(Transaction.objects.get(user=self.user, title='Payroll').transaction_type, 'income')
+
+
+class TransactionExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='judy', password='pass12345')
+        self.food = Category.objects.create(name='Food', transaction_type='expense')
+        for day in range(1, 6):
+            Transaction.objects.create(
+                user=self.user, title=f'Lunch {day}', amount=Decimal(f'{day}.50'), transaction_type='expense',
+                category=self.food, date=timezone.make_aware(datetime(2024, 1, day)),
+            )
+        self.client.force_login(self.user)
+
+    def test_csv_export_streams_filtered_rows(self):
+        response = self.client.get(reverse('export_transactions'), {'format': 'csv', 'min_amount': '3'})
+
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'date,title,amount,type,category,description')
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['Lunch 5', 'Lunch 4', 'Lunch 3'])
+
+    def test_csv_export_neutralises_formulas(self):
+        Transaction.objects.create(
+            user=self.user, title='=HYPERLINK("http://evil.example")', amount=Decimal('1.00'),
+            transaction_type='expense', category=self.food, description='@SUM(A1:A9)',
+            date=timezone.make_aware(datetime(2024, 2, 1)),
+        )
+
+        response = self.client.get(reverse('export_transactions'), {'format': 'csv'})
+        row = next(csv.reader(b''.join(response.streaming_content).decode().splitlines()[1:]))
+        self.assertEqual(row[1], '\'=HYPERLINK("http://evil.example")')
+        self.assertEqual(row[5], "'@SUM(A1:A9)")
+
+        response = self.client.get(reverse('export_transactions'), {'format': 'jsonl'})
+        record = json.loads(b''.join(response.streaming_content).decode().splitlines()[0])
+        self.assertEqual(record['title'], '=HYPERLINK("http://evil.example")')
+
+    def test_jsonl_export_joins_category_names(self):
+        response = self.client.get(reverse('export_transactions'), {'format': 'jsonl', 'search': 'lunch'})
+
+        records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[0]['category'], 'Food')
+        self.assertEqual(records[0]['amount'], '5.50')
+
+    def test_unknown_format_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('export_transactions'), {'format': 'xml'}).status_code, 400)
+
+
+class CountingEmailBackend(LocmemEmailBackend):
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return super().open()
+
+
+class FailingEmailBackend(LocmemEmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionError('SMTP server unavailable')
+
+
+class OutboxTests(TestCase):
+    def test_signup_only_enqueues_the_otp_email(self):
+        self.client.post(reverse('signup'), {
+            'username': 'kate', 'email': 'kate@example.com',
+            'password1': 'S3cure-pass-123', 'password2': 'S3cure-pass-123',
+        })
+
+        self.assertEqual(len(mail.outbox), 0)
+        message = OutboxMessage.objects.get()
+        self.assertEqual((message.recipient, message.status), ('kate@example.com', 'pending'))
+
+    def test_otp_codes_are_random_and_not_kept_once_sent(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'kate', 'email': 'kate@example.com',
+            'password1': 'S3cure-pass-123', 'password2': 'S3cure-pass-123',
+        }, follow=True)
+        message = OutboxMessage.objects.get()
+        code = re.search(r'Budget Pro is: (\d{6})', message.body).group(1)
+        self.assertTrue(message.sensitive)
+        self.assertNotContains(response, code)
+
+        outbox.process_batch()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.body), ('sent', ''))
+        self.assertIn(code, mail.outbox[0].body)
+        response = self.client.post(reverse('verify_email'), {'email': 'kate@example.com', 'otp': code})
+        self.assertRedirects(response, reverse('home'))
+
+    @override_settings(EMAIL_BACKEND='expenses.tests.FailingEmailBackend')
+    def test_abandoned_and_expired_otp_messages_are_dropped(self):
+        failed = outbox.enqueue_email('user@example.com', 'Code', 'Your code is 246810', sensitive=True)
+        failed.max_attempts = 1
+        failed.save()
+        outbox.process_batch()
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.body), ('failed', ''))
+
+        outbox.enqueue_sms('+15550100', 'Your code is 975310', sensitive=True)
+        notice = outbox.enqueue_email('user@example.com', 'Welcome', 'Hello')
+        OutboxMessage.objects.update(created_at=timezone.now() - timezone.timedelta(hours=1))
+        out = StringIO()
+        call_command('purge_otps', stdout=out)
+
+        self.assertIn('Deleted 2 outbox messages', out.getvalue())
+        self.assertEqual(list(OutboxMessage.objects.values_list('pk', flat=True)), [notice.pk])
+
+    @override_settings(EMAIL_BACKEND='expenses.tests.CountingEmailBackend')
+    def test_batch_is_sent_over_one_connection(self):
+        CountingEmailBackend.opened = 0
+        for i in range(5):
+            outbox.enqueue_email(f'user{i}@example.com', 'Code', 'Your code is 123456')
+
+        call_command('run_outbox', once=True, stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertFalse(OutboxMessage.objects.exclude(status='sent').exists())
+
+    @override_settings(EMAIL_BACKEND='expenses.tests.FailingEmailBackend')
+    def test_failures_back_off_then_give_up(self):
+        message = outbox.enqueue_email('user@example.com', 'Code', 'Your code is 123456')
+        message.max_attempts = 2
+        message.save()
+
+        result = outbox.process_batch()
+        message.refresh_from_db()
+        self.assertEqual((result.retried, message.status, message.attempts), (1, 'pending', 1))
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        self.assertIn('unavailable', message.last_error)
+        self.assertEqual(outbox.process_batch().claimed, 0)
+
+        OutboxMessage.objects.update(next_attempt_at=timezone.now())
+        outbox.process_batch()
+        message.refresh_from_db()
+        self.assertEqual(message.status, 'failed')
+
+
+class OTPStoreTests(TestCase):
+    def test_database_store_hashes_and_consumes_codes(self):
+        store = DatabaseOTPStore()
+        store.issue('signup', 'Alice@Example.com', '482913')
+
+        entry = OneTimeCode.objects.get()
+        self.assertEqual(entry.email, 'alice@example.com')
+        self.assertNotIn('482913', entry.code_hash)
+        self.assertFalse(store.verify('reset', 'alice@example.com', '482913'))
+        self.assertTrue(store.verify('signup', 'alice@example.com', '482913'))
+        self.assertFalse(store.verify('signup', 'alice@example.com', '482913'))
+
+    def test_database_store_limits_attempts(self):
+        store = DatabaseOTPStore(max_attempts=3)
+        store.issue('reset', 'bob@example.com', '111111')
+        for _ in range(3):
+            self.assertFalse(store.verify('reset', 'bob@example.com', '000000'))
+        self.assertFalse(store.verify('reset', 'bob@example.com', '111111'))
+
+        # A new code starts a fresh counter
+        store.issue('reset', 'bob@example.com', '222222')
+        self.assertTrue(store.verify('reset', 'bob@example.com', '222222'))
+
+    def test_expired_codes_fail_and_are_purged(self):
+        store = DatabaseOTPStore()
+        store.issue('signup', 'old@example.com', '123456')
+        store.issue('signup', 'new@example.com', '123456')
+        OneTimeCode.objects.filter(email='old@example.com').update(expires_at=timezone.now())
+
+        self.assertFalse(store.verify('signup', 'old@example.com', '123456'))
+        out = StringIO()
+        call_command('purge_otps', stdout=out)
+        self.assertIn('Purged 1', out.getvalue())
+        self.assertEqual(list(OneTimeCode.objects.values_list('email', flat=True)), ['new@example.com'])
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'otp': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'otp-tests'},
+    })
+    def test_cache_store(self):
+        store = CacheOTPStore(max_attempts=2)
+        store.issue('signup', 'carol@example.com', '654321')
+        self.assertFalse(store.verify('signup', 'carol@example.com', '000000'))
+        self.assertTrue(store.verify('signup', 'CAROL@example.com', '654321'))
+        self.assertFalse(store.verify('signup', 'carol@example.com', '654321'))
+
+        store.issue('signup', 'carol@example.com', '654321')
+        self.assertFalse(store.verify('signup', 'carol@example.com', '000000'))
+        self.assertFalse(store.verify('signup', 'carol@example.com', '000000'))
+        self.assertFalse(store.verify('signup', 'carol@example.com', '654321'))
+
+    def test_cache_store_counts_concurrent_guesses(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        caches_setting = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'otp': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory},
+        }
+        with self.settings(CACHES=caches_setting):
+            store = CacheOTPStore(max_attempts=3)
+            store.issue('reset', 'erin@example.com', '864209', ttl=60)
+            barrier = threading.Barrier(12)
+
+            def guess():
+                barrier.wait()
+                store.verify('reset', 'erin@example.com', '000000')
+
+            threads = [threading.Thread(target=guess) for _ in range(12)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            _, attempts, _ = store.cache.get('otp:reset:erin@example.com')
+            self.assertEqual(attempts, 3)
+            self.assertFalse(store.verify('reset', 'erin@example.com', '864209'))
+
+    @override_settings(OTP_STORE='expenses.otp.CacheOTPStore')
+    def test_purge_reports_cache_store_expires_codes_itself(self):
+        otp._store = None
+        self.addCleanup(setattr, otp, '_store', None)
+        out = StringIO()
+        call_command('purge_otps', stdout=out)
+        self.assertIn('CacheOTPStore relies on its cache timeout', out.getvalue())
+
+    def test_email_verification_flow(self):
+        user = User.objects.create_user('dave', email='dave@example.com', password='pw-12345!', is_active=False)
+        DatabaseOTPStore().issue('signup', 'dave@example.com', '135790')
+
+        response = self.client.post(reverse('verify_email'), {'email': 'dave@example.com', 'otp': '000000'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(reverse('verify_email'), {'email': 'dave@example.com', 'otp': '135790'})
+        self.assertRedirects(response, reverse('home'))
+        user.refresh_from_db()
+        self.assertTrue(user.is_active)
+        self.assertFalse(OneTimeCode.objects.exists())
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='erin', password='pass12345')
+
+    def add(self, day, amount, transaction_type='expense'):
+        return Transaction.objects.create(
+            user=self.user, title='Item', amount=Decimal(amount), transaction_type=transaction_type,
+            date=timezone.make_aware(datetime(2024, 3, day, 12)),
+        )
+
+    def balances(self):
+        return list(
+            LedgerEntry.objects.filter(user=self.user).order_by('date', 'transaction_id')
+            .values_list('balance', flat=True)
+        )
+
+    def test_running_balances_follow_inserts_edits_and_deletes(self):
+        self.add(1, '1000.00', 'income')
+        rent = self.add(5, '400.00')
+        self.add(10, '50.00')
+        self.assertEqual(self.balances(), [Decimal('1000.00'), Decimal('600.00'), Decimal('550.00')])
+
+        # Back-dated insert shifts only the later entries
+        self.add(3, '100.00')
+        self.assertEqual(self.balances(), [Decimal('1000'), Decimal('900'), Decimal('500'), Decimal('450')])
+
+        rent.amount = Decimal('300.00')
+        rent.save()
+        self.assertEqual(self.balances(), [Decimal('1000'), Decimal('900'), Decimal('600'), Decimal('550')])
+
+        rent.date = timezone.make_aware(datetime(2024, 3, 20))
+        rent.save()
+        self.assertEqual(self.balances(), [Decimal('1000'), Decimal('900'), Decimal('850'), Decimal('550')])
+
+        rent.delete()
+        self.assertEqual(self.balances(), [Decimal('1000'), Decimal('900'), Decimal('850')])
+        self.assertEqual(ledger.find_mismatches([self.user.pk]), [])
+
+    def test_balance_lookups(self):
+        self.add(1, '1000.00', 'income')
+        self.add(5, '400.00')
+        self.add(10, '50.00')
+
+        self.assertEqual(ledger.current_balance(self.user), Decimal('550.00'))
+        with self.assertNumQueries(1):
+            balance = ledger.balance_as_of(self.user, timezone.make_aware(datetime(2024, 3, 7)))
+        self.assertEqual(balance, Decimal('600.00'))
+        self.assertEqual(ledger.balance_as_of(self.user, timezone.make_aware(datetime(2024, 2, 1))), 0)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('balance'), {'as_of': '2024-03-05'})
+        self.assertEqual(response.json()['balance'], 600.0)
+        self.assertEqual(self.client.get(reverse('balance'), {'as_of': 'nope'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('home')).context['balance'], Decimal('550.00'))
+
+    def test_import_rebalances_suffix_and_rebuild_repairs_drift(self):
+        self.add(20, '100.00', 'income')
+        importers.import_transactions(self.user, [
+            {'date': '2024-03-02', 'title': 'Salary', 'amount': '500', 'transaction_type': 'income'},
+            {'date': '2024-03-25', 'title': 'Coffee', 'amount': '-5'},
+        ])
+        self.assertEqual(self.balances(), [Decimal('500'), Decimal('600'), Decimal('595')])
+        self.assertEqual(ledger.find_mismatches([self.user.pk]), [])
+
+        LedgerEntry.objects.update(balance=Decimal('1.00'))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ledger', verify_only=True, stdout=StringIO())
+        call_command('rebuild_ledger', stdout=StringIO())
+        self.assertEqual(self.balances(), [Decimal('500'), Decimal('600'), Decimal('595')])
+
+
+class RecurringRuleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='frank', password='pass12345')
+        self.rent = Category.objects.create(name='Rent', transaction_type='expense')
+
+    def rule(self, **kwargs):
+        fields = {
+            'user': self.user, 'title': 'Rent', 'amount': Decimal('500.00'), 'transaction_type': 'expense',
+            'category': self.rent, 'frequency': 'monthly', 'start_date': date(2024, 1, 31),
+        }
+        fields.update(kwargs)
+        return RecurringRule.objects.create(**fields)
+
+    def test_monthly_rules_keep_their_day_and_clamp_short_months(self):
+        rule = self.rule()
+        dates, following = recurring.due_dates(rule, date(2024, 5, 1))
+        self.assertEqual(dates, [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)])
+        self.assertEqual(following, date(2024, 5, 31))
+
+        weekly = self.rule(frequency='weekly', interval=2, start_date=date(2024, 1, 1))
+        self.assertEqual(recurring.due_dates(weekly, date(2024, 1, 29))[0],
+                         [date(2024, 1, 1), date(2024, 1, 15), date(2024, 1, 29)])
+
+    def test_run_posts_due_occurrences_once(self):
+        self.rule()
+        self.rule(title='Salary', transaction_type='income', amount=Decimal('2000.00'), category=None,
+                  start_date=date(2024, 1, 1), end_date=date(2024, 2, 15))
+
+        out = StringIO()
+        call_command('run_recurring', date='2024-03-10', stdout=out)
+        self.assertIn('Posted 4 transactions', out.getvalue())
+        call_command('run_recurring', date='2024-03-10', stdout=StringIO())
+
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 4)
+        self.assertFalse(RecurringRule.objects.get(title='Salary').is_active)
+        self.assertEqual(RecurringRule.objects.get(title='Rent').next_occurrence, date(2024, 3, 31))
+        self.assertEqual(find_mismatches([self.user.pk]), [])
+        self.assertEqual(ledger.find_mismatches([self.user.pk]), [])
+        self.assertEqual(ledger.current_balance(self.user), Decimal('3000.00'))
+
+    def test_existing_occurrences_are_skipped(self):
+        rule = self.rule(start_date=date(2024, 1, 1))
+        recurring.run_due(date(2024, 2, 1))
+        # Simulate a crash after posting but before the schedule moved on
+        RecurringRule.objects.filter(pk=rule.pk).update(next_occurrence=date(2024, 1, 1))
+
+        result = recurring.run_due(date(2024, 3, 1))
+
+        self.assertEqual((result.posted, result.skipped), (1, 2))
+        self.assertEqual(Transaction.objects.filter(recurring_rule=rule).count(), 3)
+
+    def test_interval_must_be_positive(self):
+        with self.assertRaises(ValidationError):
+            RecurringRule(user=self.user, title='Rent', amount=1, transaction_type='expense',
+                          start_date=date(2024, 1, 1), interval=0).full_clean()
+        with self.assertRaises(IntegrityError):
+            self.rule(interval=0)
+
+    def test_failing_rule_does_not_stop_the_run(self):
+        rent = self.rule()
+        broken = self.rule(title='Broken', start_date=date(2024, 1, 1))
+        next_date = recurring.next_date
+
+        def stuck(rule, current):
+            return current if rule.title == 'Broken' else next_date(rule, current)
+
+        with mock.patch.object(recurring, 'next_date', stuck), self.assertLogs('expenses.recurring', 'ERROR') as logs:
+            result = recurring.run_due(date(2024, 3, 1))
+
+        self.assertEqual((result.posted, result.failed), (2, 1))
+        self.assertIn('does not advance past 2024-01-01', logs.output[0])
+        self.assertEqual(Transaction.objects.filter(recurring_rule=rent).count(), 2)
+        self.assertFalse(Transaction.objects.filter(recurring_rule=broken).exists())
+        broken.refresh_from_db()
+        self.assertEqual(broken.next_occurrence, date(2024, 1, 1))
+
+    def test_query_count_does_not_grow_with_rules(self):
+        # The first bump of a version inserts its row
+        bump_data_version(self.user.pk)
+
+        def queries_for(count, start):
+            for i in range(count):
+                self.rule(title=f'Rule {i}', start_date=start)
+            with CaptureQueriesContext(connection) as context:
+                recurring.run_due(start)
+            return len(context)
+
+        self.assertEqual(queries_for(3, date(2024, 1, 1)), queries_for(30, date(2024, 2, 1)))
+
+
+class BudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='grace', email='grace@example.com', password='pass12345')
+        self.food = Category.objects.create(name='Food', transaction_type='expense')
+        self.budget = Budget.objects.create(user=self.user, category=self.food, monthly_limit=Decimal('100.00'))
+
+    def spend(self, amount, category=None):
+        return Transaction.objects.create(
+            user=self.user, title='Groceries', amount=Decimal(amount), transaction_type='expense',
+            category=category or self.food, date=timezone.now(),
+        )
+
+    def thresholds(self):
+        return list(BudgetAlert.objects.order_by('threshold').values_list('threshold', flat=True))
+
+    def test_alerts_raised_once_when_thresholds_are_crossed(self):
+        self.spend('50.00')
+        self.assertEqual(self.thresholds(), [])
+
+        self.spend('35.00')
+        self.assertEqual(self.thresholds(), [80])
+        self.assertEqual(OutboxMessage.objects.filter(recipient='grace@example.com').count(), 1)
+
+        tx = self.spend('20.00')
+        self.assertEqual(self.thresholds(), [80, 100])
+        self.assertEqual(BudgetAlert.objects.get(threshold=100).spent, Decimal('105.00'))
+
+        # Dropping below and crossing again in the same month stays quiet
+        tx.delete()
+        self.spend('30.00')
+        self.assertEqual(self.thresholds(), [80, 100])
+        self.assertEqual(OutboxMessage.objects.count(), 2)
+
+    def test_imports_and_new_budgets_are_checked(self):
+        importers.import_transactions(self.user, [
+            {'date': timezone.localdate().isoformat(), 'title': 'Market', 'amount': '-90', 'category': 'Food'},
+        ])
+        self.assertEqual(self.thresholds(), [80])
+
+        rent = Category.objects.create(name='Rent', transaction_type='expense')
+        self.spend('700.00', category=rent)
+        Budget.objects.create(user=self.user, category=rent, monthly_limit=Decimal('500.00'))
+        self.assertEqual(BudgetAlert.objects.filter(budget__category=rent).count(), 2)
+
+    def test_budgets_api_reads_progress_in_one_query(self):
+        self.spend('85.00')
+        other = Category.objects.create(name='Travel', transaction_type='expense')
+        Budget.objects.create(user=self.user, category=other, monthly_limit=Decimal('200.00'))
+        self.client.force_login(self.user)
+
+        with self.assertNumQueries(3):
+            # Session and user lookups, then the budgets
+            response = self.client.get(reverse('budgets'))
+
+        budgets = response.json()['budgets']
+        self.assertEqual([b['category'] for b in budgets], ['Food', 'Travel'])
+        self.assertEqual((budgets[0]['spent'], budgets[0]['status']), (85.0, 'warning'))
+        self.assertEqual((budgets[1]['spent'], budgets[1]['percent']), (0.0, 0.0))
+
+
+class AnalyticsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='heidi', password='pass12345')
+        self.food = Category.objects.create(name='Food', transaction_type='expense')
+        self.rent = Category.objects.create(name='Rent', transaction_type='expense')
+        self.today = date(2024, 6, 15)
+
+    def add(self, year, month, amount, category, transaction_type='expense'):
+        Transaction.objects.create(
+            user=self.user, title='Item', amount=Decimal(amount), transaction_type=transaction_type,
+            category=category, date=timezone.make_aware(datetime(year, month, 10)),
+        )
+
+    def test_rolling_averages_and_changes(self):
+        for month, amount in zip(range(1, 7), ['100', '200', '300', '400', '500', '600']):
+            self.add(2024, month, amount, self.food)
+        self.add(2023, 6, '300', self.food)
+
+        data = analytics.build_analytics(self.user, months=6, today=self.today)
+
+        self.assertEqual(data['months'], ['2024-01', '2024-02', '2024-03', '2024-04', '2024-05', '2024-06'])
+        self.assertEqual(data['expenses'], [100.0, 200.0, 300.0, 400.0, 500.0, 600.0])
+        self.assertEqual(data['rolling_average']['3']['expenses'], [33.33, 100.0, 200.0, 300.0, 400.0, 500.0])
+        self.assertEqual(data['rolling_average']['12']['expenses'][-1], 175.0)
+        self.assertEqual(data['month_over_month']['expenses'][1:], [100.0] * 5)
+        self.assertEqual(data['month_over_month']['expenses_pct'][1], 100.0)
+        self.assertEqual((data['year_over_year']['expenses'][-1], data['year_over_year']['expenses_pct'][-1]),
+                         (300.0, 100.0))
+        self.assertIsNone(data['year_over_year']['expenses'][0])
+
+    def test_category_shares_and_linear_forecast(self):
+        for month in range(1, 7):
+            self.add(2024, month, '100', self.rent)
+            self.add(2024, month, str(100 * month), self.food)
+
+        data = analytics.build_analytics(self.user, months=6, today=self.today)
+
+        food, rent = data['categories']
+        self.assertEqual((food['name'], food['total']), ('Food', 2100.0))
+        self.assertEqual(rent['share'][:2], [50.0, 33.33])
+        self.assertGreater(food['trend'], 0)
+        self.assertLess(rent['trend'], 0)
+        # Complete months Jan-May rise by 100 a month; July is two steps past May
+        self.assertEqual(data['forecast'], {
+            'expenses': 800.0, 'method': 'linear', 'linear': 800.0, 'seasonal': None, 'month': '2024-07',
+        })
+
+    def test_api_validates_months(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('analytics'), {'months': '0'}).status_code, 400)
+        response = self.client.get(reverse('analytics'), {'months': '3'})
+        self.assertEqual(len(response.json()['months']), 3)
+        self.assertTrue(response.has_header('ETag'))
+
+
+class AnomalyDetectionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ivan', password='pass12345')
+        self.food = Category.objects.create(name='Food', transaction_type='expense')
+        self.start = timezone.now() - timezone.timedelta(days=60)
+
+    def add(self, amount, days, title='Lunch'):
+        return Transaction.objects.create(
+            user=self.user, title=title, amount=Decimal(amount), transaction_type='expense',
+            category=self.food, date=self.start + timezone.timedelta(days=days),
+        )
+
+    def flags(self):
+        return sorted(TransactionFlag.objects.values_list('transaction__title', 'kind'))
+
+    def test_group_medians(self):
+        groups = np.array([1, 2, 1, 1, 2, 1])
+        values = np.array([4.0, 10.0, 1.0, 3.0, 20.0, 2.0])
+        medians, sizes = anomalies.group_medians(groups, values)
+        self.assertEqual(medians.tolist(), [2.5, 15.0, 2.5, 2.5, 15.0, 2.5])
+        self.assertEqual(sizes.tolist(), [4, 2, 4, 4, 2, 4])
+
+    def test_flags_outliers_and_duplicates_incrementally(self):
+        for day, amount in enumerate(['12.00', '15.00', '11.50', '14.00', '13.00', '12.50', '16.00']):
+            self.add(amount, day * 5)
+        self.add('240.00', 40, title='Dinner party')
+        self.add('15.00', 41, title='Taxi')
+        self.add('15.00', 42, title='taxi ')
+
+        result = anomalies.run_detection()
+
+        self.assertEqual((result.outliers, result.duplicates), (1, 1))
+        self.assertEqual(self.flags(), [('Dinner party', 'outlier'), ('taxi ', 'duplicate')])
+
+        # Only rows added since the watermark are checked on the next run
+        self.add('15.00', 50, title='Taxi')
+        result = anomalies.run_detection()
+        self.assertEqual(result.scanned, 1)
+        self.assertEqual(result.duplicates, 0)
+
+        call_command('detect_anomalies', full=True, stdout=StringIO())
+        self.assertEqual(TransactionFlag.objects.count(), 2)
+
+    def test_history_shows_badges(self):
+        tx = self.add('99.00', 1)
+        TransactionFlag.objects.create(transaction=tx, kind='duplicate')
+        self.client.force_login(self.user)
+
+        response = self.client.get(reverse('transaction_history'))
+
+        self.assertContains(response, 'Duplicate?')
+        self.assertNotContains(response, '>Unusual<')
+
+
+class CategoryRuleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ivan', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.transport = Category.objects.create(name='Transport', transaction_type='expense')
+            self.food = Category.objects.create(name='Food', transaction_type='expense')
+            self.rent = Category.objects.create(name='Rent', transaction_type='expense')
+            self.other = Category.objects.create(name='Other', transaction_type='expense')
+            self.salary = Category.objects.create(name='Salary', transaction_type='income')
+
+    def rule(self, pattern, category, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return CategoryRule.objects.create(user=self.user, pattern=pattern, category=category, **kwargs)
+
+    def test_matcher_applies_priority_amounts_and_types(self):
+        self.rule('uber', self.transport)
+        self.rule('uber eats', self.food, priority=10)
+        self.rule(r'^rent\b', self.rent, match_type='regex')
+        self.rule('', self.rent, min_amount=Decimal('1000'))
+        self.rule('acme', self.salary)
+
+        def match(title, amount='20', transaction_type='expense'):
+            return categorization.categorize(self.user.pk, title, Decimal(amount), transaction_type)
+
+        self.assertEqual(match('UBER EATS 1234'), self.food.pk)
+        self.assertEqual(match('Uber trip'), self.transport.pk)
+        self.assertEqual(match('RENT March'), self.rent.pk)
+        self.assertIsNone(match('Parent-teacher fund'))
+        self.assertEqual(match('Laptop', amount='1500'), self.rent.pk)
+        self.assertEqual(match('ACME payroll', transaction_type='income'), self.salary.pk)
+        self.assertIsNone(match('ACME store'))
+
+    def test_matcher_is_cached_until_rules_change(self):
+        rule = self.rule('cafe', self.food)
+        matcher = categorization.get_matcher(self.user.pk)
+        with self.assertNumQueries(2):  # the rules and catalogue versions
+            self.assertIs(categorization.get_matcher(self.user.pk), matcher)
+
+        rule.category = self.transport
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.save()
+
+        self.assertEqual(categorization.categorize(self.user.pk, 'Cafe', 5, 'expense'), self.transport.pk)
+
+    def test_regex_rules_are_validated(self):
+        with self.assertRaises(ValidationError):
+            CategoryRule(user=self.user, category=self.food, match_type='regex', pattern='(unclosed').full_clean()
+        with self.assertRaises(ValidationError):
+            CategoryRule(user=self.user, category=self.food, min_amount=5, max_amount=1).full_clean()
+
+    def test_imports_and_manual_entry_use_rules(self):
+        self.rule('uber', self.transport)
+        importers.import_transactions(self.user, [
+            {'date': '2024-01-05', 'title': 'Uber *Trip', 'amount': '-12.00'},
+            {'date': '2024-01-06', 'title': 'Bakery', 'amount': '-3.00'},
+            {'date': '2024-01-07', 'title': 'Uber', 'amount': '-9.00', 'category': 'Food'},
+        ])
+        categories = dict(Transaction.objects.filter(user=self.user).values_list('title', 'category'))
+        self.assertEqual(categories, {'Uber *Trip': self.transport.pk, 'Bakery': self.other.pk, 'Uber': self.food.pk})
+
+        self.client.force_login(self.user)
+        self.client.post(reverse('add_transaction'), {
+            'title': 'Uber home', 'amount': '15.00', 'transaction_type': 'expense', 'category': '',
+        })
+        self.assertEqual(Transaction.objects.get(title='Uber home').category, self.transport)
+
+        response = self.client.post(reverse('add_transaction'), {
+            'title': 'Books', 'amount': '15.00', 'transaction_type': 'expense', 'category': '',
+        }, follow=True)
+        self.assertContains(response, 'None of your category rules match')
+
+    def test_recategorize_moves_rows_and_rollups(self):
+        for title in ('Uber', 'Lunch', 'Uber pool', 'Uber'):
+            Transaction.objects.create(user=self.user, title=title, amount=Decimal('10.00'),
+                                       transaction_type='expense', category=self.other)
+        self.rule('uber', self.transport)
+
+        result = categorization.recategorize(self.user, batch_size=2)
+
+        self.assertEqual((result.scanned, result.changed, result.batches), (4, 3, 2))
+        self.assertEqual(Transaction.objects.filter(category=self.transport).count(), 3)
+        self.assertEqual(find_mismatches([self.user.pk]), [])
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('recategorize_transactions'), follow=True)
+        self.assertContains(response, 'Recategorized 0 of 4 transactions')
+
+
+class CategoryCatalogueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ivan', password='pass12345')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.food = Category.objects.create(name='Food', transaction_type='expense')
+            self.salary = Category.objects.create(name='Salary', transaction_type='income')
+
+    def test_catalogue_is_cached_until_categories_change(self):
+        catalogue = categories.get_catalogue()
+        with self.assertNumQueries(1):  # the catalogue version
+            self.assertIs(categories.get_catalogue(), catalogue)
+        self.assertEqual(catalogue.get(self.food.pk, 'expense').name, 'Food')
+        self.assertIsNone(catalogue.get(self.food.pk, 'income'))
+        self.assertIsNone(catalogue.get('nope'))
+
+        self.salary.name = 'Wages'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salary.save()
+        self.assertEqual(categories.get_catalogue().as_json()['income'], [
+            {'id': self.salary.pk, 'name': 'Wages', 'color': '#007bff'},
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('add_default_categories', stdout=StringIO())
+        self.assertEqual(len(categories.get_catalogue().for_type('expense')), 10)
+
+    def test_changes_from_other_processes_reload_the_catalogue(self):
+        categories.get_catalogue()
+        # Another worker adds a category; this process only sees the
+        # database row and the bumped version
+        Category.objects.bulk_create([Category(name='Travel', transaction_type='expense')])
+        DataVersion.objects.filter(key=categories.VERSION_KEY).update(value=F('value') + 1)
+
+        self.assertIn('Travel', [entry.name for entry in categories.get_catalogue().for_type('expense')])
+
+    def test_forms_embed_catalogue_and_validate_without_queries(self):
+        self.client.force_login(self.user)
+        categories.get_catalogue()
+
+        response = self.client.get(reverse('add_transaction'))
+        self.assertContains(response, '<script id="category-catalogue" type="application/json">')
+        self.assertEqual(response.context['category_catalogue']['expense'][0]['name'], 'Food')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('add_transaction'), {
+                'title': 'Lunch', 'amount': '12.00', 'transaction_type': 'expense', 'category': self.food.pk,
+            })
+        tx = Transaction.objects.get(title='Lunch')
+        self.assertEqual(tx.category, self.food)
+        self.assertFalse([q for q in queries.captured_queries if 'FROM "expenses_category"' in q['sql']])
+
+        response = self.client.post(reverse('edit_transaction', args=[tx.pk]), {
+            'title': 'Lunch', 'amount': '12.00', 'transaction_type': 'income', 'category': self.food.pk,
+        })
+        self.assertContains(response, 'Invalid category selected')
+
+
+class PerformanceMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metrics.registry.reset()
+        self.user = User.objects.create_user(username='ivan', password='pass12345')
+        self.admin = User.objects.create_user(username='root', password='pass12345', is_staff=True)
+        food = Category.objects.create(name='Food', transaction_type='expense')
+        for day in range(1, 4):
+            Transaction.objects.create(user=self.user, title=f'Lunch {day}', amount=Decimal('10.00'),
+                                       transaction_type='expense', category=food)
+
+    def test_histogram_quantiles(self):
+        histogram = metrics.Histogram((1, 2, 4))
+        for value in (0.5, 1.5, 1.5, 3, 10):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.cumulative(), [('1', 1), ('2', 3), ('4', 4), ('+Inf', 5)])
+        self.assertEqual(histogram.quantile(0.5), 1.75)
+        self.assertEqual(histogram.quantile(0.99), 4.0)
+
+    def test_requests_report_server_timing_and_metrics(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('transaction_history'))
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="4 queries", tpl;dur=[\d.]+$')
+
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 302)
+        self.client.force_login(self.admin)
+        body = self.client.get(reverse('metrics')).content.decode()
+
+        self.assertIn('budgetpro_db_queries_bucket{view="transaction_history",le="5"} 1\n', body)
+        self.assertIn('budgetpro_request_duration_seconds_count{view="transaction_history"} 1\n', body)
+        self.assertIn('budgetpro_db_queries_quantile{view="transaction_history",quantile="0.5"} 4.0\n', body)
+        self.assertNotIn('budgetpro_query_budget_exceeded_total{', body)
+
+    async def test_async_requests_count_queries(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(reverse('chart_data'))
+
+        # Session, user, the data version (for the ETag, then the cache key)
+        # and the two summary queries
+        self.assertIn('desc="6 queries"', response['Server-Timing'])
+        self.assertIn('budgetpro_db_queries_count{view="chart_data"} 1\n', metrics.render_prometheus())
+
+    @override_settings(PERFORMANCE_QUERY_BUDGETS={'transaction_history': 3})
+    def test_views_over_query_budget_are_flagged(self):
+        self.client.force_login(self.user)
+        with self.assertLogs('expenses.middleware', 'WARNING') as logs:
+            response = self.client.get(reverse('transaction_history'))
+
+        self.assertIn('4 queries, over budget of 3', response['Server-Timing'])
+        self.assertIn('over its budget of 3', logs.output[0])
+        self.assertIn('budgetpro_query_budget_exceeded_total{view="transaction_history"} 1',
+                      metrics.render_prometheus())
+
+
+class SeedBenchmarkDataTests(TestCase):
+    def test_seeds_users_with_consistent_rollups_and_ledger(self):
+        cache.clear()
+        call_command('seed_benchmark_data', users=3, rows=50, batch_size=20, stdout=StringIO())
+
+        users = list(User.objects.filter(username__startswith='benchmark_').order_by('pk'))
+        self.assertEqual([user.username for user in users], ['benchmark_0', 'benchmark_1', 'benchmark_2'])
+        self.assertEqual(Transaction.objects.count(), 50)
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 3)
+        self.assertTrue(users[0].check_password('benchmark-pass-42'))
+        self.assertEqual(find_mismatches([user.pk for user in users]), [])
+        self.assertEqual(ledger.find_mismatches([user.pk for user in users]), [])
+
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark_data', users=1, rows=1, stdout=StringIO())
+
+
+QUERY_SNAPSHOT_DIR = Path(__file__).resolve().parent / 'query_snapshots'
+# Literals and generated names that vary between runs or dataset sizes
+SQL_NORMALIZERS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w".])-?\d+(?:\.\d+)?(?![\w"])'), '?'),
+    (re.compile(r'"s\d+_x\d+"'), '"s?"'),
+    (re.compile(r'\((?:\?, )+\?\)'), '(...)'),
+    (re.compile(r'(?:\(\.\.\.\), )+\(\.\.\.\)'), '(...)'),
+]
+
+
+def normalize_sql(sql):
+    for pattern, replacement in SQL_NORMALIZERS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def full_scans(sql):
+    """Tables an SQLite SELECT reads end to end, from EXPLAIN QUERY PLAN"""
+    if connection.vendor != 'sqlite' or not sql.startswith('SELECT'):
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        details = [row[-1] for row in cursor.fetchall()]
+    # Full-text MATCHes show up as scans of the virtual table's own index
+    return sorted({
+        detail.split()[1] for detail in details if detail.startswith('SCAN ') and 'VIRTUAL TABLE' not in detail
+    })
+
+
+class QueryCountTests(TestCase):
+    """Every URL runs the same queries for a user with 2 or 60 transactions.
+
+    The normalized SQL of each request, with the tables read by full scans,
+    is compared with expenses/query_snapshots/<request>.sql. After an
+    intended change, regenerate them with
+    UPDATE_QUERY_SNAPSHOTS=1 python manage.py test expenses.tests.QueryCountTests
+    """
+
+    # label -> (url name, method, query string); every name in urls.py appears
+    REQUESTS = {
+        'home': ('home', 'get', ''),
+        'about': ('about', 'get', ''),
+        'login': ('login', 'get', ''),
+        'logout': ('logout', 'post', ''),
+        'signup': ('signup', 'get', ''),
+        'verify_email': ('verify_email', 'get', ''),
+        'resend_verification': ('resend_verification', 'get', ''),
+        'password_reset': ('password_reset', 'get', ''),
+        'password_reset_verify': ('password_reset_verify', 'get', ''),
+        'profile': ('profile', 'get', ''),
+        'transaction_history': ('transaction_history', 'get', ''),
+        'transaction_history_search': ('transaction_history', 'get', '?search=lunch&min_amount=5&start_date=2024-01-01'),
+        'add_transaction': ('add_transaction', 'get', ''),
+        'import_transactions': ('import_transactions', 'get', ''),
+        'recategorize_transactions': ('recategorize_transactions', 'post', ''),
+        'export_transactions': ('export_transactions', 'get', ''),
+        'edit_transaction': ('edit_transaction', 'get', ''),
+        'delete_transaction': ('delete_transaction', 'get', ''),
+        'chart_data': ('chart_data', 'get', ''),
+        'live_updates': ('live_updates', 'get', ''),
+        'monthly_series': ('monthly_series', 'get', ''),
+        'balance': ('balance', 'get', ''),
+        'budgets': ('budgets', 'get', ''),
+        'analytics': ('analytics', 'get', ''),
+        'search_transactions': ('search_transactions', 'get', '?search=lunch'),
+        'summary_cache_stats': ('summary_cache_stats', 'get', ''),
+        'categories_by_type': ('categories_by_type', 'get', '?transaction_type=expense'),
+        'metrics': ('metrics', 'get', ''),
+    }
+
+    def setUp(self):
+        cache.clear()
+        # Commit the data versions too, so no snapshot from an earlier test
+        # matches them
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categories = [
+                Category.objects.create(name=name, transaction_type=transaction_type)
+                for name, transaction_type in [
+                    ('Food', 'expense'), ('Rent', 'expense'), ('Transport', 'expense'), ('Salary', 'income'),
+                ]
+            ]
+            self.small = self.populate('small', transactions=2, months=1, related=1)
+            self.large = self.populate('large', transactions=60, months=14, related=3)
+
+    def populate(self, username, transactions, months, related):
+        """A user with `transactions` spread over `months`, and `related` of every other object"""
+        user = User.objects.create_user(username=username, password='pass12345', is_staff=True)
+        now = timezone.now()
+        created = []
+        for i in range(transactions):
+            category = self.categories[i % len(self.categories)]
+            created.append(Transaction.objects.create(
+                user=user, title=f'Lunch {i}', amount=Decimal(10 + i), transaction_type=category.transaction_type,
+                category=category, date=now - timezone.timedelta(days=30 * (i % months) + i % 7),
+            ))
+        for category in self.categories[:related]:
+            Budget.objects.create(user=user, category=category, monthly_limit=Decimal('50.00'))
+            CategoryRule.objects.create(user=user, pattern=f'{category.name} shop', category=category)
+            RecurringRule.objects.create(
+                user=user, title=f'{category.name} plan', amount=Decimal('5.00'), transaction_type='expense',
+                category=category, start_date=date.today() + timezone.timedelta(days=1),
+            )
+        for transaction in created[:related]:
+            TransactionFlag.objects.create(transaction=transaction, kind='outlier', score=4.2)
+        return user
+
+    def capture(self, user, label):
+        name, method, query = self.REQUESTS[label]
+        kwargs = {}
+        if '<int:pk>' in str(next(p.pattern for p in urlpatterns if p.name == name)):
+            kwargs['pk'] = Transaction.objects.filter(user=user).order_by('pk').values_list('pk', flat=True)[0]
+        self.client.force_login(user)
+        cache.clear()
+        # The catalogue and the FTS probe are per-process, normally already loaded
+        categories.get_catalogue()
+        search.fts_available(connection.alias)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(reverse(name, kwargs=kwargs) + query)
+            # Event streams never end; their queries all happen up front
+            if response.streaming and response['Content-Type'] != 'text/event-stream':
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 500, label)
+        if method == 'get':
+            budget = settings.PERFORMANCE_QUERY_BUDGETS.get(name, settings.PERFORMANCE_QUERY_BUDGET)
+            self.assertLessEqual(len(queries), budget, f'{label} is over its query budget')
+        return [query['sql'] for query in queries.captured_queries]
+
+    def render_snapshot(self, statements):
+        lines = []
+        for sql in statements:
+            scans = full_scans(sql)
+            lines.append(normalize_sql(sql) + (f'  -- full scan: {", ".join(scans)}' if scans else ''))
+        return '\n'.join(lines) + '\n'
+
+    def test_first_login_stays_within_query_budgets(self):
+        User.objects.create_user(username='newcomer', password='pass12345')
+        cache.clear()
+        versions = DataVersion.objects.count()
+
+        with self.assertNoLogs('expenses.middleware', 'WARNING'):
+            response = self.client.post(
+                reverse('login'), {'username': 'newcomer', 'password': 'pass12345'}, follow=True,
+            )
+            self.client.get(reverse('chart_data'))
+            self.client.get(reverse('add_transaction'))
+
+        self.assertEqual(response.redirect_chain[-1][0], reverse('home'))
+        # Reading a version that was never bumped writes nothing
+        self.assertEqual(DataVersion.objects.count(), versions)
+
+    def test_requests_cover_every_url(self):
+        self.assertEqual({name for name, _, _ in self.REQUESTS.values()},
+                         {pattern.name for pattern in urlpatterns})
+
+    def test_query_counts_do_not_grow_with_data(self):
+        update = os.environ.get('UPDATE_QUERY_SNAPSHOTS') == '1'
+        for label in self.REQUESTS:
+            with self.subTest(label):
+                small = self.capture(self.small, label)
+                large = self.capture(self.large, label)
+                self.assertEqual(len(small), len(large), f'{label} runs more queries for a larger dataset:\n' + ''.join(
+                    difflib.unified_diff(self.render_snapshot(small).splitlines(True),
+                                         self.render_snapshot(large).splitlines(True), 'small', 'large')
+                ))
+
+                snapshot = QUERY_SNAPSHOT_DIR / f'{label}.sql'
+                actual = self.render_snapshot(large)
+                if update:
+                    QUERY_SNAPSHOT_DIR.mkdir(exist_ok=True)
+                    snapshot.write_text(actual)
+                    continue
+                self.assertTrue(snapshot.exists(), f'No query snapshot for {label}; set UPDATE_QUERY_SNAPSHOTS=1')
+                expected = snapshot.read_text()
+                if actual != expected:
+                    self.fail(f'Queries of {label} changed; set UPDATE_QUERY_SNAPSHOTS=1 if intended:\n' + ''.join(
+                        difflib.unified_diff(expected.splitlines(True), actual.splitlines(True),
+                                             f'{snapshot.name} (snapshot)', f'{snapshot.name} (now)')
+                    ))
+
+
+class LiveUpdatesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='judy', password='pass12345')
+        self.food = Category.objects.create(name='Food', color='#FF6384', transaction_type='expense')
+        self.rent = Category.objects.create(name='Rent', transaction_type='expense')
+        self.salary = Category.objects.create(name='Salary', transaction_type='income')
+        self.lunch = Transaction.objects.create(
+            user=self.user, title='Lunch', amount=Decimal('12.00'), transaction_type='expense', category=self.food,
+        )
+        Transaction.objects.create(
+            user=self.user, title='Pay', amount=Decimal('100.00'), transaction_type='income', category=self.salary,
+        )
+
+    def committed(self, change):
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+
+    async def test_broker_delivers_events_published_from_other_threads(self):
+        broker = live.InProcessBroker()
+        queue = broker.subscribe(7)
+        self.assertTrue(broker.has_subscribers(7))
+
+        publisher = threading.Thread(target=broker.publish, args=(7, {'type': 'reload'}))
+        publisher.start()
+        publisher.join()
+        self.assertEqual(await asyncio.wait_for(queue.get(), 1), {'type': 'reload'})
+
+        for i in range(live.QUEUE_SIZE + 5):
+            broker.publish(7, {'type': 'transaction', 'n': i})
+        await asyncio.sleep(0)
+        # Overflowing the queue replaced its backlog with a single reload
+        self.assertEqual(queue.qsize(), 5)
+        self.assertEqual(queue.get_nowait(), {'type': 'reload'})
+
+        broker.unsubscribe(7, queue)
+        self.assertFalse(broker.has_subscribers(7))
+
+    def test_delta_covers_old_and_new_buckets_of_an_edit(self):
+        self.lunch.amount = Decimal('20.00')
+        self.lunch.category = self.rent
+        self.lunch.date = timezone.now() - timezone.timedelta(days=62)
+        self.lunch.save()
+        old = rollups.bucket_for(self.user.pk, timezone.now(), self.food.pk, 'expense')
+        new = rollups.bucket_for(self.user.pk, self.lunch.date, self.rent.pk, 'expense')
+
+        with self.assertNumQueries(4):
+            delta = live.build_delta(self.user.pk, [old, new])
+
+        self.assertEqual(delta['totals'], {'income': 100.0, 'expenses': 20.0, 'balance': 80.0})
+        self.assertEqual({(m['year'], m['month']): (m['income'], m['expenses']) for m in delta['months']},
+                         {old[1:3]: (100.0, 0.0), new[1:3]: (0.0, 20.0)})
+        self.assertEqual(sorted((c['name'], c['total']) for c in delta['categories']), [('Food', 0.0), ('Rent', 20.0)])
+
+    def test_nothing_is_computed_without_subscribers(self):
+        bucket = rollups.bucket_for(self.user.pk, timezone.now(), self.food.pk, 'expense')
+        with self.assertNumQueries(0):
+            self.committed(lambda: live.transaction_changed(self.user.pk, [bucket]))
+
+    async def test_stream_pushes_deltas_and_reloads(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('live_updates'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        # The stream subscribes when it is first read
+        add = lambda: Transaction.objects.create(
+            user=self.user, title='Dinner', amount=Decimal('8.00'), transaction_type='expense', category=self.food,
+        )
+        await sync_to_async(self.committed)(add)
+        event = (await asyncio.wait_for(anext(stream), 1)).decode()
+        self.assertTrue(event.startswith('event: transaction\ndata: '))
+        delta = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual(delta['totals'], {'income': 100.0, 'expenses': 20.0, 'balance': 80.0})
+        self.assertEqual(delta['categories'], [{'id': self.food.pk, 'name': 'Food', 'color': '#FF6384', 'total': 20.0}])
+        self.assertEqual(delta['months'][0]['label'], timezone.localdate().strftime('%b %Y'))
+
+        await sync_to_async(self.committed)(lambda: rollups.rebuild_for_users([self.user.pk]))
+        self.assertEqual(await asyncio.wait_for(anext(stream), 1), b'event: reload\ndata: {"type": "reload"}\n\n')
+
+        # A disconnecting client cancels the task reading the stream
+        reader = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertFalse(live.get_broker().has_subscribers(self.user.pk))
+
+    def test_streams_are_only_offered_under_asgi(self):
+        self.client.force_login(self.user)
+        connect = 'connectLiveUpdates(incomeExpenseChart, categoryChart, monthlyChart);'
+
+        response = self.client.get(reverse('live_updates'))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(live.get_broker().has_subscribers(self.user.pk))
+        self.assertNotContains(self.client.get(reverse('home')), connect)
+
+        async_to_sync(self.async_client.aforce_login)(self.user)
+        self.assertContains(async_to_sync(self.async_client.get)(reverse('home')), connect)
+
+
+class SQLiteTuningTests(TestCase):
+    def test_connections_apply_pragmas_and_immediate_transactions(self):
+        if connection.vendor != 'sqlite' or not settings.SQLITE_TUNED:
+            self.skipTest('SQLite tuning is not enabled')
+        with connection.cursor() as cursor:
+            pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('synchronous', 'temp_store', 'cache_size', 'busy_timeout')}
+
+        # NORMAL, MEMORY; the test database is in memory, so it cannot use WAL
+        self.assertEqual(pragmas, {'synchronous': 1, 'temp_store': 2, 'cache_size': -65536, 'busy_timeout': 20000})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
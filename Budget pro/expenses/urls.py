@@ -23,10 +23,23 @@ urlpatterns = [
     # Transactions
     path('transactions/', views.transaction_history, name='transaction_history'),
     path('transactions/add/', views.add_transaction, name='add_transaction'),
+    path('transactions/import/', views.import_transactions, name='import_transactions'),
+    path('transactions/recategorize/', views.recategorize_transactions, name='recategorize_transactions'),
+    path('transactions/export/', views.export_transactions, name='export_transactions'),
     path('transactions/edit/<int:pk>/', views.edit_transaction, name='edit_transaction'),
     path('transactions/delete/<int:pk>/', views.delete_transaction, name='delete_transaction'),
     
     # API endpoints
     path('api/chart-data/', views.chart_data, name='chart_data'),
+    path('api/live/', views.live_updates, name='live_updates'),
+    path('api/monthly-series/', views.monthly_series, name='monthly_series'),
+    path('api/balance/', views.balance_api, name='balance'),
+    path('api/budgets/', views.budgets_api, name='budgets'),
+    path('api/analytics/', views.analytics_api, name='analytics'),
+    path('api/transactions/search/', views.search_transactions_api, name='search_transactions'),
+    path('api/summary-cache-stats/', views.summary_cache_stats_api, name='summary_cache_stats'),
     path('api/categories-by-type/', views.get_categories_by_type, name='categories_by_type'),
+    
+    # Internal
+    path('internal/metrics', views.metrics, name='metrics'),
 ]
\ No newline at end of file
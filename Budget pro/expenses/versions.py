@@ -0,0 +1,58 @@
+import time
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+
+# Version of a key that has never been bumped. Reads do not create rows,
+# so a first visit costs no writes; the first bump inserts the row.
+UNSET = 0
+
+
+def _seed(key) -> int:
+    # Start from the clock, far above UNSET, so a recreated database never
+    # reuses a version that a long-lived cache may still hold entries for
+    return DataVersion.objects.get_or_create(key=key, defaults={'value': int(time.time() * 1000)})[0].value
+
+
+def get_version(key) -> int:
+    """Current value of the generation counter stored under `key`"""
+    version = DataVersion.objects.filter(key=key).values_list('value', flat=True).first()
+    return UNSET if version is None else version
+
+
+async def aget_version(key) -> int:
+    """get_version() for async code"""
+    version = await DataVersion.objects.filter(key=key).values_list('value', flat=True).afirst()
+    return UNSET if version is None else version
+
+
+class _Bump:
+    """on_commit callback advancing `key`; later bumps of the key join it while it is pending"""
+
+    def __init__(self, key):
+        self.key = key
+        self.pending = True
+
+    def __call__(self):
+        self.pending = False
+        if not DataVersion.objects.filter(key=self.key).update(value=F('value') + 1):
+            _seed(self.key)
+
+
+def bump_version(key):
+    """Advance the counter under `key` once the surrounding transaction commits.
+
+    Any number of bumps of one key in a transaction cost a single UPDATE.
+    Other readers only see the new version together with the committed
+    data, so nothing stale can be cached under it.
+    """
+    connection = transaction.get_connection()
+    if any(
+        isinstance(callback, _Bump) and callback.key == key and callback.pending
+        for _, callback, _ in connection.run_on_commit
+    ):
+        return
+    transaction.on_commit(_Bump(key))
@@ -1,17 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.db.models import Sum, Q
-from django.http import JsonResponse
+from django.db.models import Exists, OuterRef, Sum, Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+import asyncio
+import csv
 import json
-from .models import Transaction, Category, Profile
+from functools import wraps
+from .models import Transaction, Category, Profile, TransactionFlag
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
+from django.conf import settings
 from .forms import CustomUserCreationForm
+from . import categorization, importers, ledger
+from .analytics import MAX_ANALYTICS_MONTHS, build_analytics
+from .budgets import budget_progress
+from .categories import catalogue_version, get_catalogue
+from .live import get_broker, streaming_supported
+from .metrics import render_prometheus
+from .pagination import InvalidCursor, KeysetPage
+from .search import FILTER_PARAMS, filter_transactions, parse_day
+from .summary import (
+    GRANULARITIES, MAX_SERIES_MONTHS, adata_version, aget_summary, data_version, get_summary, lifetime_totals, period_series,
+    summary_cache_stats,
+)
 
 def home(request):
     # Redirect unauthenticated users to login page
@@ -19,34 +39,20 @@ def home(request):
         return redirect('login')
     
     # Authenticated users see their dashboard
-    # Get recent transactions
-    recent_transactions = Transaction.objects.filter(user=request.user)[:5]
+    # Get recent transactions, with their categories in the same query
+    recent_transactions = Transaction.objects.filter(user=request.user).select_related('category')[:5]
     
     # Calculate summary
-    income_result = Transaction.objects.filter(
-        user=request.user, transaction_type='income'
-    ).aggregate(Sum('amount'))
-    total_income = income_result['amount__sum'] or 0
-    
-    expenses_result = Transaction.objects.filter(
-        user=request.user, transaction_type='expense'
-    ).aggregate(Sum('amount'))
-    total_expenses = expenses_result['amount__sum'] or 0
-    
-    balance = total_income - total_expenses
-    
-    # Get categories for expenses
-    expense_categories = Category.objects.filter(
-        transaction__user=request.user,
-        transaction__transaction_type='expense'
-    ).annotate(total=Sum('transaction__amount')).order_by('-total')
+    summary = get_summary(request.user)
     
     context = {
         'recent_transactions': recent_transactions,
-        'total_income': total_income,
-        'total_expenses': total_expenses,
-        'balance': balance,
-        'expense_categories': expense_categories[:5],
+        'total_income': summary.total_income,
+        'total_expenses': summary.total_expenses,
+        # One indexed lookup of the latest running balance
+        'balance': ledger.current_balance(request.user),
+        'expense_categories': summary.expense_categories[:5],
+        'live_updates': streaming_supported(request),
     }
     return render(request, 'expenses/home.html', context)
 
@@ -118,35 +124,74 @@ def profile(request):
 
 @login_required
 def transaction_history(request):
-    transactions = Transaction.objects.filter(user=request.user)
+    # Search by title or description, plus amount and date ranges
+    transactions, filters = filter_transactions(
+        Transaction.objects.filter(user=request.user), request.GET
+    )
+    search_query = filters['search']
+    is_filtered = any(value not in (None, '') for value in filters.values())
     
-    # Search by title or description
-    search_query = request.GET.get('search')
-    if search_query:
-        transactions = transactions.filter(
-            Q(title__icontains=search_query) | 
-            Q(description__icontains=search_query)
+    # Calculate totals in one pass (the rollup table covers the unfiltered case)
+    if is_filtered:
+        totals = transactions.aggregate(
+            income=Sum('amount', filter=Q(transaction_type='income')),
+            expenses=Sum('amount', filter=Q(transaction_type='expense')),
         )
+        total_income = totals['income'] or 0
+        total_expenses = totals['expenses'] or 0
+    else:
+        total_income, total_expenses = lifetime_totals(request.user)
     
-    # Calculate totals
-    income_result = transactions.filter(transaction_type='income').aggregate(Sum('amount'))
-    total_income = income_result['amount__sum'] or 0
+    # Keyset pagination on (date, id) with only the columns the table shows
+    try:
+        page_size = int(request.GET.get('page_size', settings.TRANSACTIONS_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.TRANSACTIONS_PAGE_SIZE
+    page_size = max(1, min(page_size, settings.TRANSACTIONS_MAX_PAGE_SIZE))
+    
+    rows = transactions.select_related('category').only(
+        'title', 'amount', 'transaction_type', 'date',
+        'category__name', 'category__color',
+    ).annotate(
+        # Anomaly badges, flagged by the detect_anomalies job
+        is_outlier=Exists(TransactionFlag.objects.filter(transaction=OuterRef('pk'), kind='outlier')),
+        is_duplicate=Exists(TransactionFlag.objects.filter(transaction=OuterRef('pk'), kind='duplicate')),
+    )
+    try:
+        page_obj = KeysetPage(
+            rows, page_size,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
+    except InvalidCursor:
+        return redirect('transaction_history')
     
-    expenses_result = transactions.filter(transaction_type='expense').aggregate(Sum('amount'))
-    total_expenses = expenses_result['amount__sum'] or 0
+    # Query strings carried over by the pagination and export links
+    filter_params = {key: request.GET[key] for key in FILTER_PARAMS if request.GET.get(key)}
     
     context = {
-        'transactions': transactions,
+        'transactions': page_obj.object_list,
+        'page_obj': page_obj,
+        'is_paginated': page_obj.has_other_pages(),
+        'pagination_query': urlencode({'page_size': page_size, **filter_params}),
+        'filter_query': urlencode(filter_params),
         'total_income': total_income,
         'total_expenses': total_expenses,
         'search_query': search_query,
+        'min_amount': request.GET.get('min_amount', ''),
+        'max_amount': request.GET.get('max_amount', ''),
+        'start_date': request.GET.get('start_date', ''),
+        'end_date': request.GET.get('end_date', ''),
     }
     return render(request, 'expenses/transaction_history.html', context)
 
+class NoMatchingRule(Exception):
+    pass
+
 @login_required
 def add_transaction(request):
-    # Get all categories initially (for page load)
-    categories = Category.objects.all()
+    # Categories come from the in-memory catalogue; no query per request
+    catalogue = get_catalogue()
     
     if request.method == 'POST':
         title = request.POST.get('title')
@@ -157,16 +202,23 @@ def add_transaction(request):
         time = request.POST.get('time')
         description = request.POST.get('description')
         
-        if title and amount and transaction_type and category_id:
+        if title and amount and transaction_type:
             try:
+                if not category_id:
+                    # Left on "Auto": let the user's category rules decide
+                    category_id = categorization.categorize(request.user.pk, title, amount, transaction_type)
+                    if category_id is None:
+                        raise NoMatchingRule
                 # Validate that the category matches the transaction type
-                category = Category.objects.get(id=category_id, transaction_type=transaction_type)
+                category = catalogue.get(category_id, transaction_type)
+                if category is None:
+                    raise Category.DoesNotExist
                 transaction = Transaction(
                     user=request.user,
                     title=title,
                     amount=amount,
                     transaction_type=transaction_type,
-                    category=category,
+                    category_id=category.id,
                     description=description or ''
                 )
                 
@@ -188,20 +240,25 @@ def add_transaction(request):
                 transaction.save()
                 messages.success(request, 'Transaction added successfully!')
                 return redirect('transaction_history')
+            except NoMatchingRule:
+                messages.error(request, 'None of your category rules match this transaction; please choose a category.')
             except Category.DoesNotExist:  # type: ignore
                 messages.error(request, 'Invalid category selected for this transaction type.')
-            except ValueError as e:
+            except (ValueError, ArithmeticError) as e:
                 messages.error(request, f'Invalid amount or date/time format: {str(e)}')
         else:
             messages.error(request, 'Please fill in all required fields.')
     
-    return render(request, 'expenses/add_transaction.html', {'categories': categories})
+    return render(request, 'expenses/add_transaction.html', {
+        'categories': catalogue.entries,
+        'category_catalogue': catalogue.as_json(),
+    })
 
 @login_required
 def edit_transaction(request, pk):
     transaction = get_object_or_404(Transaction, pk=pk, user=request.user)
-    # Get all categories initially (for page load)
-    categories = Category.objects.all()
+    # Categories come from the in-memory catalogue; no query per request
+    catalogue = get_catalogue()
     
     if request.method == 'POST':
         title = request.POST.get('title')
@@ -215,11 +272,13 @@ def edit_transaction(request, pk):
         if title and amount and transaction_type and category_id:
             try:
                 # Validate that the category matches the transaction type
-                category = Category.objects.get(id=category_id, transaction_type=transaction_type)
+                category = catalogue.get(category_id, transaction_type)
+                if category is None:
+                    raise Category.DoesNotExist
                 transaction.title = title
                 transaction.amount = amount
                 transaction.transaction_type = transaction_type
-                transaction.category = category
+                transaction.category_id = category.id
                 transaction.description = description or ''
                 
                 # Handle date and time
@@ -249,9 +308,104 @@ def edit_transaction(request, pk):
     
     return render(request, 'expenses/edit_transaction.html', {
         'transaction': transaction,
-        'categories': categories
+        'categories': catalogue.entries,
+        'category_catalogue': catalogue.as_json(),
     })
 
+@login_required
+def import_transactions(request):
+    if request.method == 'POST':
+        statement = request.FILES.get('statement')
+        if not statement:
+            messages.error(request, 'Please choose a statement file to import.')
+        else:
+            file_format = importers.detect_format(statement.name, request.POST.get('format', ''))
+            result = importers.import_transactions(
+                request.user,
+                importers.iter_rows(statement.file, file_format),
+                batch_size=settings.IMPORT_BATCH_SIZE,
+            )
+            for error in result.errors[:10]:
+                messages.warning(request, error)
+            if result.created:
+                messages.success(
+                    request,
+                    f'Imported {result.created} transactions '
+                    f'({result.rows_per_second:.0f} rows/s), skipped {result.skipped} rows.'
+                )
+                return redirect('transaction_history')
+            messages.error(request, f'No transactions were imported; skipped {result.skipped} rows.')
+    
+    return render(request, 'expenses/import_transactions.html')
+
+@login_required
+def recategorize_transactions(request):
+    """Apply the user's category rules to all of their transactions"""
+    if request.method == 'POST':
+        result = categorization.recategorize(request.user, batch_size=settings.IMPORT_BATCH_SIZE)
+        messages.success(request, f'Recategorized {result.changed} of {result.scanned} transactions.')
+    return redirect('transaction_history')
+
+class Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+EXPORT_COLUMNS = ('date', 'title', 'amount', 'transaction_type', 'category__name', 'description')
+
+@login_required
+def export_transactions(request):
+    """Stream the user's (filtered) transactions as CSV or JSON lines"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        return JsonResponse({'error': 'format must be csv or jsonl.'}, status=400)
+    
+    transactions, _ = filter_transactions(
+        Transaction.objects.filter(user=request.user), request.GET
+    )
+    rows = transactions.order_by('-date', '-pk').values_list(*EXPORT_COLUMNS).iterator(
+        chunk_size=settings.EXPORT_CHUNK_SIZE
+    )
+    
+    if export_format == 'csv':
+        writer = csv.writer(Echo())
+        header = ['date', 'title', 'amount', 'type', 'category', 'description']
+        content = (writer.writerow(row) for row in _export_rows(header, rows))
+        content_type = 'text/csv'
+    else:
+        content = (
+            json.dumps({
+                'date': date.isoformat(),
+                'title': title,
+                'amount': str(amount),
+                'type': transaction_type,
+                'category': category,
+                'description': description,
+            }) + '\n'
+            for date, title, amount, transaction_type, category, description in rows
+        )
+        content_type = 'application/x-ndjson'
+    
+    response = StreamingHttpResponse(content, content_type=content_type)
+    filename = f'transactions-{timezone.localdate():%Y%m%d}.{export_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+# Leading characters that make spreadsheet applications read a cell as a formula
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _csv_text(value):
+    """Quote user-entered text so spreadsheets show it instead of evaluating it"""
+    return f"'{value}" if value.startswith(FORMULA_PREFIXES) else value
+
+def _export_rows(header, rows):
+    yield header
+    for date, title, amount, transaction_type, category, description in rows:
+        yield [
+            date.isoformat(), _csv_text(title), amount, transaction_type,
+            _csv_text(category or ''), _csv_text(description),
+        ]
+
 @login_required
 def delete_transaction(request, pk):
     transaction = get_object_or_404(Transaction, pk=pk, user=request.user)
@@ -261,85 +415,214 @@ def delete_transaction(request, pk):
         return redirect('transaction_history')
     return render(request, 'expenses/delete_transaction.html', {'transaction': transaction})
 
+def chart_data_etag(request):
+    # The monthly window rolls over with the calendar month
+    return f'chart-{request.user.pk}-{request.data_version}-{timezone.localdate():%Y%m}'
+
+def analytics_etag(request):
+    months = request.GET.get('months', '')
+    return f'analytics-{request.user.pk}-{data_version(request.user.pk)}-{timezone.localdate():%Y%m}-{months}'
+
+def categories_etag(request):
+    return f"categories-{catalogue_version()}-{request.GET.get('transaction_type', '')}"
+
+def resolve_user(view):
+    """Load request.user without blocking an async view's event loop.
+
+    Decorators such as condition() call their helpers synchronously, and a
+    lazy request.user would query the database from the event loop.
+    """
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view(request, *args, **kwargs)
+    return inner
+
+def resolve_data_version(view):
+    """Load request.data_version, for the ETag helpers of async views"""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        request.data_version = await adata_version(request.user.pk)
+        return await view(request, *args, **kwargs)
+    return inner
+
 @login_required
-def chart_data(request):
+@resolve_user
+@resolve_data_version
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=chart_data_etag)
+async def chart_data(request):
     """API endpoint for chart data"""
-    # Income vs Expense data
-    income_result = Transaction.objects.filter(
-        user=request.user, transaction_type='income'
-    ).aggregate(Sum('amount'))
-    income = income_result['amount__sum'] or 0
-    
-    expenses_result = Transaction.objects.filter(
-        user=request.user, transaction_type='expense'
-    ).aggregate(Sum('amount'))
-    expenses = expenses_result['amount__sum'] or 0
-    
-    # Expense by category
-    expense_categories = Category.objects.filter(
-        transaction__user=request.user,
-        transaction__transaction_type='expense'
-    ).annotate(total=Sum('transaction__amount')).order_by('-total')
-    
-    category_labels = [cat.name for cat in expense_categories]
-    category_data = [float(cat.total) for cat in expense_categories]
-    
-    # Monthly data for last 6 months
-    months = []
-    monthly_income = []
-    monthly_expenses = []
-    
-    for i in range(5, -1, -1):
-        date = timezone.now() - timedelta(days=30*i)
-        month_start = date.replace(day=1)
-        if month_start.month == 12:
-            month_end = month_start.replace(year=month_start.year+1, month=1, day=1) - timedelta(days=1)
-        else:
-            month_end = month_start.replace(month=month_start.month+1, day=1) - timedelta(days=1)
-            
-        months.append(month_start.strftime('%b %Y'))
-        
-        income_result = Transaction.objects.filter(
-            user=request.user,
-            transaction_type='income',
-            date__gte=month_start,
-            date__lte=month_end
-        ).aggregate(Sum('amount'))
-        income_total = income_result['amount__sum'] or 0
-        
-        expenses_result = Transaction.objects.filter(
-            user=request.user,
-            transaction_type='expense',
-            date__gte=month_start,
-            date__lte=month_end
-        ).aggregate(Sum('amount'))
-        expense_total = expenses_result['amount__sum'] or 0
-        
-        monthly_income.append(float(income_total))
-        monthly_expenses.append(float(expense_total))
+    summary = await aget_summary(request.user)
     
     data = {
         'income_expense': {
             'labels': ['Income', 'Expenses'],
-            'data': [float(income), float(expenses)]
+            'data': [float(summary.total_income), float(summary.total_expenses)]
         },
         'expense_by_category': {
-            'labels': category_labels,
-            'data': category_data
+            'labels': [cat.name for cat in summary.expense_categories],
+            'data': [float(cat.total) for cat in summary.expense_categories]
         },
         'monthly': {
-            'labels': months,
-            'income': monthly_income,
-            'expenses': monthly_expenses
+            'labels': [month.label for month in summary.monthly],
+            'income': [float(month.income) for month in summary.monthly],
+            'expenses': [float(month.expenses) for month in summary.monthly]
         }
     }
     
     return JsonResponse(data)
 
+@login_required
+@resolve_user
+async def live_updates(request):
+    """Server-sent events with dashboard deltas whenever the user's transactions change"""
+    if not streaming_supported(request):
+        # A WSGI worker would be held for the life of the stream; 204 also
+        # tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    broker = get_broker()
+    user_id = request.user.pk
+
+    async def stream():
+        queue = broker.subscribe(user_id)
+        try:
+            # Reconnecting tabs wait a few seconds instead of hammering the server
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), settings.LIVE_UPDATES_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    # Comments keep proxies from closing an idle connection
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broker.unsubscribe(user_id, queue)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+@login_required
+def monthly_series(request):
+    """API endpoint for income/expense totals over the last N months"""
+    granularity = request.GET.get('granularity', 'month')
+    try:
+        months = int(request.GET.get('months', 6))
+    except ValueError:
+        return JsonResponse({'error': 'months must be an integer.'}, status=400)
+    
+    if not 1 <= months <= MAX_SERIES_MONTHS:
+        return JsonResponse({'error': f'months must be between 1 and {MAX_SERIES_MONTHS}.'}, status=400)
+    if granularity not in GRANULARITIES:
+        return JsonResponse({'error': 'granularity must be one of: month, week, day.'}, status=400)
+    
+    series = period_series(request.user, months, granularity)
+    data = {
+        'granularity': granularity,
+        'months': months,
+        'labels': [period.label for period in series],
+        'starts': [period.start.isoformat() for period in series],
+        'income': [float(period.income) for period in series],
+        'expenses': [float(period.expenses) for period in series],
+    }
+    return JsonResponse(data)
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=analytics_etag)
+def analytics_api(request):
+    """API endpoint for spending trends, rolling averages and a forecast"""
+    try:
+        months = int(request.GET.get('months', 12))
+    except ValueError:
+        return JsonResponse({'error': 'months must be an integer.'}, status=400)
+    if not 1 <= months <= MAX_ANALYTICS_MONTHS:
+        return JsonResponse({'error': f'months must be between 1 and {MAX_ANALYTICS_MONTHS}.'}, status=400)
+    return JsonResponse(build_analytics(request.user, months))
+
+@login_required
+def balance_api(request):
+    """API endpoint for the running balance, optionally as of a date (YYYY-MM-DD)"""
+    as_of = request.GET.get('as_of')
+    if as_of:
+        when = parse_day(as_of, end=True)
+        if when is None:
+            return JsonResponse({'error': 'as_of must be a date in YYYY-MM-DD format.'}, status=400)
+        balance = ledger.balance_as_of(request.user, when)
+    else:
+        balance = ledger.current_balance(request.user)
+    return JsonResponse({'as_of': as_of or None, 'balance': float(balance)})
+
+@login_required
+def budgets_api(request):
+    """API endpoint for this month's spend against every budget of the user"""
+    today = timezone.localdate()
+    budgets = []
+    for budget in budget_progress(request.user, today):
+        percent = float(budget.spent / budget.monthly_limit * 100) if budget.monthly_limit else 0.0
+        budgets.append({
+            'id': budget.pk,
+            'category': budget.category.name,
+            'color': budget.category.color,
+            'limit': float(budget.monthly_limit),
+            'spent': float(budget.spent),
+            'remaining': float(budget.monthly_limit - budget.spent),
+            'percent': round(percent, 1),
+            'status': 'over' if percent >= 100 else 'warning' if percent >= 80 else 'ok',
+        })
+    return JsonResponse({'month': today.strftime('%Y-%m'), 'budgets': budgets})
+
+@login_required
+def search_transactions_api(request):
+    """API endpoint for full-text transaction search ordered by relevance"""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 20)), 100))
+    except ValueError:
+        limit = 20
+    
+    if not request.GET.get('search', '').strip():
+        return JsonResponse({'results': []})
+    
+    transactions, filters = filter_transactions(
+        Transaction.objects.filter(user=request.user), request.GET, ranked=True
+    )
+    rows = transactions.order_by('-rank', '-date').values(
+        'id', 'title', 'amount', 'transaction_type', 'date', 'category__name', 'rank'
+    )[:limit]
+    results = [
+        {
+            'id': row['id'],
+            'title': row['title'],
+            'amount': float(row['amount']),
+            'transaction_type': row['transaction_type'],
+            'date': row['date'].isoformat(),
+            'category': row['category__name'],
+            'rank': row['rank'],
+        }
+        for row in rows
+    ]
+    return JsonResponse({'results': results})
+
+@staff_member_required
+def summary_cache_stats_api(request):
+    """Hit/miss counters of the dashboard summary cache"""
+    return JsonResponse(summary_cache_stats())
+
+@staff_member_required
+def metrics(request):
+    """Request metrics of this process in the Prometheus text format"""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=categories_etag)
 def get_categories_by_type(request):
     """AJAX endpoint to get categories by transaction type"""
     transaction_type = request.GET.get('transaction_type')
     if transaction_type:
-        categories = Category.objects.filter(transaction_type=transaction_type).values('id', 'name')
-        return JsonResponse(list(categories), safe=False)
+        categories = [{'id': entry.id, 'name': entry.name} for entry in get_catalogue().for_type(transaction_type)]
+        return JsonResponse(categories, safe=False)
     return JsonResponse([], safe=False)
\ No newline at end of file